@@ -0,0 +1,105 @@
+"""Intermediate lyric card format benchmark.
+
+Renders a few synthetic lyric cards, then writes and reads them back in every card format
+(plus the previous optimized JPEG) and reports encode time, decode time and size per card.
+Decoding includes reading every pixel, as the renderer does, so the memory-mapped .npy
+cards are not measured as free.
+
+    python -m benchmarks.card_formats --cards 10 --output formats.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.fixtures import make_lyrics
+from src.images.card_formats import CARD_FORMATS, load_card, save_card
+from src.images.frame_store import FrameStore
+from src.images.images import ImageMaker
+from src.images.scheduler import ImageScheduler
+
+# Previous export settings, kept as the reference point
+LEGACY_FORMAT = "jpg-optimize"
+
+
+def render_cards(count: int, seed: int) -> list:
+    """RGB lyric cards rendered in memory"""
+    frame_store = FrameStore()
+    maker = ImageMaker(make_lyrics(count, count * 2.0, seed=seed), frame_store=frame_store,
+                       export_images=False, scheduler=ImageScheduler("serial"))
+    maker.make_images()
+    cards = [Image.fromarray(np.ascontiguousarray(frame_store.get(key)[:, :, ::-1])) for key in frame_store.keys()]
+    frame_store.clear()
+    return cards
+
+
+def measure_format(image_format: str, cards: list, work_dir: str, repeat: int) -> dict:
+    encode_s = decode_s = 0.0
+    total_bytes = 0
+    for index, card in enumerate(cards):
+        if image_format == LEGACY_FORMAT:
+            path = os.path.join(work_dir, f"card_{index}.jpg")
+        else:
+            path = os.path.join(work_dir, f"card_{index}.{image_format}")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if image_format == LEGACY_FORMAT:
+                card.save(path, quality=95, optimize=True)
+            else:
+                save_card(card, path)
+            encode_s += time.perf_counter() - start
+        total_bytes += os.path.getsize(path)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            frame = load_card(path)
+            # Lecture complète des pixels (le rendu vidéo lit toute la carte)
+            int(np.asarray(frame).sum(dtype=np.uint64))
+            decode_s += time.perf_counter() - start
+            del frame
+        os.remove(path)
+    runs = len(cards) * repeat
+    return {
+        "encode_ms": round(encode_s / runs * 1000, 2),
+        "decode_ms": round(decode_s / runs * 1000, 2),
+        "size_kb": round(total_bytes / len(cards) / 1024, 1)
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Lyric card intermediate format benchmark")
+    parser.add_argument("--cards", type=int, default=8, help="number of synthetic lyric cards")
+    parser.add_argument("--repeat", type=int, default=3, help="encode/decode runs per card")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    cards = render_cards(args.cards, args.seed)
+    work_dir = tempfile.mkdtemp(prefix="card_formats_")
+    try:
+        formats = {name: measure_format(name, cards, work_dir, args.repeat)
+                   for name in (LEGACY_FORMAT,) + tuple(CARD_FORMATS)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {"params": {"cards": len(cards), "repeat": args.repeat, "seed": args.seed}, "formats": formats}
+    print(f"\n{'format':<15}{'encode ms':>11}{'decode ms':>11}{'total ms':>10}{'size KB':>10}")
+    for name, stats in formats.items():
+        print(f"{name:<15}{stats['encode_ms']:>11.2f}{stats['decode_ms']:>11.2f}"
+              f"{stats['encode_ms'] + stats['decode_ms']:>10.2f}{stats['size_kb']:>10.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Synthetic, offline inputs for the benchmarks: lyrics, a beat-marked audio track and a BPM"""
+import os
+import random
+import subprocess
+import wave
+
+import numpy as np
+
+WORDS = ("love night fire heart dance light dream shadow city rain baby forever tonight "
+         "never alone feel move sky golden run higher falling stars again home wild").split()
+
+
+def make_lyrics(lines: int = 20, duration: float = 40.0, seed: int = 0, repeat: float = 0.0) -> list[dict]:
+    """LyricsFetcher-shaped lines ({"timestamp", "line"}) spread over the duration, 1 to 14 words each,
+    with a few empty (instrumental) lines. About `repeat` of the lines repeat an earlier one (chorus)."""
+    rng = random.Random(seed)
+    step = duration / max(1, lines + 1)
+    lyrics = []
+    for index in range(lines):
+        timestamp = round(step * (index + 1) + rng.uniform(-0.2, 0.2) * step, 2)
+        if repeat > 0 and lyrics and rng.random() < repeat:
+            text = rng.choice(lyrics)["line"]
+        elif rng.random() < 0.1:
+            text = ""
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 14)))
+        lyrics.append({"timestamp": timestamp, "line": text})
+    return lyrics
+
+
+def write_audio(path: str = "audio.m4a", duration: float = 40.0, bpm: float = 120.0,
+                sample_rate: int = 22050, seed: int = 0) -> str:
+    """Sine pad + noise clicks on every beat, encoded to AAC with ffmpeg"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    signal = 0.2 * np.sin(2 * np.pi * 220.0 * t) + 0.1 * np.sin(2 * np.pi * 330.0 * t)
+    beat_phase = np.mod(t, 60.0 / bpm)
+    signal += 0.6 * np.exp(-40.0 * beat_phase) * rng.uniform(-1.0, 1.0, t.size)
+    samples = (np.clip(signal, -1.0, 1.0) * 32767).astype(np.int16)
+
+    wav_path = os.path.splitext(path)[0] + ".wav"
+    with wave.open(wav_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    try:
+        subprocess.run(["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", wav_path,
+                        "-c:a", "aac", "-b:a", "128k", path], check=True)
+    finally:
+        os.remove(wav_path)
+    return path
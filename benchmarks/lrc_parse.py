@@ -0,0 +1,104 @@
+"""LRC parser benchmark.
+
+Generates synthetic LRC files mixing the real-world variants (3-digit milliseconds,
+multi-timestamp chorus lines, [offset:] tags, enhanced <mm:ss.xx> word tags), then reports
+files/s and lines/s for src.lyrics.lrc.parse_lrc, fed from bytes, next to the previous
+two-digit-only regex parser kept as the reference point.
+
+    python -m benchmarks.lrc_parse --files 2000 --output lrc.json
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+from benchmarks.fixtures import make_lyrics
+from src.lyrics.lrc import parse_lrc
+
+
+def format_tag(seconds: float, digits: int = 2) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    fraction = f"{seconds % 1:.{digits}f}"[2:]
+    return f"{int(minutes):02d}:{int(seconds):02d}.{fraction}"
+
+
+def make_lrc(seed: int, lines: int = 40) -> bytes:
+    """One synthetic LRC file; each line uses one variant chosen at random"""
+    rng = random.Random(seed)
+    out = ["[ar:Benchmark]", "[ti:Synthetic]"]
+    if rng.random() < 0.3:
+        out.append(f"[offset:{rng.choice((-250, 120, 500))}]")
+    for line in make_lyrics(lines, lines * 4.0, seed=seed):
+        start, text = line["timestamp"], line["line"]
+        variant = rng.random()
+        if variant < 0.15:
+            # Refrain repris plus loin
+            out.append(f"[{format_tag(start)}][{format_tag(start + 60.0)}]{text}")
+        elif variant < 0.3:
+            out.append(f"[{format_tag(start, 3)}]{text}")
+        elif variant < 0.45:
+            words = text.split()
+            tags = "".join(f"<{format_tag(start + index * 0.4)}>{word} " for index, word in enumerate(words))
+            out.append(f"[{format_tag(start)}]{tags}<{format_tag(start + len(words) * 0.4)}>")
+        else:
+            out.append(f"[{format_tag(start)}]{text}")
+    return ("\n".join(out) + "\n").encode("utf-8")
+
+
+def legacy_parse(data: bytes) -> list:
+    """Previous parser: [mm:ss.xx] only, one timestamp per line"""
+    lyrics = []
+    for line in data.decode("utf-8").strip().split("\n"):
+        match = re.match(r'\[(\d{2}):(\d{2})[\.:](\d{2})\](.*)', line.strip())
+        if match:
+            lyrics.append({"timestamp": int(match.group(1)) * 60 + int(match.group(2)) + int(match.group(3)) / 100,
+                           "line": match.group(4).strip()})
+    return lyrics
+
+
+def measure(parse, files: list, repeat: int) -> dict:
+    best = float("inf")
+    lines = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = sum(len(parse(data) or ()) for data in files)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "files_per_s": round(len(files) / best, 1),
+        "lines_per_s": round(lines / best, 1),
+        "lines": lines,
+        "total_s": round(best, 4)
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="LRC parser benchmark")
+    parser.add_argument("--files", type=int, default=1000, help="number of synthetic LRC files")
+    parser.add_argument("--lines", type=int, default=40, help="lyric lines per file")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per parser (best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    files = [make_lrc(args.seed + index, args.lines) for index in range(args.files)]
+    parsers = {"legacy": measure(legacy_parse, files, args.repeat),
+               "parse_lrc": measure(parse_lrc, files, args.repeat)}
+
+    results = {"params": {"files": args.files, "lines": args.lines, "repeat": args.repeat, "seed": args.seed},
+               "parsers": parsers}
+    print(f"\n{'parser':<12}{'files/s':>10}{'lines/s':>12}{'lines':>9}")
+    for name, stats in parsers.items():
+        print(f"{name:<12}{stats['files_per_s']:>10.0f}{stats['lines_per_s']:>12.0f}{stats['lines']:>9}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Serial vs parallel render parity check.
+
+Renders the synthetic fixture workload twice with the ffmpeg encoder, once serially and once in
+GOP-aligned parallel segments, decodes both videos and compares them frame by frame. Both paths
+use the same rate control (CRF, fixed GOP); the only expected difference is the x264 lookahead
+restarting at segment boundaries, so every frame must stay above the PSNR threshold and the
+frame counts must match. The exit code is 1 otherwise.
+
+    python -m benchmarks.parallel_parity --workers 4 --duration 10
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import make_lyrics, write_audio
+from src.images.frame_store import FrameStore
+from src.images.images import ImageMaker
+from src.images.scheduler import ImageScheduler
+from src.video.video import VideoConfig, VideoMakerV2
+
+
+def read_frames(path: str) -> list:
+    capture = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return frames
+            frames.append(frame)
+    finally:
+        capture.release()
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def render(folder: str, bpm: float, lyrics: list, frame_store: FrameStore, config: VideoConfig, output: str) -> str:
+    video_maker = VideoMakerV2(folder=folder, bpm=bpm, config=config,
+                               artist_name="Benchmark Artist", song_title="Benchmark Song",
+                               frame_store=frame_store, lyrics=lyrics)
+    video_maker.make_video()
+    os.replace(video_maker.final_video_name, output)
+    return output
+
+
+def compare(serial_path: str, parallel_path: str) -> dict:
+    serial, parallel = read_frames(serial_path), read_frames(parallel_path)
+    scores = [psnr(a, b) for a, b in zip(serial, parallel)]
+    finite = [score for score in scores if score != float("inf")]
+    return {
+        "serial_frames": len(serial),
+        "parallel_frames": len(parallel),
+        "identical_frames": len(scores) - len(finite),
+        "min_psnr_db": round(min(finite), 2) if finite else None,
+        "mean_psnr_db": round(sum(finite) / len(finite), 2) if finite else None,
+        "worst_frame": scores.index(min(scores)) if finite else None
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serial vs parallel render parity check")
+    parser.add_argument("--lines", type=int, default=8, help="number of synthetic lyric lines")
+    parser.add_argument("--duration", type=float, default=10.0, help="audio and video duration (s)")
+    parser.add_argument("--bpm", type=float, default=120.0)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=4, help="workers of the parallel render")
+    parser.add_argument("--gop-size", type=int, default=60)
+    parser.add_argument("--quality", default="medium", choices=["low", "medium", "high", "ultra"])
+    parser.add_argument("--min-psnr", type=float, default=38.0, help="lowest accepted per-frame PSNR (dB)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch folder")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    work_dir = tempfile.mkdtemp(prefix="parity_")
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    frame_store = FrameStore()
+    try:
+        lyrics = make_lyrics(args.lines, args.duration, seed=args.seed)
+        write_audio("audio.m4a", args.duration, args.bpm, seed=args.seed)
+        images_maker = ImageMaker(lyrics, frame_store=frame_store, export_images=False,
+                                  scheduler=ImageScheduler("serial"))
+        images_maker.make_images()
+        images_maker.create_title_card("Benchmark Artist", "Benchmark Song")
+
+        outputs = {}
+        for name, workers in (("serial", 1), ("parallel", args.workers)):
+            config = VideoConfig(fps=args.fps, workers=workers, gop_size=args.gop_size,
+                                 max_duration=args.duration, quality=args.quality, encoder="ffmpeg")
+            outputs[name] = render(images_maker.folder, args.bpm, lyrics, frame_store, config, f"{name}.mp4")
+        results = compare(outputs["serial"], outputs["parallel"])
+    finally:
+        frame_store.clear()
+        os.chdir(previous_dir)
+        if args.keep:
+            print(f"Parity files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if results["serial_frames"] != results["parallel_frames"]:
+        print(f"\n❌ Frame count differs: {results['serial_frames']} serial vs {results['parallel_frames']} parallel")
+        return 1
+    if results["min_psnr_db"] is not None and results["min_psnr_db"] < args.min_psnr:
+        print(f"\n❌ Frame {results['worst_frame']} at {results['min_psnr_db']} dB, below {args.min_psnr} dB")
+        return 1
+    print(f"\n✅ Parallel render matches the serial one (min PSNR {results['min_psnr_db']} dB, "
+          f"threshold {args.min_psnr} dB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
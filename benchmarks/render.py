@@ -0,0 +1,246 @@
+"""Offline render benchmark.
+
+Generates synthetic lyrics and audio, runs every pipeline stage in a scratch folder and reports
+wall time, CPU time, peak RSS and render throughput as JSON. With a baseline file, any stage
+slower than the tolerance (or a lower frames/sec) is reported as a regression and the exit
+code is 1. benchmarks/baseline.json is the committed reference for the default fixture workload;
+with --ci, a missing or non-matching baseline is an error (exit code 2) instead of a skipped check.
+
+    python -m benchmarks.render --lines 20 --duration 30 --output results.json
+    python -m benchmarks.render --save-baseline            # record benchmarks/baseline.json
+    python -m benchmarks.render --ci                       # compare against it
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import make_lyrics, write_audio
+from src.audio.audio import AudioFetcher
+from src.images.card_stream import StreamingFrameStore
+from src.images.frame_store import FrameStore
+from src.images.images import ImageMaker
+from src.images.scheduler import ImageScheduler
+from src.video.video import VideoConfig, VideoMakerV2
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Stage differences below this are noise, whatever the relative change
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def _rss_mb(usage) -> float:
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / scale, 1)
+
+
+class StageRecorder:
+    """Runs the pipeline stages and records wall/CPU time and peak memory for each"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        self_before = resource.getrusage(resource.RUSAGE_SELF)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        wall = time.perf_counter() - start
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.stages[name] = {
+            "wall_s": round(wall, 4),
+            "cpu_s": round((self_after.ru_utime + self_after.ru_stime)
+                           - (self_before.ru_utime + self_before.ru_stime), 4),
+            # ffmpeg and the segment workers run in child processes
+            "children_cpu_s": round((children_after.ru_utime + children_after.ru_stime)
+                                    - (children_before.ru_utime + children_before.ru_stime), 4),
+            "peak_rss_mb": _rss_mb(self_after),
+            "children_peak_rss_mb": _rss_mb(children_after)
+        }
+        return result
+
+
+def run_benchmark(args) -> dict:
+    """Run every stage once on synthetic inputs, in a scratch working directory"""
+    params = {
+        "lines": args.lines,
+        "repeat": args.repeat,
+        "duration": args.duration,
+        "bpm": args.bpm,
+        "render_mode": args.render_mode,
+        "workers": args.workers,
+        "image_backend": args.image_backend,
+        "image_workers": args.image_workers,
+        "stream_depth": args.stream_depth,
+        "fps": args.fps,
+        "quality": args.quality,
+        "seed": args.seed
+    }
+    config = VideoConfig(fps=args.fps, render_mode=args.render_mode, workers=args.workers,
+                         max_duration=args.duration, quality=args.quality)
+    recorder = StageRecorder()
+    work_dir = tempfile.mkdtemp(prefix="render_bench_")
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    # Streaming : les cartes sont générées pendant make_video, qui inclut alors leur temps
+    frame_store = StreamingFrameStore(depth=args.stream_depth) if args.stream_depth else FrameStore()
+    try:
+        lyrics = make_lyrics(args.lines, args.duration, seed=args.seed, repeat=args.repeat)
+        write_audio("audio.m4a", args.duration, args.bpm, seed=args.seed)
+
+        # Pas de réseau : AudioFetcher ne sert qu'au calcul du BPM
+        audio_fetcher = AudioFetcher()
+        detected_bpm = recorder.run("get_bpm_from_audio", audio_fetcher.get_bpm_from_audio)
+
+        images_maker = ImageMaker(lyrics, frame_store=frame_store, export_images=False,
+                                  layered=config.render_mode == "layered",
+                                  scheduler=ImageScheduler(args.image_backend, args.image_workers))
+        if config.render_mode == "ass":
+            recorder.run("make_images", images_maker.prepare_background_layer)
+        elif args.stream_depth:
+            recorder.run("make_images", images_maker.stream_images)
+            recorder.run("create_title_card", images_maker.create_title_card, "Benchmark Artist", "Benchmark Song")
+        else:
+            recorder.run("make_images", images_maker.make_images)
+            recorder.run("create_title_card", images_maker.create_title_card, "Benchmark Artist", "Benchmark Song")
+
+        video_maker = VideoMakerV2(folder=images_maker.folder, bpm=args.bpm, config=config,
+                                   artist_name="Benchmark Artist", song_title="Benchmark Song",
+                                   frame_store=frame_store, lyrics=lyrics)
+        recorder.run("make_video", video_maker.make_video)
+        recorder.run("add_audio", video_maker.add_audio)
+    finally:
+        frame_store.clear()
+        os.chdir(previous_dir)
+        if args.keep:
+            print(f"Benchmark files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    metadata = video_maker.metadata
+    frames = metadata.get("total_frames") or int(round(metadata.get("duration", 0) * args.fps))
+    render_wall = recorder.stages["make_video"]["wall_s"]
+    return {
+        "params": params,
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count()
+        },
+        "detected_bpm": round(detected_bpm, 2) if detected_bpm else None,
+        "frames": frames,
+        "frames_per_second": round(frames / render_wall, 2) if render_wall > 0 else None,
+        "total_wall_s": round(sum(stage["wall_s"] for stage in recorder.stages.values()), 4),
+        "image_generation": images_maker.generation_stats,
+        "dedup": metadata.get("dedup"),
+        "card_stream": metadata.get("card_stream"),
+        "stages": recorder.stages
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """List of regressions (stage wall time or frames/sec worse than baseline beyond tolerance)"""
+    regressions = []
+    for name, stage in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            continue
+        limit = base["wall_s"] * (1 + tolerance)
+        if stage["wall_s"] > limit and stage["wall_s"] - base["wall_s"] > MIN_REGRESSION_SECONDS:
+            regressions.append(f"{name}: {stage['wall_s']:.3f}s vs baseline {base['wall_s']:.3f}s "
+                               f"(+{(stage['wall_s'] / base['wall_s'] - 1):.0%})")
+    base_fps = baseline.get("frames_per_second")
+    fps = results.get("frames_per_second")
+    if base_fps and fps and fps < base_fps / (1 + tolerance):
+        regressions.append(f"frames_per_second: {fps:.2f} vs baseline {base_fps:.2f}")
+    return regressions
+
+
+def print_summary(results: dict, baseline: dict = None) -> None:
+    print(f"\n{'stage':<22}{'wall s':>10}{'cpu s':>10}{'child cpu s':>13}{'rss MB':>10}{'baseline s':>12}")
+    for name, stage in results["stages"].items():
+        base = (baseline or {}).get("stages", {}).get(name)
+        base_wall = f"{base['wall_s']:.3f}" if base else "-"
+        print(f"{name:<22}{stage['wall_s']:>10.3f}{stage['cpu_s']:>10.3f}{stage['children_cpu_s']:>13.3f}"
+              f"{stage['peak_rss_mb']:>10.1f}{base_wall:>12}")
+    print(f"Rendered {results['frames']} frames at {results['frames_per_second']} frames/s")
+    if results.get("dedup"):
+        print(f"Lyric cards: {results['dedup']['unique_sources']} unique for {results['dedup']['entries']} lines "
+              f"(dedup ratio {results['dedup']['dedup_ratio']:.0%})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline render benchmark")
+    parser.add_argument("--lines", type=int, default=20, help="number of synthetic lyric lines")
+    parser.add_argument("--repeat", type=float, default=0.3,
+                        help="fraction of lyric lines repeating an earlier one (choruses)")
+    parser.add_argument("--duration", type=float, default=30.0, help="audio and video duration (s)")
+    parser.add_argument("--bpm", type=float, default=120.0)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--render-mode", default="cards", choices=["cards", "layered", "ass"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--image-backend", choices=["process", "thread", "serial"],
+                        help="lyric image generation backend (default: process where fork is available)")
+    parser.add_argument("--image-workers", type=int, help="lyric image generation workers (default: one per CPU)")
+    parser.add_argument("--stream-depth", type=int, default=0,
+                        help="generate the lyric cards during the render through a queue of this depth (0: before)")
+    parser.add_argument("--quality", default="medium", choices=["low", "medium", "high", "ultra"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--ci", action="store_true",
+                        help="fail (exit code 2) when there is no matching baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch folder")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = run_benchmark(args)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != results["params"]:
+            print(f"Warning: baseline {args.baseline} was recorded with other parameters, not comparing")
+            baseline = None
+
+    print_summary(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(f"\nResults:\n{json.dumps(results, indent=2)}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+    if baseline is None:
+        if args.ci:
+            print(f"\n❌ No matching baseline in {args.baseline}: the regression check did not run")
+            return 2
+        print("No baseline to compare against (run with --save-baseline to record one)")
+        return 0
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ PERFORMANCE REGRESSION (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print(f"\n✅ No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
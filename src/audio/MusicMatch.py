@@ -12,8 +12,13 @@ from functools import cache
 
 import requests
 
+from src.audio.secret_cache import get_secret_cache
+from src.tracing import span
+
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36"
 SIGNATURE_KEY_BASE_URL = "https://s.mxmcdn.net/site/js/"
+# Musixmatch reports a bad signature as status 401 in the message header
+AUTH_ERROR_CODES = (401, 403)
 
 
 class EndPoints(Enum):
@@ -37,7 +42,20 @@ class MusixMatchAPI:
         self.base_url = "https://www.musixmatch.com/ws/1.1/"
         self.headers = {"User-Agent": USER_AGENT}
         self.proxies = proxies
-        self.secret = self.get_secret()
+        self.secret_cache = get_secret_cache()
+        with span("musixmatch.secret"):
+            self.use_secret(self.secret_cache.get(self.fetch_secret))
+
+    def use_secret(self, entry):
+        self.secret = entry["secret"]
+        # Identifies the cache entry in use, so an auth error only refreshes it once
+        self.secret_fetched_at = entry["fetched_at"]
+
+    def fetch_secret(self):
+        """(app_url, secret) scraped from the current web bundle, bypassing the method caches"""
+        self.get_latest_app.cache_clear()
+        self.get_secret.cache_clear()
+        return self.get_latest_app(), self.get_secret()
 
     @cache
     def get_latest_app(self):
@@ -240,14 +258,32 @@ class MusixMatchAPI:
 
         return self.make_request(base_url)
 
+    @staticmethod
+    def is_auth_error(response, data) -> bool:
+        if response.status_code in AUTH_ERROR_CODES:
+            return True
+        try:
+            return data["message"]["header"]["status_code"] in AUTH_ERROR_CODES
+        except (KeyError, TypeError):
+            return False
+
     def make_request(self, url) -> dict:
         url = url.replace("%20", "+").replace(" ", "+")
         url = self.base_url + url
-        signed_url = url + self.generate_signature(url)
-        response = requests.get(
-            signed_url, headers=self.headers, proxies=self.proxies, timeout=5
-        )
-        return response.json()
+        for attempt in range(2):
+            signed_url = url + self.generate_signature(url)
+            with span("musixmatch.request", endpoint=url[len(self.base_url):].split("?")[0]) as trace:
+                response = requests.get(
+                    signed_url, headers=self.headers, proxies=self.proxies, timeout=5
+                )
+                trace.add(bytes=len(response.content))
+            data = response.json()
+            if attempt or not self.is_auth_error(response, data):
+                return data
+            # The cached secret may be stale (new web bundle): fetch it again and retry once
+            with span("musixmatch.secret_refresh"):
+                self.use_secret(self.secret_cache.refresh(self.fetch_secret, self.secret_fetched_at))
+        return data
 
 
 if __name__ == "__main__":
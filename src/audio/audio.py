@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 import numpy as np
 import time
 import random
+from src.tracing import span, traced
 
 # Charge automatiquement les variables de .env
 load_dotenv()  
@@ -86,6 +87,7 @@ class AudioFetcher:
         
         return cmd
     
+    @traced("audio.search")
     def _search_youtube(self, artist, title):
         """Recherche une vidéo sur YouTube avec yt-dlp en utilisant des cookies si fournis."""
         # Variations de requête pour améliorer les résultats
@@ -156,7 +158,10 @@ class AudioFetcher:
         cmd.append(youtube_url)
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            with span("audio.download") as trace:
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+                if os.path.exists(output_filename):
+                    trace.add(bytes=os.path.getsize(output_filename))
             if result.returncode == 0 and os.path.exists(output_filename):
                 print(f"✅ Audio téléchargé: {output_filename}")
                 return True
@@ -167,6 +172,7 @@ class AudioFetcher:
             print(f"❌ Erreur lors du téléchargement: {e}")
             return False
     
+    @traced("audio.bpm")
     def get_bpm_from_audio(self, audio_path="audio.m4a"):
         """Calcule le BPM à partir d'un fichier audio avec librosa. Retourne le BPM (float) ou None en cas d'erreur."""
         if not os.path.exists(audio_path):
@@ -81,6 +81,8 @@ def choose_random_track(playlist_id=None):
             'artist': track['artist']['name'],
             'isrc': track.get('isrc'),
             'deezer_link': track['link'],
+            # Clé du cache des fonds tirés de la cover (un fond par album)
+            'album_id': track.get('album', {}).get('id'),
             'bpm': bpm
         }
         
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: atomic writes only, no cross-process lock
+    fcntl = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SECRET_CACHE_PATH = os.path.join(PROJECT_ROOT, ".cache", "musixmatch_secret.json")
+# The key only changes when Musixmatch ships a new web bundle; an auth error refreshes it earlier
+SECRET_TTL = 7 * 24 * 3600
+# Auth errors that are not a key rotation (captcha, rate limit) would otherwise re-scrape on every request
+MIN_REFRESH_INTERVAL = 10 * 60
+
+
+class SecretCache:
+    """Musixmatch signing secret (and the _app bundle it came from) persisted on disk, so each
+    process start does not scrape the search page and download the bundle again. Refreshes are
+    serialized with a file lock: concurrent jobs wait for one fetch instead of all doing it."""
+
+    def __init__(self, path=SECRET_CACHE_PATH, ttl=SECRET_TTL, min_refresh_interval=MIN_REFRESH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.fetches = 0
+        self._entry = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _valid(self, entry):
+        return bool(entry and entry.get("secret")) and time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if self._valid(entry) else None
+
+    def _write(self, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, fetch):
+        """Cached entry {"secret", "app_url", "fetched_at"}, else fetch() -> (app_url, secret),
+        stored for the next processes"""
+        with self._lock:
+            if self._valid(self._entry):
+                return self._entry
+            entry = self._read()
+            if entry is None:
+                with self._file_lock():
+                    # Another process may have fetched it while we waited for the lock
+                    entry = self._read()
+                    if entry is None:
+                        entry = self._fetch(fetch)
+            self._entry = entry
+            return entry
+
+    def refresh(self, fetch, stale_fetched_at):
+        """Called after an auth error with the fetched_at of the entry the failing request used.
+        Fetches again only if no other thread or process has refreshed since (newer entry on
+        disk), and at most once per min_refresh_interval."""
+        with self._lock, self._file_lock():
+            entry = self._read()
+            if entry is None or (entry["fetched_at"] <= stale_fetched_at
+                                 and time.time() - entry["fetched_at"] >= self.min_refresh_interval):
+                entry = self._fetch(fetch)
+            self._entry = entry
+            return entry
+
+    def _fetch(self, fetch):
+        app_url, secret = fetch()
+        entry = {"secret": secret, "app_url": app_url, "fetched_at": time.time()}
+        self._write(entry)
+        self.fetches += 1
+        return entry
+
+
+_secret_cache = None
+_secret_cache_lock = threading.Lock()
+
+
+def get_secret_cache():
+    global _secret_cache
+    with _secret_cache_lock:
+        if _secret_cache is None:
+            _secret_cache = SecretCache()
+        return _secret_cache
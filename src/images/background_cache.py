@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "backgrounds")
+# À incrémenter si le rendu d'un fond change sans que ses paramètres changent
+CACHE_VERSION = 1
+# Un fond 1080x1920 pèse ~6 Mo : les plus anciens .npy sont supprimés au-delà (un par album avec les covers)
+DISK_MAX_MB = 512
+# Fonds gardés en mémoire pendant un run (un run n'en utilise que quelques-uns)
+MEMORY_MAX_MB = 128
+
+
+class BackgroundCache:
+    """Cache des fonds prétraités (recadrage 9:16, effets...), indexé par (hash du fichier source,
+    taille cible, paramètres) : en mémoire pour le run, en .npy sur disque d'un run à l'autre.
+    Les deux niveaux sont bornés : LRU en mémoire, fichiers les moins récemment utilisés (mtime)
+    supprimés sur disque."""
+
+    def __init__(self, cache_dir=CACHE_DIR, use_disk=True, max_disk_bytes=DISK_MAX_MB * 1024 * 1024,
+                 max_memory_bytes=MEMORY_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.use_disk = use_disk
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def file_hash(self, path):
+        """SHA-1 du contenu, mémorisé tant que le fichier (taille, mtime) ne change pas"""
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._file_hashes.get(signature)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            with self._lock:
+                self._file_hashes[signature] = digest
+        return digest
+
+    def make_key(self, source_path, size, params):
+        payload = {
+            "version": CACHE_VERSION,
+            "source": self.file_hash(source_path),
+            "size": list(size),
+            "params": params
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_or_create(self, source_path, size, params, build):
+        """Retourne le tableau en cache pour ces entrées, sinon build() (appelé une seule fois
+        même si plusieurs threads demandent la même clé). Le tableau est en lecture seule."""
+        key = self.make_key(source_path, size, params)
+        with self._lock:
+            array = self._memory.get(key)
+            if array is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return array
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                array = self._memory.get(key)
+                if array is not None:
+                    self.hits += 1
+                    return array
+            array = self._load(key)
+            if array is not None:
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                array = np.ascontiguousarray(build(), dtype=np.uint8)
+                with self._lock:
+                    self.misses += 1
+                self._save(key, array)
+            array.setflags(write=False)
+            with self._lock:
+                self._remember(key, array)
+            return array
+
+    def _remember(self, key, array):
+        # Sous self._lock ; le fond qui vient d'être ajouté n'est jamais évincé
+        self._memory[key] = array
+        self._memory_bytes += array.nbytes
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._key_locks.clear()
+        if disk and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "evictions": self.evictions, "entries": len(self._memory)}
+
+    def prune(self):
+        """Supprime les .npy les moins récemment utilisés au-delà de max_disk_bytes ; retourne leur nombre"""
+        if not self.use_disk or not os.path.isdir(self.cache_dir):
+            return 0
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _load(self, key):
+        if not self.use_disk or not os.path.exists(self._path(key)):
+            return None
+        try:
+            array = np.load(self._path(key))
+            # mtime = dernière utilisation, pour prune()
+            os.utime(self._path(key))
+            return array
+        except (OSError, ValueError):
+            # Fichier tronqué ou corrompu : on le reconstruit
+            return None
+
+    def _save(self, key, array):
+        if not self.use_disk:
+            return
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Écriture atomique : un autre run ne lit jamais un fichier à moitié écrit
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".npy.tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, self._path(key))
+            self.prune()
+        except OSError as e:
+            print(f"⚠️ Cache des fonds non écrit sur disque : {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_background_cache = None
+_background_cache_lock = threading.Lock()
+
+
+def get_background_cache():
+    """Cache partagé par ImageMaker et VideoMakerV2 (BACKGROUND_CACHE=0 désactive le disque)"""
+    global _background_cache
+    with _background_cache_lock:
+        if _background_cache is None:
+            _background_cache = BackgroundCache(use_disk=os.environ.get("BACKGROUND_CACHE", "1") != "0")
+            # Purge au démarrage : le dossier ne dépasse pas max_disk_bytes d'un run à l'autre
+            _background_cache.prune()
+        return _background_cache
@@ -0,0 +1,44 @@
+import os
+
+import cv2
+import numpy as np
+
+# Formats intermédiaires des cartes exportées : elles sont relues puis réencodées en vidéo,
+# inutile de payer une compression soignée
+CARD_FORMATS = {
+    # JPEG sans la passe Huffman optimize (lente, quelques % de gain seulement)
+    "jpg": {"quality": 95},
+    # PNG sans perte, compression minimale
+    "png": {"compress_level": 1},
+    # Tableau BGR brut : pas d'encodage, relu en mmap sans décodage
+    "npy": {}
+}
+CARD_EXTENSIONS = (".jpg", ".jpeg", ".png", ".npy")
+
+
+def check_format(image_format):
+    if image_format not in CARD_FORMATS:
+        raise ValueError(f"Format de carte inconnu : {image_format} (attendu : {', '.join(CARD_FORMATS)})")
+    return image_format
+
+
+def save_card(image, path):
+    """Écrit une carte (image PIL RGB) dans le format donné par l'extension de path"""
+    image_format = check_format(os.path.splitext(path)[1][1:].lower())
+    if image_format == "npy":
+        # Stockée en BGR : directement utilisable par OpenCV à la relecture
+        np.save(path, np.ascontiguousarray(np.asarray(image.convert("RGB"))[:, :, ::-1]))
+        return path
+    image.save(path, **CARD_FORMATS[image_format])
+    return path
+
+
+def load_card(path):
+    """Relit une carte en tableau BGR (memmap en lecture seule pour .npy), None si illisible"""
+    if path.lower().endswith(".npy"):
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+    return cv2.imread(path)
+
@@ -0,0 +1,218 @@
+import queue
+import threading
+import time
+
+from src.images.frame_store import FrameStore
+
+_END = object()
+
+
+class StreamCancelled(Exception):
+    """Levée dans le thread producteur quand le rendu s'arrête avant la fin du flux"""
+
+
+class StreamingFrameStore(FrameStore):
+    """FrameStore alimenté en flux : ImageMaker génère les cartes dans un thread, dans l'ordre
+    de la timeline, et les pousse dans une file bornée ; le rendu vidéo les consomme au fur et
+    à mesure (get bloque jusqu'à l'arrivée de la carte). Les cartes vues une seule fois sont
+    libérées dès leur lecture : la mémoire reste bornée par la profondeur de la file (plus les
+    cartes répétées, gardées jusqu'à la fin)."""
+
+    def __init__(self, depth=4, **kwargs):
+        super().__init__(**kwargs)
+        self.depth = max(1, depth)
+        self._queue = queue.Queue(maxsize=self.depth)
+        self._expected = []
+        self._pending = set()
+        self._retain = set()
+        self._sprites_expected = False
+        self._thread = None
+        self._finished = False
+        self._error = None
+        self._cancel = threading.Event()
+        self._stats = {"produced": 0, "consumed": 0, "producer_stall_s": 0.0, "consumer_stall_s": 0.0,
+                       "max_queued": 0, "first_card_s": None}
+        self._started_at = None
+
+    def expect(self, keys, retain=(), sprites=False):
+        """Annonce les clés des cartes à venir, dans l'ordre de production. retain : clés lues
+        plusieurs fois (refrains), gardées en mémoire après leur première lecture."""
+        with self._lock:
+            self._expected = list(keys)
+            self._pending = set(self._expected)
+            self._retain = set(retain)
+            self._sprites_expected = sprites
+
+    def start(self, produce):
+        """Lance produce() (qui appelle put/put_sprite pour chaque carte annoncée) dans un thread"""
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, args=(produce,), name="card-stream", daemon=True)
+        self._thread.start()
+
+    def _run(self, produce):
+        try:
+            try:
+                produce()
+            except StreamCancelled:
+                raise
+            except BaseException as e:
+                self._error = e
+            self._enqueue(_END)
+        except StreamCancelled:
+            return
+
+    def _enqueue(self, item):
+        start = time.perf_counter()
+        while True:
+            if self._cancel.is_set():
+                raise StreamCancelled()
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        with self._lock:
+            self._stats["producer_stall_s"] += time.perf_counter() - start
+            self._stats["max_queued"] = max(self._stats["max_queued"], self._queue.qsize())
+
+    def _is_streamed(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def put(self, key, frame):
+        if self._is_streamed(key):
+            self._enqueue((key, frame, None))
+        else:
+            super().put(key, frame)
+
+    def put_sprite(self, key, sprite, x, y):
+        if self._is_streamed(key):
+            self._enqueue((key, sprite, (x, y)))
+        else:
+            super().put_sprite(key, sprite, x, y)
+
+    def _receive(self, key=None):
+        """Range les cartes de la file jusqu'à recevoir key (ou la fin du flux si key est None)"""
+        while True:
+            with self._lock:
+                if self._finished or (key is not None and key not in self._pending):
+                    return
+            start = time.perf_counter()
+            item = self._next_item()
+            with self._lock:
+                self._stats["consumer_stall_s"] += time.perf_counter() - start
+            if item is _END:
+                with self._lock:
+                    self._finished = True
+                if self._error is not None:
+                    raise RuntimeError(f"Génération des cartes interrompue : {self._error}") from self._error
+                return
+            item_key, frame, position = item
+            with self._lock:
+                self._pending.discard(item_key)
+                self._stats["produced"] += 1
+                if self._stats["first_card_s"] is None:
+                    self._stats["first_card_s"] = time.perf_counter() - self._started_at
+            if position is None:
+                super().put(item_key, frame)
+            else:
+                super().put_sprite(item_key, frame, *position)
+
+    def _next_item(self):
+        # Attente interrompue par close() : le producteur est arrêté, _END n'arrivera jamais
+        while True:
+            if self._cancel.is_set():
+                raise RuntimeError("Flux de cartes fermé : les cartes restantes ne seront pas produites")
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _consume(self, key, read):
+        self._receive(key)
+        value = read(key)
+        if value is not None:
+            with self._lock:
+                self._stats["consumed"] += 1
+                release = key in self._expected and key not in self._retain
+            if release:
+                # Carte lue une seule fois : libérée tout de suite
+                with self._lock:
+                    self._discard(key)
+                    self._sprites.pop(key, None)
+        return value
+
+    def get(self, key):
+        return self._consume(key, super().get)
+
+    def get_sprite(self, key):
+        return self._consume(key, super().get_sprite)
+
+    def keys(self):
+        with self._lock:
+            expected = [] if self._sprites_expected else [key for key in self._expected if key in self._pending]
+        return super().keys() + expected
+
+    def sprite_keys(self):
+        with self._lock:
+            expected = [key for key in self._expected if key in self._pending] if self._sprites_expected else []
+        return super().sprite_keys() + expected
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._pending and not self._sprites_expected:
+                return True
+        return super().__contains__(key)
+
+    def __len__(self):
+        return len(self.keys())
+
+    def finish(self):
+        """Attend la fin de la production et garde toutes les cartes en mémoire (plus de flux)"""
+        with self._lock:
+            self._retain.update(self._expected)
+        self._receive()
+
+    def spill_all(self):
+        # Les workers du rendu parallèle relisent les cartes sur disque : le flux est d'abord vidé
+        self.finish()
+        super().spill_all()
+
+    def close(self):
+        """Arrête le producteur s'il tourne encore (rendu interrompu ou cartes au-delà de la durée max)"""
+        self._cancel.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stream_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["depth"] = self.depth
+            stats["expected"] = len(self._expected)
+        stats["producer_stall_s"] = round(stats["producer_stall_s"], 4)
+        stats["consumer_stall_s"] = round(stats["consumer_stall_s"], 4)
+        if stats["first_card_s"] is not None:
+            stats["first_card_s"] = round(stats["first_card_s"], 4)
+        return stats
+
+    def clear(self):
+        self.close()
+        super().clear()
+
+    def __reduce__(self):
+        # Les workers du rendu parallèle reçoivent un FrameStore simple (flux déjà vidé par spill_all)
+        state = FrameStore.__getstate__(self)
+        fields = set(FrameStore().__dict__)
+        return _plain_frame_store, ({key: value for key, value in state.items() if key in fields},)
+
+
+def _plain_frame_store(state):
+    store = FrameStore.__new__(FrameStore)
+    store.__setstate__(state)
+    return store
@@ -0,0 +1,178 @@
+import colorsys
+import json
+import os
+import tempfile
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+COVER_CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "covers")
+# À incrémenter si le fond ou la palette générés changent
+COVER_VERSION = 1
+# Zoom du fond par rapport au simple remplissage du 9:16, et flou (fraction de la largeur)
+COVER_ZOOM = 1.15
+COVER_BLUR = 0.03
+PALETTE_COLORS = 5
+PALETTE_SAMPLE = 64
+
+
+class CoverBackground(NamedTuple):
+    path: str  # fond 9:16 (PNG) à utiliser à la place de assets/background.jpg
+    palette: Tuple  # ((r, g, b), poids) par couleur dominante, poids décroissants
+    text_fill: Tuple  # couleur du texte des paroles, teintée par la palette
+    outline_fill: Tuple  # contour (RGBA)
+    shadow_fill: Tuple  # ombre portée (RGBA)
+
+
+def dominant_palette(image, colors=PALETTE_COLORS, sample=PALETTE_SAMPLE, iterations=12):
+    """Couleurs dominantes par k-means vectorisé (numpy) sur une copie sample x sample de l'image.
+    Retourne ((r, g, b), poids) triés par poids décroissant."""
+    small = cv2.resize(np.asarray(image), (sample, sample), interpolation=cv2.INTER_AREA)
+    pixels = small.reshape(-1, 3).astype(np.float32)
+    colors = min(colors, len(pixels))
+    # Initialisation déterministe : quantiles de luminance
+    luminance = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    order = np.argsort(luminance, kind="stable")
+    centers = pixels[order[np.linspace(0, len(pixels) - 1, colors).astype(int)]].copy()
+    for _ in range(iterations):
+        # Distances pixel -> centres en une seule opération (N x k)
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=colors)
+        sums = np.stack([np.bincount(labels, weights=pixels[:, channel], minlength=colors) for channel in range(3)], axis=1)
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers).astype(np.float32)
+        if np.abs(updated - centers).max() < 0.5:
+            centers = updated
+            break
+        centers = updated
+    weights = counts / counts.sum()
+    ranking = np.argsort(-weights, kind="stable")
+    return tuple((tuple(int(round(value)) for value in centers[index]), round(float(weights[index]), 4))
+                 for index in ranking if counts[index] > 0)
+
+
+def text_theme(palette):
+    """Couleurs du texte tirées de la palette : texte clair teinté par la couleur d'accent
+    (la plus saturée et lumineuse parmi les couleurs présentes), contour et ombre sombres"""
+    def accent_score(entry):
+        (r, g, b), weight = entry
+        _, saturation, value = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+        return saturation * value * weight ** 0.5
+
+    accent, _ = max(palette, key=accent_score)
+    darkest, _ = min(palette, key=lambda entry: sum(entry[0]))
+    # 75 % de blanc : lisible sur le fond assombri, mais teinté
+    fill = tuple(int(round(channel * 0.25 + 255 * 0.75)) for channel in accent)
+    dark = tuple(int(round(channel * 0.3)) for channel in darkest)
+    return fill, dark + (180,), dark + (100,)
+
+
+def build_cover_background(cover_path, width, height, zoom=COVER_ZOOM, blur=COVER_BLUR):
+    """Fond 9:16 (RGB) : cover agrandie pour remplir l'écran (plus un léger zoom), recadrée au
+    centre et floutée. Le flou est calculé au quart de la résolution, puis remis à l'échelle."""
+    cover = np.asarray(Image.open(cover_path).convert("RGB"))
+    cover_height, cover_width = cover.shape[:2]
+    scale = max(width / cover_width, height / cover_height) * zoom
+    # Directement au quart de la taille finale : le flou efface de toute façon les détails
+    small_width, small_height = max(1, width // 4), max(1, height // 4)
+    scaled_width = max(small_width, int(round(cover_width * scale / 4)))
+    scaled_height = max(small_height, int(round(cover_height * scale / 4)))
+    scaled = cv2.resize(cover, (scaled_width, scaled_height), interpolation=cv2.INTER_AREA)
+    left = (scaled_width - small_width) // 2
+    top = (scaled_height - small_height) // 2
+    small = scaled[top:top + small_height, left:left + small_width]
+    small = cv2.GaussianBlur(small, (0, 0), max(0.5, blur * width / 4))
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+class CoverBackgroundCache:
+    """Fonds et palettes tirés des covers, en cache par album Deezer (mémoire + disque) :
+    les morceaux d'un même album réutilisent le même fond sans retélécharger la cover"""
+
+    def __init__(self, cache_dir=COVER_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, album_id, width, height):
+        return os.path.join(self.cache_dir, f"{album_id}_{width}x{height}_v{COVER_VERSION}")
+
+    def get(self, album_id, width, height) -> Optional[CoverBackground]:
+        """Fond déjà généré pour cet album, ou None"""
+        key = (str(album_id), width, height)
+        with self._lock:
+            cover = self._memory.get(key)
+        if cover is None:
+            cover = self._load(self._entry_dir(album_id, width, height))
+            if cover is not None:
+                with self._lock:
+                    self._memory[key] = cover
+        if cover is not None:
+            with self._lock:
+                self.hits += 1
+        return cover
+
+    def get_or_create(self, album_id, cover_path, width, height) -> CoverBackground:
+        cover = self.get(album_id, width, height)
+        if cover is not None:
+            return cover
+        background = build_cover_background(cover_path, width, height)
+        palette = dominant_palette(Image.open(cover_path).convert("RGB"))
+        text_fill, outline_fill, shadow_fill = text_theme(palette)
+        entry_dir = self._entry_dir(album_id, width, height)
+        cover = CoverBackground(os.path.join(entry_dir, "background.png"), palette, text_fill, outline_fill, shadow_fill)
+        self._save(entry_dir, background, cover, album_id)
+        with self._lock:
+            self.misses += 1
+            self._memory[(str(album_id), width, height)] = cover
+        return cover
+
+    def _load(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, "palette.json")) as f:
+                data = json.load(f)
+            path = os.path.join(entry_dir, "background.png")
+            if data.get("version") != COVER_VERSION or not os.path.exists(path):
+                return None
+            return CoverBackground(path, tuple((tuple(color), weight) for color, weight in data["palette"]),
+                                   tuple(data["text_fill"]), tuple(data["outline_fill"]), tuple(data["shadow_fill"]))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, entry_dir, background, cover, album_id):
+        os.makedirs(entry_dir, exist_ok=True)
+        # Écriture atomique : le fond d'abord, la palette (qui valide l'entrée) ensuite
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix=".png")
+        os.close(fd)
+        Image.fromarray(background).save(tmp_path, compress_level=1)
+        os.replace(tmp_path, cover.path)
+        data = {
+            "version": COVER_VERSION,
+            "album_id": album_id,
+            "palette": [[list(color), weight] for color, weight in cover.palette],
+            "text_fill": list(cover.text_fill),
+            "outline_fill": list(cover.outline_fill),
+            "shadow_fill": list(cover.shadow_fill)
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, os.path.join(entry_dir, "palette.json"))
+
+
+_cover_cache = None
+_cover_cache_lock = threading.Lock()
+
+
+def get_cover_cache():
+    global _cover_cache
+    with _cover_cache_lock:
+        if _cover_cache is None:
+            _cover_cache = CoverBackgroundCache()
+        return _cover_cache
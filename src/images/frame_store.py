@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+
+TITLE_CARD_KEY = "title_card"
+BACKGROUND_LAYER_KEY = "background_layer"
+
+
+class FrameStore:
+    """Stockage en mémoire des cartes (tableaux BGR) indexées par clé de contenu (card_key : les
+    lignes répétées partagent une carte), les timestamps de la timeline pointant vers ces clés.
+    Plafond mémoire au-delà duquel les images sont déversées sur disque en .npy (relues en mmap)"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.memory_bytes = 0
+        self._frames = {}
+        self._spilled = {}
+        # Mode calques : sprites de texte BGRA serrés + position dans la carte
+        self._sprites = {}
+        # Timeline : timestamp -> clé de la carte (ou du sprite) affichée, partagée par les lignes répétées
+        self._references = {}
+        # Suppression du dossier temporaire même sans clear() (exception, Ctrl+C, store abandonné)
+        self._spill_cleanup = None
+        self._lock = threading.Lock()
+
+    def put(self, key, frame):
+        """Ajoute une image BGR (uint8, HxWx3) ; déversée sur disque si le plafond est atteint"""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        with self._lock:
+            self._discard(key)
+            if self.memory_bytes + frame.nbytes <= self.max_bytes:
+                self._frames[key] = frame
+                self.memory_bytes += frame.nbytes
+                return
+            path = self._spill_path(key)
+        np.save(path, frame)
+        with self._lock:
+            self._spilled[key] = path
+
+    def get(self, key):
+        """Retourne l'image pour cette clé (memmap en lecture seule si déversée), ou None"""
+        with self._lock:
+            frame = self._frames.get(key)
+            path = self._spilled.get(key)
+        if frame is not None:
+            return frame
+        if path is not None:
+            return np.load(path, mmap_mode='r')
+        return None
+
+    def put_sprite(self, key, sprite, x, y):
+        """Ajoute un sprite BGRA (petit, toujours en mémoire) positionné en (x, y)"""
+        sprite = np.ascontiguousarray(sprite, dtype=np.uint8)
+        with self._lock:
+            self._sprites[key] = (sprite, int(x), int(y))
+
+    def get_sprite(self, key):
+        """Retourne (sprite BGRA, x, y) ou None"""
+        with self._lock:
+            return self._sprites.get(key)
+
+    def put_reference(self, timestamp, key):
+        """La ligne qui commence à timestamp affiche l'image (ou le sprite) key"""
+        with self._lock:
+            self._references[timestamp] = key
+
+    def references(self):
+        """Liste (timestamp, clé) triée par timestamp"""
+        with self._lock:
+            return sorted(self._references.items())
+
+    def sprite_keys(self):
+        with self._lock:
+            return list(self._sprites)
+
+    def keys(self):
+        with self._lock:
+            return list(self._frames) + list(self._spilled)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._frames or key in self._spilled
+
+    def __len__(self):
+        with self._lock:
+            return len(self._frames) + len(self._spilled)
+
+    def spill_all(self):
+        """Déverse toutes les images sur disque (pour les partager avec d'autres processus)"""
+        with self._lock:
+            frames = list(self._frames.items())
+        for key, frame in frames:
+            with self._lock:
+                path = self._spill_path(key)
+            np.save(path, frame)
+            with self._lock:
+                self._spilled[key] = path
+                if self._frames.pop(key, None) is not None:
+                    self.memory_bytes -= frame.nbytes
+
+    def clear(self):
+        """Vide le store et supprime les fichiers déversés"""
+        with self._lock:
+            self._frames.clear()
+            self._spilled.clear()
+            self._sprites.clear()
+            self._references.clear()
+            self.memory_bytes = 0
+            if self._spill_cleanup is not None:
+                self._spill_cleanup()
+                self._spill_cleanup = None
+                self.spill_dir = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_memory": len(self._frames),
+                "spilled": len(self._spilled),
+                "sprites": len(self._sprites),
+                "references": len(self._references),
+                "sprite_bytes": sum(sprite.nbytes for sprite, _, _ in self._sprites.values()),
+                "memory_bytes": self.memory_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def _discard(self, key):
+        frame = self._frames.pop(key, None)
+        if frame is not None:
+            self.memory_bytes -= frame.nbytes
+        path = self._spilled.pop(key, None)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def _spill_path(self, key):
+        # Appelé avec le verrou tenu
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="frame_store_")
+            # À la sortie de l'interpréteur ou au ramasse-miettes du store, si clear() n'a pas été appelé
+            self._spill_cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, ignore_errors=True)
+        os.makedirs(self.spill_dir, exist_ok=True)
+        return os.path.join(self.spill_dir, f"{key}.npy")
+
+    def __getstate__(self):
+        # Les processus workers ne reçoivent que les références disque (voir spill_all)
+        state = self.__dict__.copy()
+        state["_frames"] = {}
+        state["memory_bytes"] = 0
+        state["_spill_cleanup"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
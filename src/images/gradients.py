@@ -0,0 +1,58 @@
+from functools import lru_cache
+
+import numpy as np
+
+GRADIENT_STYLES = ("vertical", "horizontal", "diagonal", "radial")
+
+
+def gradient_ramp(width, height, style="vertical"):
+    """Position 0..1 de chaque pixel le long du dégradé (float64, HxW)"""
+    if style == "vertical":
+        ramp = np.arange(height, dtype=np.float64) / height
+        return np.broadcast_to(ramp[:, None], (height, width))
+    if style == "horizontal":
+        ramp = np.arange(width, dtype=np.float64) / width
+        return np.broadcast_to(ramp[None, :], (height, width))
+    if style == "diagonal":
+        # Du coin haut gauche (0) au coin bas droit (1)
+        ys = np.arange(height, dtype=np.float64)[:, None] / height
+        xs = np.arange(width, dtype=np.float64)[None, :] / width
+        return (xs + ys) / 2
+    if style == "radial":
+        # Du centre (0) aux coins (1)
+        ys = np.arange(height, dtype=np.float64)[:, None] - height / 2
+        xs = np.arange(width, dtype=np.float64)[None, :] - width / 2
+        return np.sqrt(xs * xs + ys * ys) / np.hypot(width / 2, height / 2)
+    raise ValueError(f"Style de dégradé inconnu : {style} (attendu : {', '.join(GRADIENT_STYLES)})")
+
+
+@lru_cache(maxsize=16)
+def gradient_overlay(width, height, color1=(0, 0, 0, 120), color2=(0, 0, 0, 40), style="vertical"):
+    """Overlay RGBA (uint8, HxWx4) allant de color1 à color2, calculé en une passe numpy et
+    mémorisé par (taille, couleurs, style). Tableau en lecture seule, partagé entre les appels."""
+    start = np.asarray(color1, dtype=np.float64)
+    end = np.asarray(color2, dtype=np.float64)
+    if style in ("vertical", "horizontal"):
+        # Une seule ligne (ou colonne) calculée puis répétée
+        length = height if style == "vertical" else width
+        ramp = (np.arange(length, dtype=np.float64) / length)[:, None]
+        # Troncature comme l'ancienne boucle draw.line : int(a1 - (a1 - a2) * y / h)
+        line = (start - (start - end) * ramp).astype(np.uint8)
+        shape = (height, 1, 4) if style == "vertical" else (1, width, 4)
+        overlay = np.ascontiguousarray(np.broadcast_to(line.reshape(shape), (height, width, 4)))
+    else:
+        ramp = gradient_ramp(width, height, style)[..., None]
+        overlay = (start - (start - end) * ramp).astype(np.uint8)
+    overlay.setflags(write=False)
+    return overlay
+
+
+def apply_gradient(image, color1, color2, style="vertical"):
+    """Compose le dégradé sur une image RGB opaque (HxWx3 uint8) en un seul mélange,
+    équivalent à Image.alpha_composite sur un fond opaque"""
+    image = np.asarray(image)
+    height, width = image.shape[:2]
+    overlay = gradient_overlay(width, height, tuple(color1), tuple(color2), style)
+    alpha = overlay[..., 3:4].astype(np.uint16)
+    blended = overlay[..., :3] * alpha + image[..., :3] * (255 - alpha)
+    return ((blended + 127) // 255).astype(np.uint8)
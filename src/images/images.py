@@ -1,30 +1,81 @@
 
 import os
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
-import threading
+import hashlib
+import json
+from collections import Counter
+from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
 import random
 import math
+import numpy as np
 
 from src.lyrics.lyrics import LyricsFetcher
+from src.images.frame_store import FrameStore, TITLE_CARD_KEY, BACKGROUND_LAYER_KEY
+from src.images.card_stream import StreamingFrameStore
+from src.images.cover_background import CoverBackground
+from src.images.background_cache import get_background_cache
+from src.images.gradients import gradient_overlay, apply_gradient
+from src.images.text_render import draw_text_layers
+from src.images.card_formats import check_format, save_card
+from src.images.text_layout import get_font, get_layout, wrap_words
+from src.images.scheduler import ImageScheduler
+from src.tracing import span, traced, propagate
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 FONT_PATH = os.path.join(PROJECT_ROOT, "assets", "font.ttf")
 BACKGROUND_PATH = os.path.join(PROJECT_ROOT, "assets", "background.jpg")
+# Effets appliqués au fond (font partie de la clé du cache des fonds)
+BACKGROUND_SATURATION = 1.3
+BACKGROUND_BLUR_RADIUS = 1.5
+BACKGROUND_DARKEN_ALPHA = 80
+# Dégradé subtil des cartes de paroles (couleur de départ, couleur d'arrivée, style)
+CARD_GRADIENT = ((0, 0, 0, 30), (0, 0, 0, 10), "vertical")
+# À incrémenter si le rendu d'une carte change sans que son texte ni son style changent
+CARD_VERSION = 1
+# Export disque : timestamp -> fichier de la carte, les refrains ne sont écrits qu'une fois
+CARDS_MANIFEST = "cards.json"
 
 class ImageMaker:
-    def __init__(self, lyrics: list[dict]):
+    def __init__(self, lyrics: list[dict], frame_store: FrameStore = None, export_images: bool = None,
+                 layered: bool = False, scheduler: ImageScheduler = None, image_format: str = "jpg",
+                 cover_background: CoverBackground = None):
         self.lyrics = lyrics
         self.folder = "lyrics_images"
+        # Avec un FrameStore, les images passent en mémoire et le dossier devient un export de debug
+        self.frame_store = frame_store
+        self.export_images = frame_store is None if export_images is None else export_images
+        # Format des cartes exportées : jpg (sans optimize), png (compression 1) ou npy (brut, mmap)
+        self.image_format = check_format(image_format)
+        # Mode calques : un fond commun + un sprite de texte par ligne (nécessite un FrameStore)
+        self.layered = layered
+        self.background_layer = None
+        if layered and frame_store is None:
+            raise ValueError("Le mode calques nécessite un FrameStore")
+        # Génération des lignes par lots sur un pool borné (processus par défaut)
+        self.scheduler = scheduler or ImageScheduler()
+        self.generation_stats = None
+        self.dedup_stats = None
+        # Fond des cartes fourni par le parent (mémoire partagée) dans les workers processus
+        self.shared_card_background = None
+        # Fond et couleurs du texte : assets/background.jpg en blanc sur noir, ou tirés de la cover
+        self.background_path = BACKGROUND_PATH
+        self.text_fill = (255, 255, 255)
+        self.outline_fill = (0, 0, 0, 180)
+        self.shadow_fill = (0, 0, 0, 100)
+        # Fond tiré de la cover : déjà zoomé et flouté, seul l'assombrissement reste à appliquer
+        self.cover_background = None
+        if cover_background is not None:
+            self.use_cover_background(cover_background)
         
         # 9:16 aspect ratio dimensions
         self.target_width = 1080
         self.target_height = 1920
 
-        if not os.path.exists(self.folder):
-            os.mkdir(self.folder)
-        else:
-            for file in os.listdir(self.folder):
-                os.remove(os.path.join(self.folder, file))
+        if self.export_images:
+            if not os.path.exists(self.folder):
+                os.mkdir(self.folder)
+            else:
+                for file in os.listdir(self.folder):
+                    os.remove(os.path.join(self.folder, file))
 
     def resize_background_to_916(self, background):
         """Resize and crop background image to 9:16 aspect ratio"""
@@ -61,30 +112,24 @@ class ImageMaker:
         """Ajoute des effets modernes à l'arrière-plan"""
         # Légère saturation pour des couleurs plus vives
         enhancer = ImageEnhance.Color(background)
-        background = enhancer.enhance(1.3)
+        background = enhancer.enhance(BACKGROUND_SATURATION)
         
         # Léger flou gaussien pour un effet doux
-        background = background.filter(ImageFilter.GaussianBlur(radius=1.5))
+        background = background.filter(ImageFilter.GaussianBlur(radius=BACKGROUND_BLUR_RADIUS))
         
-        # Overlay sombre pour améliorer la lisibilité
-        overlay = Image.new('RGBA', background.size, (0, 0, 0, 80))
+        return self.darken(background)
+
+    def darken(self, background):
+        """Overlay sombre pour améliorer la lisibilité"""
+        overlay = Image.new('RGBA', background.size, (0, 0, 0, BACKGROUND_DARKEN_ALPHA))
         background = background.convert('RGBA')
         background = Image.alpha_composite(background, overlay)
         
         return background.convert('RGB')
 
-    def create_gradient_overlay(self, width, height, color1=(0, 0, 0, 120), color2=(0, 0, 0, 40)):
-        """Crée un overlay avec dégradé"""
-        gradient = Image.new('RGBA', (width, height), color1)
-        draw = ImageDraw.Draw(gradient)
-        
-        # Dégradé vertical
-        for y in range(height):
-            alpha = int(color1[3] - (color1[3] - color2[3]) * (y / height))
-            color = (*color1[:3], alpha)
-            draw.line([(0, y), (width, y)], fill=color)
-        
-        return gradient
+    def create_gradient_overlay(self, width, height, color1=(0, 0, 0, 120), color2=(0, 0, 0, 40), style="vertical"):
+        """Crée un overlay avec dégradé (vertical, horizontal, diagonal ou radial), mémorisé"""
+        return Image.fromarray(gradient_overlay(width, height, tuple(color1), tuple(color2), style))
 
     def get_smart_font_size(self, text, max_width, max_height):
         """Calcule intelligemment la taille de police optimale"""
@@ -102,124 +147,264 @@ class ImageMaker:
             return base_size - 10  # Texte long = plus petit
 
     def wrap_text_intelligent(self, text, font, max_width):
-        """Découpe le texte de manière intelligente"""
-        words = text.split()
-        lines = []
-        current_line = ""
-        
-        for word in words:
-            test_line = current_line + " " + word if current_line else word
-            bbox = font.getbbox(test_line)
-            
-            if bbox[2] <= max_width:
-                current_line = test_line
-            else:
-                if current_line:
-                    lines.append(current_line)
-                    current_line = word
-                else:
-                    lines.append(word)
-        
-        if current_line:
-            lines.append(current_line)
-        
-        return lines
+        """Découpe le texte de manière intelligente (largeurs de mots mémorisées, temps linéaire)"""
+        return wrap_words(font.path, font.size, text, max_width)
 
-    def make_image(self, line):
-        timestamp = line["timestamp"]
+    def get_line_text(self, line):
         # Vérifier si la ligne est vide ou ne contient que des espaces
         if not line["line"].strip():
-            line_text = "..."
-        else:
-            line_text = line["line"].upper()
+            return "..."
+        return line["line"].upper()
+
+    def background_params(self):
+        if self.cover_background is not None:
+            return {"stage": "cover_darken", "darken_alpha": BACKGROUND_DARKEN_ALPHA}
+        return {
+            "stage": "modern_effects",
+            "saturation": BACKGROUND_SATURATION,
+            "blur_radius": BACKGROUND_BLUR_RADIUS,
+            "darken_alpha": BACKGROUND_DARKEN_ALPHA
+        }
 
-        if not os.path.exists(BACKGROUND_PATH):
-            raise FileNotFoundError(f"Le fichier de fond '{BACKGROUND_PATH}' est introuvable. Place-le dans le dossier assets/.")
-        background = Image.open(BACKGROUND_PATH)
+    def use_cover_background(self, cover_background):
+        """Fond 9:16 généré depuis la cover de l'album et texte teinté par sa palette"""
+        self.cover_background = cover_background
+        self.background_path = cover_background.path
+        self.text_fill = tuple(cover_background.text_fill)
+        self.outline_fill = tuple(cover_background.outline_fill)
+        self.shadow_fill = tuple(cover_background.shadow_fill)
+
+    def background_array(self):
+        """Fond recadré en 9:16 avec les effets modernes (RGB, lecture seule), préparé une seule fois"""
+        if not os.path.exists(self.background_path):
+            raise FileNotFoundError(f"Le fichier de fond '{self.background_path}' est introuvable. Place-le dans le dossier assets/.")
+        build = self.build_cover_background if self.cover_background is not None else self.build_background
+        return get_background_cache().get_or_create(
+            self.background_path, (self.target_width, self.target_height), self.background_params(), build)
+
+    def load_background(self):
+        """Copie modifiable du fond avec les effets modernes"""
+        return Image.fromarray(self.background_array()).copy()
+
+    def card_background_array(self):
+        """Fond des cartes de paroles : effets modernes + dégradé, fondu une seule fois dans le cache"""
+        if self.shared_card_background is not None:
+            return self.shared_card_background
+        background = self.background_array()
+        color1, color2, style = CARD_GRADIENT
+        params = dict(self.background_params(), stage="card", gradient=[color1, color2, style])
+        return get_background_cache().get_or_create(
+            self.background_path, (self.target_width, self.target_height), params,
+            lambda: apply_gradient(background, color1, color2, style))
+
+    def load_card_background(self):
+        """Copie modifiable du fond des cartes de paroles"""
+        return Image.fromarray(self.card_background_array()).copy()
+
+    def build_background(self):
+        """Ouvre le fond, le recadre en 9:16 et applique les effets modernes (RGB, numpy)"""
+        background = Image.open(self.background_path)
         
         # Resize background to 9:16 aspect ratio
         background = self.resize_background_to_916(background)
         
         # Appliquer des effets modernes
-        background = self.add_modern_effects(background)
-        
-        width, height = background.size
+        return np.asarray(self.add_modern_effects(background))
 
+    def build_cover_background(self):
+        """Fond tiré de la cover (déjà en 9:16, zoomé et flouté) : seulement assombri"""
+        background = Image.open(self.background_path).convert('RGB')
+        if background.size != (self.target_width, self.target_height):
+            background = self.resize_background_to_916(background)
+        return np.asarray(self.darken(background))
+
+    def layout_text(self, line_text, width, height):
+        """Choisit la police, découpe le texte et calcule sa position centrée"""
         # Taille de police intelligente
         font_size = self.get_smart_font_size(line_text, width, height)
-        font = ImageFont.truetype(FONT_PATH, font_size)
+        font = get_font(FONT_PATH, font_size)
 
         # Marges adaptatives
         margin = int(0.1 * width)
         max_text_width = width - margin * 2
         
-        # Découpage intelligent du texte
-        lines = self.wrap_text_intelligent(line_text, font, max_text_width)
-        wrapped_text = "\n".join(lines)
-
-        # Créer une image temporaire pour calculer les dimensions du texte
-        temp_img = Image.new('RGB', (width, height))
-        temp_draw = ImageDraw.Draw(temp_img)
-        text_bbox = temp_draw.textbbox((0, 0), wrapped_text, font=font)
+        # Découpage et dimensions mémorisés par (texte, taille, largeur max)
+        layout = get_layout(FONT_PATH, font_size, line_text, max_text_width)
+        text_bbox = layout.bbox
         
         # Position du texte (centré)
         text_width = text_bbox[2] - text_bbox[0]
         text_height = text_bbox[3] - text_bbox[1]
         text_x = (width - text_width) // 2
         text_y = (height - text_height) // 2
+        return font, layout.text, text_x, text_y
+
+    def draw_text_effects(self, image, text_x, text_y, wrapped_text, font, shadow_fill=None, outline_fill=None):
+        """Effet de texte multicouche (ombre portée, contour, texte) dessiné en place dans image :
+        le texte n'est rastérisé qu'une fois, contour et ombre en sont dérivés"""
+        draw_text_layers(image, text_x, text_y, wrapped_text, font, fill=self.text_fill,
+                         outline_fill=outline_fill or self.outline_fill, outline_width=2,
+                         shadow_fill=shadow_fill or self.shadow_fill, shadow_offset=(4, 4))
+
+    def card_key(self, line):
+        """Clé de contenu d'une carte : hash du texte normalisé, de la taille de police et du style.
+        Deux lignes identiques (refrains) partagent la même carte."""
+        line_text = " ".join(self.get_line_text(line).split())
+        payload = {
+            "version": CARD_VERSION,
+            "text": line_text,
+            "font": os.path.basename(FONT_PATH),
+            "font_size": self.get_smart_font_size(line_text, self.target_width, self.target_height),
+            "size": [self.target_width, self.target_height],
+            "layered": self.layered,
+            "background": self.background_params(),
+            "background_source": get_background_cache().file_hash(self.background_path),
+            "colors": [self.text_fill, self.outline_fill, self.shadow_fill],
+            "gradient": CARD_GRADIENT
+        }
+        return "card_" + hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+    def make_image(self, line):
+        with span("images.line", timestamp=line["timestamp"]) as trace:
+            trace.add(frames=1)
+            self._make_image(line)
+
+    def _make_image(self, line):
+        if self.layered:
+            self.make_sprite(line)
+            return
+        timestamp = line["timestamp"]
+        line_text = self.get_line_text(line)
+
+        # Fond + dégradé subtil déjà composés (cache des fonds), comme en mode calques
+        background = self.load_card_background()
+        width, height = background.size
+
+        font, wrapped_text, text_x, text_y = self.layout_text(line_text, width, height)
         
-        draw = ImageDraw.Draw(background)
-        
-        # Effet de texte multicouche pour plus de profondeur
-        # Ombre portée
-        shadow_offset = 4
-        draw.text((text_x + shadow_offset, text_y + shadow_offset), wrapped_text, 
-                 font=font, fill=(0, 0, 0, 100))
-        
-        # Contour pour la lisibilité
-        outline_width = 2
-        for adj in range(-outline_width, outline_width + 1):
-            for adj2 in range(-outline_width, outline_width + 1):
-                if adj != 0 or adj2 != 0:
-                    draw.text((text_x + adj, text_y + adj2), wrapped_text, 
-                             font=font, fill=(0, 0, 0, 180))
-        
-        # Texte principal avec léger gradient
-        draw.text((text_x, text_y), wrapped_text, font=font, fill=(255, 255, 255))
-        
-        # Créer un dégradé overlay subtil
-        gradient = self.create_gradient_overlay(width, height, (0, 0, 0, 30), (0, 0, 0, 10))
-        background = background.convert('RGBA')
-        background = Image.alpha_composite(background, gradient)
+        self.draw_text_effects(background, text_x, text_y, wrapped_text, font)
         
-        # Sauvegarder l'image finale
-        background = background.convert('RGB')
-        background.save(f"{self.folder}/lyrics_{timestamp}.jpg", quality=95, optimize=True)
+        # Sauvegarder l'image finale (une seule fois par contenu, nommée d'après sa première ligne)
+        self.output_image(background, self.card_key(line), self.card_filename(timestamp))
 
-    def make_images(self):
-        threads = []
+    @traced("images.background_layer")
+    def prepare_background_layer(self):
+        """Mode calques : fond (9:16 + effets + dégradé) préparé une seule fois pour toutes les lignes"""
+        background = self.load_card_background()
+        self.background_layer = background
+        self.frame_store.put(BACKGROUND_LAYER_KEY, np.asarray(background)[:, :, ::-1])
+        return background
+
+    def make_sprite(self, line):
+        """Mode calques : rend seulement le texte dans un sprite RGBA serré"""
+        timestamp = line["timestamp"]
+        line_text = self.get_line_text(line)
+        width, height = self.target_width, self.target_height
 
+        font, wrapped_text, text_x, text_y = self.layout_text(line_text, width, height)
+        layer = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        # Ombre et contour opaques, comme sur les cartes RGB
+        self.draw_text_effects(layer, text_x, text_y, wrapped_text, font,
+                               shadow_fill=self.shadow_fill[:3] + (255,), outline_fill=self.outline_fill[:3] + (255,))
+        bbox = layer.getbbox()
+        if bbox is None:
+            return
+        sprite = np.asarray(layer.crop(bbox))
+        # RGBA -> BGRA pour OpenCV
+        self.frame_store.put_sprite(self.card_key(line), sprite[:, :, [2, 1, 0, 3]], bbox[0], bbox[1])
+
+        if self.export_images:
+            # Export de debug : la carte complète recomposée
+            card = Image.alpha_composite(self.background_layer.convert('RGBA'), layer).convert('RGB')
+            save_card(card, os.path.join(self.folder, self.card_filename(timestamp)))
+
+    def card_filename(self, timestamp):
+        return f"lyrics_{timestamp}.{self.image_format}"
+
+    def output_image(self, image, key, filename):
+        """Envoie l'image au FrameStore (BGR, sans encodage) et/ou l'exporte sur disque"""
+        if self.frame_store is not None:
+            self.frame_store.put(key, np.asarray(image)[:, :, ::-1])
+        if self.export_images:
+            save_card(image, os.path.join(self.folder, filename))
+
+    def plan_cards(self):
+        """Une seule carte par contenu : (références (timestamp, clé) de chaque ligne, première ligne de chaque clé)"""
+        unique_lines = {}
+        references = []
         for line in self.lyrics:
-            thread = threading.Thread(target=self.make_image, args=(line,))
-            thread.start()
-            threads.append(thread)
+            key = self.card_key(line)
+            unique_lines.setdefault(key, line)
+            references.append((line["timestamp"], key))
+        return references, unique_lines
+
+    def register_cards(self, references, unique_lines):
+        """Enregistre les références des lignes (FrameStore et/ou cards.json) et les stats de dédoublonnage"""
+        if self.frame_store is not None:
+            for timestamp, key in references:
+                self.frame_store.put_reference(timestamp, key)
+        if self.export_images:
+            self.write_cards_manifest(references, unique_lines)
+
+        repeated = len(references) - len(unique_lines)
+        self.dedup_stats = {
+            "lines": len(references),
+            "unique_cards": len(unique_lines),
+            "dedup_ratio": round(repeated / len(references), 4) if references else 0.0
+        }
+        print(f"♻️ {len(unique_lines)} cartes uniques pour {len(references)} lignes "
+              f"({self.dedup_stats['dedup_ratio']:.0%} de lignes répétées)")
 
-        for thread in threads:
-            thread.join()
+    @traced("images.make_images")
+    def make_images(self):
+        if self.layered:
+            self.prepare_background_layer()
+        # Les lignes répétées (refrains) référencent la carte de leur première occurrence
+        references, unique_lines = self.plan_cards()
+        self.generation_stats = self.scheduler.run(self, list(unique_lines.values()))
+        self.scheduler.print_stats()
+        self.register_cards(references, unique_lines)
+
+    @traced("images.stream_images")
+    def stream_images(self):
+        """Mode streaming (StreamingFrameStore) : les cartes sont planifiées ici puis générées dans
+        un thread, dans l'ordre de la timeline, pendant que la vidéo les consomme"""
+        if not isinstance(self.frame_store, StreamingFrameStore):
+            raise ValueError("Le mode streaming nécessite un StreamingFrameStore")
+        if self.layered:
+            self.prepare_background_layer()
+        references, unique_lines = self.plan_cards()
+        # Ordre de production = ordre de première apparition dans la timeline
+        order = list(dict.fromkeys(key for _, key in sorted(references, key=lambda ref: ref[0])))
+        counts = Counter(key for _, key in references)
+        self.frame_store.expect(order, retain={key for key, count in counts.items() if count > 1},
+                                sprites=self.layered)
+        self.register_cards(references, unique_lines)
+
+        def produce():
+            for key in order:
+                self.make_image(unique_lines[key])
 
+        # propagate : les spans du thread producteur se rattachent à images.stream_images
+        self.frame_store.start(propagate(produce))
+
+    def write_cards_manifest(self, references, unique_lines):
+        """Export disque : associe chaque timestamp au fichier de sa carte (cards.json)"""
+        cards = [{"timestamp": timestamp, "key": key,
+                  "file": self.card_filename(unique_lines[key]["timestamp"])} for timestamp, key in references]
+        with open(os.path.join(self.folder, CARDS_MANIFEST), "w") as f:
+            json.dump({"version": CARD_VERSION, "cards": cards}, f, indent=1)
+
+    @traced("images.title_card")
     def create_title_card(self, artist, title, duration=3.0):
         """Crée une carte de titre moderne pour le début de la vidéo"""
-        if not os.path.exists(BACKGROUND_PATH):
-            raise FileNotFoundError(f"Le fichier de fond '{BACKGROUND_PATH}' est introuvable. Place-le dans le dossier assets/.")
-        background = Image.open(BACKGROUND_PATH)
-        background = self.resize_background_to_916(background)
-        background = self.add_modern_effects(background)
+        background = self.load_background()
         
         width, height = background.size
         
         # Fonts pour le titre et l'artiste
-        title_font = ImageFont.truetype(FONT_PATH, int(0.12 * width))
-        artist_font = ImageFont.truetype(FONT_PATH, int(0.08 * width))
+        title_font = get_font(FONT_PATH, int(0.12 * width))
+        artist_font = get_font(FONT_PATH, int(0.08 * width))
         
         # Créer l'overlay
         background = background.convert('RGBA')
@@ -239,7 +424,7 @@ class ImageMaker:
         artist_y = title_y + 120
         
         # Dessiner le titre
-        draw.text((title_x, title_y), title.upper(), font=title_font, fill=(255, 255, 255))
+        draw.text((title_x, title_y), title.upper(), font=title_font, fill=self.text_fill)
         draw.text((artist_x, artist_y), artist.upper(), font=artist_font, fill=(200, 200, 200))
         
         # Ligne décorative
@@ -249,4 +434,4 @@ class ImageMaker:
         draw.rectangle([line_x, line_y, line_x + line_width, line_y + 3], fill=(255, 255, 255))
         
         background = background.convert('RGB')
-        background.save(f"{self.folder}/title_card.jpg", quality=95, optimize=True)
\ No newline at end of file
+        self.output_image(background, TITLE_CARD_KEY, f"title_card.{self.image_format}")
\ No newline at end of file
@@ -0,0 +1,233 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from src.images.frame_store import FrameStore
+from src.tracing import current_span, get_tracer, propagate, span
+
+# process : pool de processus (le rendu PIL tient le GIL), thread : pool de threads (étapes I/O),
+# serial : tout dans le processus courant
+BACKENDS = ("process", "thread", "serial")
+# Nombre de lots visés par worker : assez pour équilibrer la charge, assez peu pour limiter les échanges
+BATCHES_PER_WORKER = 4
+
+
+def default_backend():
+    # main.py n'a pas de garde __main__ : sans fork, les workers ré-exécuteraient le script
+    return "process" if "fork" in multiprocessing.get_all_start_methods() else "thread"
+
+
+class SharedArray:
+    """Tableau numpy copié une fois en mémoire partagée : les workers s'y attachent par nom, sans copie"""
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(self.shape, dtype=array.dtype, buffer=self._shm.buf)[...] = array
+
+    def descriptor(self):
+        return {"name": self._shm.name, "shape": self.shape, "dtype": self.dtype}
+
+    @staticmethod
+    def attach(descriptor):
+        """Retourne (segment, tableau en lecture seule) ; le segment doit rester ouvert tant que le tableau sert"""
+        shm = shared_memory.SharedMemory(name=descriptor["name"])
+        array = np.ndarray(descriptor["shape"], dtype=np.dtype(descriptor["dtype"]), buffer=shm.buf)
+        array.setflags(write=False)
+        return shm, array
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+class ImageScheduler:
+    """Ordonnanceur de la génération des images de paroles : lignes regroupées en lots,
+    exécutés sur un pool borné (processus ou threads), avec un plafond d'images en cours
+    et des statistiques de débit par worker"""
+
+    def __init__(self, backend=None, workers=None, batch_size=None, max_in_flight=None):
+        backend = backend or default_backend()
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de génération inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.stats = None
+
+    def plan_batches(self, lines):
+        """Découpe les lignes en lots contigus (taille fixe, ou ~BATCHES_PER_WORKER lots par worker)"""
+        batch_size = self.batch_size or max(1, -(-len(lines) // (self.workers * BATCHES_PER_WORKER)))
+        return [lines[i:i + batch_size] for i in range(0, len(lines), batch_size)]
+
+    def run(self, maker, lines):
+        """Génère les images de lines avec maker (ImageMaker) et retourne les statistiques"""
+        batches = self.plan_batches(list(lines))
+        backend = self.backend if self.workers > 1 and len(batches) > 1 else "serial"
+        largest = max((len(batch) for batch in batches), default=0)
+        # Au moins un lot en cours, sinon par défaut un lot en calcul + un en attente par worker
+        max_in_flight = max(largest, self.max_in_flight or 2 * self.workers * largest)
+        self.stats = {
+            "backend": backend,
+            "workers": self.workers if backend != "serial" else 1,
+            "batches": len(batches),
+            "batch_size": largest,
+            "max_in_flight": max_in_flight,
+            "peak_in_flight": 0,
+            "lines": 0,
+            "per_worker": {}
+        }
+        start = time.perf_counter()
+        if backend == "serial":
+            for batch in batches:
+                self._record(_run_batch(maker, batch, "main"), maker)
+                self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], len(batch))
+        elif backend == "thread":
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="images") as executor:
+                # propagate : les spans des threads se rattachent à images.make_images
+                self._drain(executor, batches, max_in_flight, maker,
+                            lambda batch: executor.submit(propagate(_run_batch), maker, batch))
+        else:
+            self._run_processes(maker, batches, max_in_flight)
+        self.stats["wall_s"] = round(time.perf_counter() - start, 4)
+        self.stats["lines_per_s"] = round(self.stats["lines"] / self.stats["wall_s"], 2) if self.stats["wall_s"] > 0 else None
+        return self.stats
+
+    def _run_processes(self, maker, batches, max_in_flight):
+        # Le fond des cartes est calculé (ou lu en cache) une fois ici puis partagé avec les workers
+        background = SharedArray(maker.card_background_array())
+        settings = {
+            "layered": maker.layered,
+            "export_images": maker.export_images,
+            "image_format": maker.image_format,
+            "background_path": maker.background_path,
+            "cover_background": maker.cover_background,
+            "text_colors": (maker.text_fill, maker.outline_fill, maker.shadow_fill),
+            "folder": maker.folder,
+            "target_width": maker.target_width,
+            "target_height": maker.target_height,
+            "collect": maker.frame_store is not None
+        }
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        else:
+            mp_context = None
+        trace = current_span()
+        trace_parent = trace.span_id if trace is not None else None
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context,
+                                     initializer=_init_worker, initargs=(settings, background.descriptor())) as executor:
+                self._drain(executor, batches, max_in_flight, maker,
+                            lambda batch: executor.submit(_process_batch, batch, trace_parent))
+        finally:
+            background.close()
+
+    def _drain(self, executor, batches, max_in_flight, maker, submit):
+        """Soumet les lots sans dépasser max_in_flight images en cours, et range les résultats au fil de l'eau"""
+        pending = {}
+        in_flight = 0
+        next_batch = 0
+        while next_batch < len(batches) or pending:
+            while next_batch < len(batches) and in_flight + len(batches[next_batch]) <= max_in_flight:
+                batch = batches[next_batch]
+                pending[submit(batch)] = len(batch)
+                in_flight += len(batch)
+                next_batch += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], in_flight)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight -= pending.pop(future)
+                self._record(future.result(), maker)
+
+    def _record(self, result, maker):
+        """Range les images renvoyées par un worker processus et cumule ses statistiques"""
+        for key, frame in result.get("frames", ()):
+            maker.frame_store.put(key, frame)
+        for key, sprite, x, y in result.get("sprites", ()):
+            maker.frame_store.put_sprite(key, sprite, x, y)
+        get_tracer().merge(result.get("trace", []))
+        worker = self.stats["per_worker"].setdefault(result["worker"], {"batches": 0, "lines": 0, "busy_s": 0.0, "cpu_s": 0.0})
+        worker["batches"] += 1
+        worker["lines"] += result["lines"]
+        worker["busy_s"] = round(worker["busy_s"] + result["busy_s"], 4)
+        worker["cpu_s"] = round(worker["cpu_s"] + result["cpu_s"], 4)
+        worker["lines_per_s"] = round(worker["lines"] / worker["busy_s"], 2) if worker["busy_s"] > 0 else None
+        self.stats["lines"] += result["lines"]
+
+    def print_stats(self):
+        stats = self.stats
+        if not stats:
+            return
+        print(f"🖼️ {stats['lines']} images en {stats['wall_s']:.2f}s ({stats['lines_per_s']} img/s) - "
+              f"{stats['backend']}, {stats['workers']} worker(s), {stats['batches']} lots, "
+              f"max {stats['peak_in_flight']}/{stats['max_in_flight']} en cours")
+        for name, worker in sorted(stats["per_worker"].items()):
+            print(f"   {name}: {worker['lines']} images en {worker['batches']} lots, "
+                  f"{worker['busy_s']:.2f}s ({worker['lines_per_s']} img/s)")
+
+
+def _run_batch(maker, batch, worker=None, trace_parent=None):
+    """Génère un lot de lignes avec maker dans le processus courant"""
+    worker = worker or threading.current_thread().name
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    with span("images.batch", parent=trace_parent, worker=worker, lines=len(batch)):
+        for line in batch:
+            maker.make_image(line)
+    return {"worker": worker, "lines": len(batch), "busy_s": time.perf_counter() - start,
+            "cpu_s": time.thread_time() - cpu_start}
+
+
+_worker_maker = None
+_worker_background = None
+
+
+def _init_worker(settings, background):
+    """Initialisation d'un worker processus : un ImageMaker local branché sur le fond partagé"""
+    global _worker_maker, _worker_background
+    from src.images.images import ImageMaker
+
+    shm, array = SharedArray.attach(background)
+    # Le segment reste ouvert pendant toute la vie du worker
+    _worker_background = shm
+    frame_store = FrameStore(max_bytes=sys.maxsize) if settings["collect"] else None
+    # export_images=False à la construction : ne pas vider le dossier déjà préparé par le parent
+    maker = ImageMaker([], frame_store=frame_store, export_images=False)
+    maker.layered = settings["layered"]
+    maker.export_images = settings["export_images"]
+    maker.image_format = settings["image_format"]
+    maker.background_path = settings["background_path"]
+    maker.cover_background = settings["cover_background"]
+    maker.text_fill, maker.outline_fill, maker.shadow_fill = settings["text_colors"]
+    maker.folder = settings["folder"]
+    maker.target_width = settings["target_width"]
+    maker.target_height = settings["target_height"]
+    maker.shared_card_background = array
+    maker.background_layer = Image.fromarray(array)
+    _worker_maker = maker
+
+
+def _process_batch(batch, trace_parent):
+    """Point d'entrée du pool de processus : génère un lot et renvoie les images au parent"""
+    maker = _worker_maker
+    # Le worker forké hérite des spans du parent : il ne renvoie que les siens
+    tracer = get_tracer()
+    tracer.reset()
+    result = _run_batch(maker, batch, f"pid-{os.getpid()}", trace_parent)
+    frame_store = maker.frame_store
+    if frame_store is not None:
+        result["frames"] = [(key, frame_store.get(key)) for key in frame_store.keys()]
+        result["sprites"] = [(key,) + frame_store.get_sprite(key) for key in frame_store.sprite_keys()]
+        frame_store.clear()
+    result["trace"] = tracer.records()
+    return result
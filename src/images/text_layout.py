@@ -0,0 +1,68 @@
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+from PIL import ImageFont
+
+from src.images.text_render import text_bbox
+
+
+class TextLayout(NamedTuple):
+    lines: Tuple[str, ...]
+    text: str  # lignes jointes par "\n", prêtes pour draw.multiline_text
+    bbox: Tuple[int, int, int, int]  # boîte du texte multiligne dessiné en (0, 0)
+
+
+@lru_cache(maxsize=64)
+def get_font(path, size):
+    """Police FreeType partagée par (chemin, taille) : le fichier n'est lu et parsé qu'une fois"""
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=16384)
+def word_metrics(path, size, word):
+    """(avance, bord droit de l'encre) d'un mot, mesurés une seule fois par police"""
+    font = get_font(path, size)
+    return font.getlength(word), font.getbbox(word)[2]
+
+
+def wrap_words(path, size, text, max_width):
+    """Découpe text en lignes de largeur <= max_width, en temps linéaire : la largeur d'une ligne
+    candidate est l'avance cumulée de ses mots et espaces plus le bord droit du dernier mot,
+    au lieu de remesurer tout le préfixe à chaque mot"""
+    space = word_metrics(path, size, " ")[0]
+    lines = []
+    current = []
+    # Avance de la ligne en cours, espace final compris (0 pour une ligne vide)
+    advance = 0.0
+    for word in text.split():
+        word_advance, word_right = word_metrics(path, size, word)
+        if advance + word_right <= max_width:
+            current.append(word)
+            advance += word_advance + space
+        elif current:
+            lines.append(" ".join(current))
+            current = [word]
+            advance = word_advance + space
+        else:
+            # Mot seul plus large que la ligne : il occupe sa propre ligne
+            lines.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+@lru_cache(maxsize=2048)
+def get_layout(path, size, text, max_width, spacing=4):
+    """Mise en page mémorisée par (texte, taille, largeur max) : une ligne répétée ne refait ni
+    le découpage ni la mesure du bloc"""
+    lines = tuple(wrap_words(path, size, text, max_width))
+    wrapped = "\n".join(lines)
+    return TextLayout(lines, wrapped, text_bbox(wrapped, get_font(path, size), spacing))
+
+
+def layout_cache_info():
+    return {
+        "fonts": get_font.cache_info()._asdict(),
+        "words": word_metrics.cache_info()._asdict(),
+        "layouts": get_layout.cache_info()._asdict()
+    }
@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+_MEASURE_DRAW = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+def text_bbox(text, font, spacing=4):
+    """Boîte (left, top, right, bottom) du texte multiligne dessiné en (0, 0)"""
+    return _MEASURE_DRAW.multiline_textbbox((0, 0), text, font=font, spacing=spacing)
+
+
+def rasterize_text(text, font, padding=0, spacing=4):
+    """Masque de couverture (L) du texte, rastérisé une seule fois, avec une marge de padding
+    pixels. Retourne (masque, (dx, dy)) où (dx, dy) est la position du masque par rapport au
+    point d'ancrage passé à draw.text."""
+    left, top, right, bottom = text_bbox(text, font, spacing)
+    mask = Image.new('L', (right - left + 2 * padding, bottom - top + 2 * padding), 0)
+    ImageDraw.Draw(mask).text((padding - left, padding - top), text, font=font, fill=255, spacing=spacing)
+    return mask, (left - padding, top - padding)
+
+
+def _ink(color, channels):
+    color = tuple(color)
+    if channels == 3:
+        return np.asarray(color[:3], dtype=np.uint8)
+    if len(color) == 3:
+        color += (255,)
+    return np.asarray(color[:4], dtype=np.uint8)
+
+
+def draw_text_layers(image, x, y, text, font, fill=(255, 255, 255), outline_fill=(0, 0, 0, 180),
+                     outline_width=2, shadow_fill=(0, 0, 0, 100), shadow_offset=(4, 4), shadow_blur=0.0,
+                     spacing=4):
+    """Dessine ombre portée + contour + texte en place dans image (RGB ou RGBA), à partir d'un
+    seul masque de glyphes : contour par dilatation, ombre par décalage (et flou
+    optionnel) du même masque, composition limitée à la zone du texte.
+
+    Même mélange que draw.text : chaque couche mélange sa couleur par couverture
+    (sur du RGB l'alpha de la couleur est ignoré, sur du RGBA il est mélangé comme un canal)."""
+    blur_margin = int(np.ceil(shadow_blur * 3))
+    padding = outline_width + blur_margin
+    mask, (mask_dx, mask_dy) = rasterize_text(text, font, padding, spacing)
+    mask = np.asarray(mask)
+    # Dilatation carrée = maximum des 24 décalages de l'ancien contour
+    kernel = np.ones((2 * outline_width + 1, 2 * outline_width + 1), dtype=np.uint8)
+    outline = cv2.dilate(mask, kernel) if outline_width > 0 else None
+    shadow = cv2.GaussianBlur(mask, (0, 0), shadow_blur) if shadow_blur > 0 else mask
+
+    mask_h, mask_w = mask.shape
+    shadow_x, shadow_y = shadow_offset
+    # Zone couvrant le masque et l'ombre décalée, en coordonnées image
+    left = x + mask_dx + min(0, shadow_x)
+    top = y + mask_dy + min(0, shadow_y)
+    right = x + mask_dx + mask_w + max(0, shadow_x)
+    bottom = y + mask_dy + mask_h + max(0, shadow_y)
+    width, height = image.size
+    box = (max(0, left), max(0, top), min(width, right), min(height, bottom))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return
+
+    def coverage(layer, offset_x, offset_y):
+        # Couche placée dans la zone complète puis rognée aux bords de l'image
+        canvas = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        origin_x = x + mask_dx + offset_x - left
+        origin_y = y + mask_dy + offset_y - top
+        canvas[origin_y:origin_y + mask_h, origin_x:origin_x + mask_w] = layer
+        canvas = canvas[box[1] - top:box[3] - top, box[0] - left:box[2] - left]
+        return np.multiply(canvas, np.float32(1.0 / 255.0), dtype=np.float32)
+
+    region = np.asarray(image.crop(box))
+    channels = region.shape[2]
+    # Les couches peintes l'une après l'autre (ombre, contour, texte) reviennent à une seule
+    # couche de couverture totale alpha et de couleur color : une seule passe sur l'image
+    text_alpha = coverage(mask, 0, 0)
+    remaining = np.subtract(1.0, text_alpha, dtype=np.float32)
+    weights = [(text_alpha, fill)]
+    if outline is not None:
+        outline_alpha = coverage(outline, 0, 0)
+        weights.append((outline_alpha * remaining, outline_fill))
+        np.subtract(1.0, outline_alpha, out=outline_alpha)
+        remaining *= outline_alpha
+    shadow_alpha = coverage(shadow, shadow_x, shadow_y)
+    weights.append((shadow_alpha * remaining, shadow_fill))
+    np.subtract(1.0, shadow_alpha, out=shadow_alpha)
+    remaining *= shadow_alpha
+    alpha = np.subtract(1.0, remaining, dtype=np.float32)
+
+    # Couleur de chaque pixel = moyenne des encres pondérée par les poids (cv2.transform : un seul passage)
+    scale = 1.0 / np.maximum(alpha, 1e-6)
+    normalized = cv2.merge([weight * scale for weight, _ in weights])
+    inks = np.array([_ink(ink, channels) for _, ink in weights], dtype=np.float32).T
+    color = cv2.convertScaleAbs(cv2.transform(normalized, inks))
+    # region * (1 - alpha) + color * alpha
+    region = cv2.blendLinear(region, color, remaining, alpha)
+    image.paste(Image.fromarray(region), box)
@@ -0,0 +1,111 @@
+import codecs
+import re
+
+from src.lyrics.timeline import LAST_LINE_DURATION, TimelineBuilder
+
+# [mm:ss], [mm:ss.x], [mm:ss.xx], [mm:ss.xxx] (ou ':' avant la fraction)
+TIME_TAG = re.compile(r"\[(\d+):(\d{1,2})(?:[.:](\d{1,3}))?\]")
+# Mot de l'enhanced LRC : <mm:ss.xx> suivi de son texte
+WORD_TAG = re.compile(r"<(\d+):(\d{1,2})(?:[.:](\d{1,3}))?>([^<]*)")
+# [ar:...], [ti:...], [offset:+250]...
+META_TAG = re.compile(r"\[([A-Za-z#]+):([^\]]*)\]")
+FRACTION_SCALE = (0.0, 0.1, 0.01, 0.001)
+
+
+def tag_seconds(minutes, seconds, fraction=None):
+    """Fraction d'1 à 3 chiffres : .5 = 500 ms, .05 = 50 ms, .005 = 5 ms"""
+    if fraction:
+        return int(minutes) * 60 + int(seconds) + int(fraction) * FRACTION_SCALE[len(fraction)]
+    return int(minutes) * 60 + int(seconds)
+
+
+def iter_lines(source):
+    """Lignes de texte depuis une str, des bytes ou un itérable de morceaux (bytes ou str, ex.
+    response.iter_content()), décodés en UTF-8 (BOM ignoré) au fil de l'eau"""
+    if isinstance(source, str):
+        yield from source.splitlines()
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = (bytes(source),)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    for chunk in source:
+        text = pending + (chunk if isinstance(chunk, str) else decoder.decode(chunk))
+        lines = text.splitlines()
+        # Dernière ligne incomplète : attend le morceau suivant
+        pending = lines.pop() if lines and not text.endswith(("\n", "\r")) else ""
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def parse_words(text):
+    """Texte et mots [(début, fin ou None, mot)] d'une ligne enhanced LRC ("<00:01.00>un <00:01.50>deux")"""
+    tags = [(tag_seconds(minutes, seconds, fraction), segment)
+            for minutes, seconds, fraction, segment in WORD_TAG.findall(text)]
+    words = []
+    for index, (start, segment) in enumerate(tags):
+        tokens = segment.split()
+        if not tokens:
+            continue
+        end = tags[index + 1][0] if index + 1 < len(tags) else None
+        if len(tokens) == 1:
+            words.append((start, end, tokens[0]))
+            continue
+        # Plusieurs mots sous une seule balise : durée partagée à parts égales
+        step = (end - start) / len(tokens) if end is not None else 0.0
+        for position, token in enumerate(tokens):
+            last = position == len(tokens) - 1
+            words.append((start + position * step, end if last else start + (position + 1) * step, token))
+    if tags:
+        text = text[:WORD_TAG.search(text).start()] + "".join(segment for _, segment in tags)
+    return " ".join(text.split()), words
+
+
+def parse_lrc(source, last_duration=LAST_LINE_DURATION):
+    """Parse du LRC en une passe vers une LyricsTimeline (None si aucune ligne synchronisée).
+
+    Gère les fractions d'1 à 3 chiffres, plusieurs timestamps sur une ligne
+    ("[00:12.00][01:30.00]refrain"), le tag [offset:±ms] et les mots de l'enhanced LRC
+    (<mm:ss.xx>). source : str, bytes ou itérable de morceaux de bytes."""
+    builder = TimelineBuilder()
+    lines = []
+    offset = 0.0
+    for raw_line in iter_lines(source):
+        line = raw_line.strip()
+        if not line.startswith("["):
+            continue
+        times = []
+        position = 0
+        match = TIME_TAG.match(line)
+        while match is not None:
+            times.append(tag_seconds(*match.groups()))
+            position = match.end()
+            match = TIME_TAG.match(line, position)
+        if not times:
+            meta = META_TAG.fullmatch(line)
+            if meta is not None and meta.group(1).lower() == "offset":
+                try:
+                    offset = int(meta.group(2).strip()) / 1000
+                except ValueError:
+                    pass
+            continue
+        text = line[position:]
+        words = None
+        if "<" in text:
+            text, words = parse_words(text)
+        else:
+            text = text.strip()
+        for time in times:
+            lines.append((time, text, words, time - times[0]))
+
+    if not lines:
+        return None
+    # Offset positif : paroles affichées plus tôt (il s'applique à tout le fichier, où qu'il soit)
+    for time, text, words, shift in lines:
+        if words:
+            words = [(max(0.0, start + shift - offset), None if end is None else max(0.0, end + shift - offset), word)
+                     for start, end, word in words]
+        builder.add_line(max(0.0, time - offset), text, words=words)
+    return builder.build(last_duration)
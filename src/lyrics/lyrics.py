@@ -1,132 +1,138 @@
 import json
 import re
+import threading
 import requests
 from src.audio.MusicMatch import MusixMatchAPI
+from src.lyrics.lyrics_cache import LyricsCache, get_lyrics_cache
+from src.lyrics.lrc import parse_lrc
+from src.lyrics.providers import Candidate, ProviderResolver, Skip
+from src.lyrics.timeline import TimelineBuilder
+from src.tracing import span, traced
 
 class LyricsFetcher:
-    def __init__(self, artist: str, title: str):
+    def __init__(self, artist: str, title: str, isrc: str = None, cache: LyricsCache = None, use_cache: bool = True,
+                 resolver: ProviderResolver = None):
         self.artist = artist
         self.title = title
+        self.isrc = isrc
         self.lyrics = []
-        self.api = MusixMatchAPI()
+        # Fournisseur des paroles retenues : richsync, subtitle ou lrclib
+        self.source = None
+        self.cache = (cache or get_lyrics_cache()) if use_cache else None
+        self.resolver = resolver or ProviderResolver()
+        # Détail de la dernière résolution (candidat retenu, issue et latence de chaque requête)
+        self.resolution = None
+        self._api = None
+        self._api_lock = threading.Lock()
+        self._search = None
+        self._search_lock = threading.Lock()
+        self._fetch_failed = False
 
+    @property
+    def api(self):
+        # Créée à la première requête : un hit du cache ne récupère pas la clé MusixMatch
+        with self._api_lock:
+            if self._api is None:
+                self._api = MusixMatchAPI()
+            return self._api
+
+    @traced("lyrics.fetch")
     def fetch_lyrics(self):
-        """Récupère les paroles synchronisées depuis MusicXMatch (richsync > subtitle > LRCLib)"""
-        try:
-            # Recherche sur MusicXMatch
-            print(f"🔍 Recherche sur MusicXMatch: '{self.title}' par '{self.artist}'")
-            search = self.api.search_tracks(f"{self.title} {self.artist}")
-            
-            if search["message"]["body"]["track_list"]:
-                track_info = search["message"]["body"]["track_list"][0]["track"]
-                track_id = track_info["track_id"]
-                track_isrc = track_info.get("track_isrc")
-                commontrack_id = track_info.get("commontrack_id")
-                
-                # 1. Tentative avec richsync
-                print("🎵 Tentative richsync...")
-                richsync_lyrics = self._get_richsync_lyrics(track_id, track_isrc, commontrack_id)
-                if richsync_lyrics:
-                    print(f"✅ Paroles richsync trouvées sur MusicXMatch")
-                    self.lyrics = richsync_lyrics
-                    return richsync_lyrics
-                
-                # 2. Tentative avec subtitle
-                print("📝 Tentative subtitle...")
-                subtitle_lyrics = self._get_subtitle_lyrics(track_id, track_isrc, commontrack_id)
-                if subtitle_lyrics:
-                    print(f"✅ Paroles subtitle trouvées sur MusicXMatch")
-                    self.lyrics = subtitle_lyrics
-                    return subtitle_lyrics
-            
-            # 3. Fallback vers LRCLib
-            print("🔄 Fallback vers LRCLib...")
-            lrclib_lyrics = self._fetch_from_lrclib()
-            if lrclib_lyrics:
-                print(f"✅ Paroles synchronisées trouvées sur LRCLib")
-                self.lyrics = lrclib_lyrics
-                return lrclib_lyrics
-            
+        """Récupère les paroles synchronisées : cache local (ISRC, puis artiste/titre), sinon
+        MusicXMatch (richsync > subtitle > LRCLib) et mise en cache du résultat, même négatif"""
+        if self.cache is not None:
+            with span("lyrics.cache") as trace:
+                cached = self.cache.get(self.isrc, self.artist, self.title)
+                trace.add(hits=int(cached is not None))
+            if cached is not None:
+                if cached.lyrics is None:
+                    print("♻️ Aucune parole synchronisée (résultat en cache)")
+                    self.lyrics = []
+                    return None
+                print(f"♻️ Paroles en cache ({cached.source})")
+                self.lyrics = cached.lyrics
+                self.source = cached.source
+                return self.lyrics
+
+        self._fetch_failed = False
+        lyrics = self._fetch_from_providers()
+        # Une erreur réseau n'est pas un résultat négatif : rien n'est mis en cache
+        if self.cache is not None and not self._fetch_failed:
+            self.cache.put(lyrics, self.source, isrc=self.isrc, artist=self.artist, title=self.title)
+        return lyrics
+
+    def _fetch_from_providers(self):
+        """Interroge en parallèle toutes les sources (richsync et subtitle par ISRC, commontrack_id
+        et track_id, puis LRCLib) et garde la meilleure dans cet ordre"""
+        print(f"🔍 Recherche des paroles : '{self.title}' par '{self.artist}' (MusicXMatch et LRCLib en parallèle)")
+        resolution = self.resolver.resolve(self._candidates())
+        self.resolution = resolution
+        self._fetch_failed = resolution.failed
+        if resolution.lyrics:
+            print(f"✅ Paroles {resolution.provider} trouvées ({resolution.label}, {resolution.wall_s:.2f}s)")
+            self.lyrics = resolution.lyrics
+            self.source = resolution.provider
+            return resolution.lyrics
+        if resolution.failed:
+            print(f"❌ Aucune parole synchronisée trouvée (requêtes en erreur, {resolution.wall_s:.2f}s)")
+        else:
             print("❌ Aucune parole synchronisée trouvée")
-            self.lyrics = []
-            return None
-                
-        except Exception as e:
-            print(f"❌ Erreur lors de la récupération des paroles: {e}")
-            self.lyrics = []
-            return None
+        self.lyrics = []
+        return None
 
-    def _get_richsync_lyrics(self, track_id, track_isrc, commontrack_id):
-        """Récupère les paroles richsync depuis MusicXMatch"""
-        try:
-            # Essaie avec les différents identifiants disponibles
-            richsync_data = None
-            
-            if track_isrc:
-                try:
-                    richsync = self.api.get_track_richsync(track_isrc=track_isrc)
-                    richsync_data = self._extract_richsync_body(richsync)
-                except:
-                    pass
-            
-            if not richsync_data and commontrack_id:
-                try:
-                    richsync = self.api.get_track_richsync(commontrack_id=commontrack_id)
-                    richsync_data = self._extract_richsync_body(richsync)
-                except:
-                    pass
-            
-            if not richsync_data and track_id:
-                try:
-                    richsync = self.api.get_track_richsync(track_id=track_id)
-                    richsync_data = self._extract_richsync_body(richsync)
-                except:
-                    pass
-            
-            if richsync_data:
-                return self._parse_richsync_lyrics(richsync_data)
-            
-            return None
-                
-        except Exception as e:
-            print(f"❌ Erreur richsync: {e}")
-            return None
+    def _candidates(self):
+        """Requêtes candidates, dans l'ordre de priorité"""
+        candidates = []
+        for provider, fetch in (("richsync", self._richsync_by), ("subtitle", self._subtitle_by)):
+            for id_name in ("isrc", "commontrack_id", "track_id"):
+                candidates.append(Candidate(provider, f"{provider}:{id_name}",
+                                            lambda fetch=fetch, id_name=id_name: fetch(id_name)))
+        candidates.append(Candidate("lrclib", "lrclib", self._fetch_from_lrclib))
+        return candidates
 
-    def _get_subtitle_lyrics(self, track_id, track_isrc, commontrack_id):
-        """Récupère les paroles subtitle depuis MusicXMatch"""
-        try:
-            # Essaie avec les différents identifiants disponibles
-            subtitle_data = None
-            
-            if track_isrc:
-                try:
-                    subtitle = self.api.get_track_subtitle(track_isrc=track_isrc, subtitle_format="lrc")
-                    subtitle_data = self._extract_subtitle_body(subtitle)
-                except:
-                    pass
-            
-            if not subtitle_data and commontrack_id:
-                try:
-                    subtitle = self.api.get_track_subtitle(commontrack_id=commontrack_id, subtitle_format="lrc")
-                    subtitle_data = self._extract_subtitle_body(subtitle)
-                except:
-                    pass
-            
-            if not subtitle_data and track_id:
+    def _search_ids(self):
+        """Identifiants MusicXMatch du morceau (recherche faite une seule fois, par le premier
+        candidat qui en a besoin ; les autres attendent son résultat)"""
+        with self._search_lock:
+            if self._search is None:
                 try:
-                    subtitle = self.api.get_track_subtitle(track_id=track_id, subtitle_format="lrc")
-                    subtitle_data = self._extract_subtitle_body(subtitle)
-                except:
-                    pass
-            
-            if subtitle_data:
-                return self._parse_lrc_format(subtitle_data)
-            
-            return None
-                
-        except Exception as e:
-            print(f"❌ Erreur subtitle: {e}")
-            return None
+                    search = self.api.search_tracks(f"{self.title} {self.artist}")
+                    track_list = search["message"]["body"]["track_list"]
+                    track_info = track_list[0]["track"] if track_list else {}
+                    self._search = {
+                        "track_id": track_info.get("track_id"),
+                        "isrc": track_info.get("track_isrc"),
+                        "commontrack_id": track_info.get("commontrack_id")
+                    }
+                except Exception as e:
+                    self._search = e
+            if isinstance(self._search, Exception):
+                raise self._search
+            return self._search
+
+    def _track_id(self, id_name):
+        # L'ISRC Deezer évite d'attendre la recherche MusicXMatch
+        if id_name == "isrc" and self.isrc:
+            return self.isrc
+        value = self._search_ids().get(id_name)
+        if not value:
+            raise Skip()
+        return value
+
+    def _richsync_by(self, id_name):
+        """Paroles richsync pour un identifiant (isrc, commontrack_id ou track_id)"""
+        value = self._track_id(id_name)
+        keyword = "track_isrc" if id_name == "isrc" else id_name
+        richsync_data = self._extract_richsync_body(self.api.get_track_richsync(**{keyword: value}))
+        return self._parse_richsync_lyrics(richsync_data) if richsync_data else None
+
+    def _subtitle_by(self, id_name):
+        """Paroles subtitle (LRC) pour un identifiant (isrc, commontrack_id ou track_id)"""
+        value = self._track_id(id_name)
+        keyword = "track_isrc" if id_name == "isrc" else id_name
+        subtitle_data = self._extract_subtitle_body(
+            self.api.get_track_subtitle(**{keyword: value}, subtitle_format="lrc"))
+        return self._parse_lrc_format(subtitle_data) if subtitle_data else None
 
     def _extract_richsync_body(self, richsync_response):
         """Extrait le corps des richsync de la réponse API"""
@@ -167,82 +173,43 @@ class LyricsFetcher:
             return None
 
     def _fetch_from_lrclib(self):
-        """Récupère les paroles depuis LRCLib"""
-        try:
-            artist_encoded = "+".join(self.artist.split())
-            title_encoded = "+".join(self.title.split())
-            
-            url = f"https://lrclib.net/api/get?artist_name={artist_encoded}&track_name={title_encoded}"
-            response = requests.get(url)
-            data = response.json()
+        """Récupère les paroles depuis LRCLib (les erreurs sont relevées par le ProviderResolver)"""
+        artist_encoded = "+".join(self.artist.split())
+        title_encoded = "+".join(self.title.split())
+        
+        url = f"https://lrclib.net/api/get?artist_name={artist_encoded}&track_name={title_encoded}"
+        with span("lrclib.request") as trace:
+            response = requests.get(url, timeout=5)
+            trace.add(bytes=len(response.content))
+        data = response.json()
 
-            # Vérifier si 'syncedLyrics' existe et n'est pas vide
-            if "syncedLyrics" not in data or not data["syncedLyrics"]:
-                return None
-
-            synced_lyrics = data["syncedLyrics"].split("\n")
-            formatted_lyrics = []
-
-            for line in synced_lyrics:
-                split_line = line.strip()[1:].split("] ")
-                if len(split_line) == 1:
-                    split_line[0] = split_line[0][:-1]
-
-                timestamp = split_line[0]
-                line_text = split_line[1] if len(split_line) == 2 else ""
-
-                mins, sec = map(float, timestamp.split(":"))
-                formatted_lyrics.append({
-                    "timestamp": mins * 60 + sec,
-                    "line": line_text
-                })
-
-            return formatted_lyrics
-
-        except Exception as e:
-            print(f"❌ Erreur LRCLib: {e}")
+        # Vérifier si 'syncedLyrics' existe et n'est pas vide
+        if "syncedLyrics" not in data or not data["syncedLyrics"]:
             return None
 
+        return parse_lrc(data["syncedLyrics"])
+
     def _parse_richsync_lyrics(self, richsync_body):
-        """Parse les données richsync JSON en format compatible"""
+        """Parse les données richsync JSON en LyricsTimeline, timing mot à mot compris"""
         try:
             # Les richsync sont généralement en format JSON
             richsync_data = json.loads(richsync_body)
-            formatted_lyrics = []
+            builder = TimelineBuilder()
             
             # MusicXMatch richsync format peut varier, on essaie plusieurs structures
             if isinstance(richsync_data, list):
                 # Format liste directe
-                for item in richsync_data:
-                    if isinstance(item, dict) and 'ts' in item and 'l' in item:
-                        # Gestion des caractères dans les paroles
-                        line_text = ""
-                        if item['l'] and isinstance(item['l'], list):
-                            for char_info in item['l']:
-                                if isinstance(char_info, dict) and 'c' in char_info:
-                                    line_text += char_info['c']
-                        
-                        formatted_lyrics.append({
-                            "timestamp": float(item['ts']),
-                            "line": line_text.strip()
-                        })
+                items = richsync_data
             elif isinstance(richsync_data, dict):
                 # Format objet avec clés
-                if 'lyrics' in richsync_data:
-                    for item in richsync_data['lyrics']:
-                        if isinstance(item, dict) and 'ts' in item and 'l' in item:
-                            line_text = ""
-                            if item['l'] and isinstance(item['l'], list):
-                                for char_info in item['l']:
-                                    if isinstance(char_info, dict) and 'c' in char_info:
-                                        line_text += char_info['c']
-                            
-                            formatted_lyrics.append({
-                                "timestamp": float(item['ts']),
-                                "line": line_text.strip()
-                            })
+                items = richsync_data.get('lyrics', [])
+            else:
+                items = []
+            for item in items:
+                if isinstance(item, dict) and 'ts' in item and 'l' in item:
+                    self._add_richsync_line(builder, item)
             
-            return formatted_lyrics if formatted_lyrics else None
+            return builder.build() if len(builder) else None
             
         except json.JSONDecodeError:
             # Si ce n'est pas du JSON valide, on essaie de parser comme du texte LRC
@@ -251,29 +218,38 @@ class LyricsFetcher:
             print(f"❌ Erreur lors du parsing richsync: {e}")
             return None
 
+    def _add_richsync_line(self, builder, item):
+        """Une ligne richsync : ts/te en secondes, l = [{"c": caractères, "o": décalage depuis ts}]"""
+        start = float(item['ts'])
+        end = float(item['te']) if item.get('te') is not None else None
+        entries = []
+        if item['l'] and isinstance(item['l'], list):
+            for char_info in item['l']:
+                if isinstance(char_info, dict) and 'c' in char_info:
+                    entries.append((char_info['c'], start + float(char_info.get('o') or 0)))
+        # Un mot commence à son premier caractère et finit au blanc suivant (ou à la fin de la ligne)
+        words = []
+        current, current_start = "", start
+        for chars, time in entries:
+            for piece in re.split(r'(\s+)', chars):
+                if not piece:
+                    continue
+                if piece.isspace():
+                    if current:
+                        words.append((current_start, time, current))
+                        current = ""
+                else:
+                    if not current:
+                        current_start = time
+                    current += piece
+        if current:
+            words.append((current_start, end if end is not None else entries[-1][1], current))
+        builder.add_line(start, "".join(chars for chars, _ in entries).strip(), end=end, words=words)
+
     def _parse_lrc_format(self, lyrics_text):
-        """Parse le format LRC standard"""
+        """Parse le format LRC (toutes variantes, voir src.lyrics.lrc) en LyricsTimeline"""
         try:
-            lines = lyrics_text.strip().split('\n')
-            formatted_lyrics = []
-            
-            for line in lines:
-                # Pattern pour les timestamps LRC [mm:ss.xx] ou [mm:ss:xx]
-                match = re.match(r'\[(\d{2}):(\d{2})[\.:](\d{2})\](.*)', line.strip())
-                if match:
-                    minutes = int(match.group(1))
-                    seconds = int(match.group(2))
-                    centiseconds = int(match.group(3))
-                    text = match.group(4).strip()
-                    
-                    timestamp = minutes * 60 + seconds + centiseconds / 100
-                    formatted_lyrics.append({
-                        "timestamp": timestamp,
-                        "line": text
-                    })
-            
-            return formatted_lyrics if formatted_lyrics else None
-            
+            return parse_lrc(lyrics_text)
         except Exception as e:
             print(f"❌ Erreur lors du parsing LRC: {e}")
             return None
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import NamedTuple, Optional
+
+from src.lyrics.timeline import LyricsTimeline
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LYRICS_CACHE_PATH = os.path.join(PROJECT_ROOT, ".cache", "lyrics.sqlite")
+# À incrémenter si le format des paroles stockées change (les anciennes entrées sont ignorées)
+LYRICS_CACHE_VERSION = 3
+# Paroles trouvées : elles ne changent quasiment jamais
+LYRICS_TTL = 30 * 24 * 3600
+# Aucune parole trouvée : revérifié plus souvent, les fournisseurs ajoutent des paroles
+MISS_TTL = 24 * 3600
+
+
+class CachedLyrics(NamedTuple):
+    lyrics: Optional[LyricsTimeline]  # None : résultat négatif (aucune parole synchronisée)
+    source: Optional[str]  # richsync, subtitle ou lrclib
+    fetched_at: float
+
+
+def normalize(text):
+    """Artiste/titre comparables : casse, accents et espaces ignorés"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+
+def title_key(artist, title):
+    return f"title:{normalize(artist)}|{normalize(title)}"
+
+
+def isrc_key(isrc):
+    return f"isrc:{isrc.strip().upper()}"
+
+
+class LyricsCache:
+    """Paroles déjà récupérées, dans une base SQLite locale : indexées par ISRC, avec l'artiste et
+    le titre en repli. Les résultats négatifs sont gardés aussi, avec un TTL plus court, pour ne
+    pas réinterroger les fournisseurs à chaque tirage d'un morceau sans paroles."""
+
+    def __init__(self, path=LYRICS_CACHE_PATH, ttl=LYRICS_TTL, miss_ttl=MISS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Une connexion partagée par les threads, protégée par self._lock
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS lyrics ("
+                " key TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL,"
+                " source TEXT,"
+                " lyrics TEXT,"
+                " fetched_at REAL NOT NULL)"
+            )
+            # Entrées expirées purgées à chaque ouverture : le fichier ne grossit pas indéfiniment
+            self._prune(self._connection)
+        return self._connection
+
+    def _keys(self, isrc, artist, title):
+        keys = []
+        if isrc:
+            keys.append(isrc_key(isrc))
+        if artist or title:
+            keys.append(title_key(artist, title))
+        return keys
+
+    def get(self, isrc=None, artist=None, title=None) -> Optional[CachedLyrics]:
+        """Entrée encore valide pour ce morceau (ISRC d'abord, puis artiste/titre), ou None"""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            for key in self._keys(isrc, artist, title):
+                row = connection.execute(
+                    "SELECT source, lyrics, fetched_at FROM lyrics WHERE key = ? AND version = ?",
+                    (key, LYRICS_CACHE_VERSION)).fetchone()
+                if row is None:
+                    continue
+                source, lyrics, fetched_at = row
+                ttl = self.ttl if lyrics is not None else self.miss_ttl
+                if now - fetched_at > ttl:
+                    continue
+                if lyrics is None:
+                    self.negative_hits += 1
+                    return CachedLyrics(None, None, fetched_at)
+                self.hits += 1
+                return CachedLyrics(LyricsTimeline.from_dict(json.loads(lyrics)), source, fetched_at)
+            self.misses += 1
+            return None
+
+    def put(self, lyrics, source=None, isrc=None, artist=None, title=None):
+        """Enregistre le résultat (LyricsTimeline ou liste de dicts, None : aucune parole) sous l'ISRC
+        et sous artiste/titre"""
+        payload = None
+        if lyrics is not None:
+            payload = json.dumps(LyricsTimeline.from_lines(lyrics).to_dict(), ensure_ascii=False)
+        fetched_at = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO lyrics (key, version, source, lyrics, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, LYRICS_CACHE_VERSION, source, payload, fetched_at)
+                 for key in self._keys(isrc, artist, title)])
+            connection.commit()
+
+    def _prune(self, connection):
+        now = time.time()
+        cursor = connection.execute(
+            "DELETE FROM lyrics WHERE version != ?"
+            " OR (lyrics IS NOT NULL AND fetched_at < ?)"
+            " OR (lyrics IS NULL AND fetched_at < ?)",
+            (LYRICS_CACHE_VERSION, now - self.ttl, now - self.miss_ttl))
+        connection.commit()
+        return cursor.rowcount
+
+    def prune(self):
+        """Supprime les entrées expirées ou d'une ancienne version ; retourne leur nombre"""
+        with self._lock:
+            return self._prune(self._connect())
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "negative_hits": self.negative_hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+_lyrics_cache = None
+_lyrics_cache_lock = threading.Lock()
+
+
+def get_lyrics_cache():
+    global _lyrics_cache
+    with _lyrics_cache_lock:
+        if _lyrics_cache is None:
+            _lyrics_cache = LyricsCache()
+        return _lyrics_cache
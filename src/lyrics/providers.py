@@ -0,0 +1,153 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from src.lyrics.timeline import LyricsTimeline
+from src.tracing import propagate, span
+
+# Ordre de préférence des fournisseurs : le premier résultat valide dans cet ordre l'emporte
+PROVIDER_PRIORITY = ("richsync", "subtitle", "lrclib")
+# Délai maximal de la résolution (chaque requête a déjà son propre timeout de 5 s)
+RESOLVE_TIMEOUT = 15.0
+
+
+class Skip(Exception):
+    """Levée par un candidat sans objet (identifiant absent) : ni requête, ni échec"""
+
+
+class Candidate(NamedTuple):
+    provider: str  # richsync, subtitle ou lrclib
+    label: str  # fournisseur et identifiant utilisé, ex. "richsync:isrc"
+    fetch: Callable[[], Optional[LyricsTimeline]]  # paroles parsées, ou None
+
+
+class Resolution(NamedTuple):
+    lyrics: Optional[LyricsTimeline]
+    provider: Optional[str]
+    label: Optional[str]
+    # Aucune parole, mais à cause d'une erreur ou du délai dépassé : ce n'est pas un résultat négatif
+    failed: bool
+    wall_s: float
+    outcomes: Dict[str, dict]  # label -> {"outcome": hit|miss|error|skipped|cancelled, "ms": ...}
+
+
+class ProviderStats:
+    """Latence et taux de succès de chaque candidat, cumulés sur tout le processus"""
+
+    OUTCOMES = ("hit", "miss", "error", "skipped", "cancelled")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, label, outcome, latency_s=None):
+        with self._lock:
+            stats = self._stats.setdefault(label, dict.fromkeys(self.OUTCOMES, 0) | {"total_s": 0.0, "max_s": 0.0})
+            stats[outcome] += 1
+            if latency_s is not None and outcome in ("hit", "miss", "error"):
+                stats["total_s"] += latency_s
+                stats["max_s"] = max(stats["max_s"], latency_s)
+
+    def summary(self):
+        with self._lock:
+            summary = {}
+            for label, stats in self._stats.items():
+                completed = stats["hit"] + stats["miss"] + stats["error"]
+                summary[label] = {outcome: stats[outcome] for outcome in self.OUTCOMES}
+                summary[label]["hit_rate"] = round(stats["hit"] / completed, 3) if completed else None
+                summary[label]["mean_ms"] = round(stats["total_s"] / completed * 1000, 1) if completed else None
+                summary[label]["max_ms"] = round(stats["max_s"] * 1000, 1)
+            return summary
+
+    def print_summary(self):
+        for label, stats in self.summary().items():
+            hit_rate = f"{stats['hit_rate']:.0%}" if stats["hit_rate"] is not None else "-"
+            mean = f"{stats['mean_ms']:.0f} ms" if stats["mean_ms"] is not None else "-"
+            print(f"   {label}: {hit_rate} de succès, {mean} en moyenne "
+                  f"({stats['error']} erreurs, {stats['cancelled']} annulées)")
+
+
+class ProviderResolver:
+    """Lance toutes les requêtes candidates en même temps (pool de threads) et retourne le
+    résultat valide de plus haute priorité : un candidat ne l'emporte qu'une fois tous les
+    candidats prioritaires terminés sans paroles. Les candidats restants sont alors annulés
+    (abandonnés s'ils sont déjà en vol : une requête HTTP en cours ne s'interrompt pas)."""
+
+    def __init__(self, workers=None, timeout=RESOLVE_TIMEOUT, stats: ProviderStats = None):
+        self.workers = workers
+        self.timeout = timeout
+        self.stats = stats or get_provider_stats()
+
+    def _run(self, candidate, abandoned):
+        start = time.perf_counter()
+        with span("lyrics.provider", provider=candidate.label):
+            try:
+                lyrics = candidate.fetch()
+                outcome = "hit" if lyrics else "miss"
+            except Skip:
+                lyrics, outcome = None, "skipped"
+            except Exception as e:
+                print(f"⚠️ {candidate.label} : {e}")
+                lyrics, outcome = None, "error"
+        latency = time.perf_counter() - start
+        # Résultat arrivé après la décision : compté comme annulé
+        self.stats.record(candidate.label, "cancelled" if abandoned.is_set() else outcome, latency)
+        return lyrics, outcome, latency
+
+    def resolve(self, candidates: List[Candidate]) -> Resolution:
+        """candidates : dans l'ordre de priorité"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        abandoned = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.workers or max(1, len(candidates)),
+                                      thread_name_prefix="lyrics-provider")
+        futures = [executor.submit(propagate(self._run), candidate, abandoned) for candidate in candidates]
+        winner = None
+        timed_out = False
+        try:
+            while True:
+                decided = True
+                for candidate, future in zip(candidates, futures):
+                    if not future.done():
+                        decided = False
+                        break
+                    lyrics, outcome, _ = future.result()
+                    if outcome == "hit":
+                        winner = (candidate, lyrics)
+                        break
+                if winner is not None or decided:
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                wait([future for future in futures if not future.done()], timeout=remaining,
+                     return_when=FIRST_COMPLETED)
+        finally:
+            abandoned.set()
+            outcomes = {}
+            for candidate, future in zip(candidates, futures):
+                if future.done() and not future.cancelled():
+                    _, outcome, latency = future.result()
+                    outcomes[candidate.label] = {"outcome": outcome, "ms": round(latency * 1000, 1)}
+                else:
+                    if future.cancel():
+                        # Jamais démarré : _run ne l'enregistrera pas
+                        self.stats.record(candidate.label, "cancelled")
+                    outcomes[candidate.label] = {"outcome": "cancelled", "ms": None}
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        wall_s = time.perf_counter() - start
+        if winner is not None:
+            candidate, lyrics = winner
+            return Resolution(lyrics, candidate.provider, candidate.label, False, wall_s, outcomes)
+        failed = timed_out or any(entry["outcome"] == "error" for entry in outcomes.values())
+        return Resolution(None, None, None, failed, wall_s, outcomes)
+
+
+_provider_stats = ProviderStats()
+
+
+def get_provider_stats():
+    return _provider_stats
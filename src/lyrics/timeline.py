@@ -0,0 +1,250 @@
+import bisect
+import math
+from collections.abc import Sequence
+
+import numpy as np
+
+# Durée d'affichage de la dernière ligne quand la source ne donne pas sa fin (comme last_image_duration)
+LAST_LINE_DURATION = 4.0
+# Blancs au sens de \s (re), indexés par point de code (tous <= U+3000) : séparent les mots
+IS_WHITESPACE = np.array([chr(code).isspace() for code in range(0x3001)] + [False], dtype=bool)
+
+
+class TimelineBuilder:
+    """Accumule les lignes d'un parseur (dans n'importe quel ordre) avant de les figer en LyricsTimeline"""
+
+    def __init__(self):
+        self._lines = []
+
+    def add_line(self, start, text, end=None, words=None):
+        """words : [(début, fin, texte)] quand la source donne le timing mot à mot (fin None :
+        jusqu'à la fin de la ligne)"""
+        self._lines.append((float(start), text, None if end is None else float(end), words))
+
+    def __len__(self):
+        return len(self._lines)
+
+    def build(self, last_duration=LAST_LINE_DURATION):
+        # Tri stable : deux lignes au même timestamp gardent l'ordre de la source
+        lines = sorted(self._lines, key=lambda line: line[0])
+        count = len(lines)
+        starts = [line[0] for line in lines]
+        ends = []
+        for index, (start, _, end, _) in enumerate(lines):
+            if end is None or end <= start:
+                # Sans fin connue : jusqu'à la ligne suivante
+                end = starts[index + 1] if index + 1 < count else start + last_duration
+            ends.append(max(end, start))
+
+        buffer = [line[1] for line in lines]
+        text = "".join(buffer)
+        line_offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum([len(line) for line in buffer], out=line_offsets[1:])
+        starts = np.array(starts, dtype=np.float64)
+        ends = np.array(ends, dtype=np.float64)
+        word_timed = np.array([bool(line[3]) for line in lines], dtype=bool)
+
+        # Mots avec timing de la source (richsync, enhanced LRC) : positionnés dans le texte
+        timed_lines, timed_offsets, timed_starts, timed_ends = [], [], [], []
+        for index in np.flatnonzero(word_timed).tolist():
+            _, line_text, _, words = lines[index]
+            position, end = int(line_offsets[index]), ends[index]
+            search_from = 0
+            for word_start, word_end, word in words:
+                offset = line_text.find(word, search_from)
+                if offset < 0:
+                    offset = search_from
+                search_from = offset + len(word)
+                timed_lines.append(index)
+                timed_offsets.append((position + offset, position + offset + len(word)))
+                timed_starts.append(word_start)
+                timed_ends.append(max(end if word_end is None else word_end, word_start))
+
+        # Autres lignes : mots découpés sur tout le buffer d'un coup (numpy), puis répartis sur
+        # la ligne au prorata du nombre de caractères
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        is_word = ~IS_WHITESPACE[np.minimum(codes, len(IS_WHITESPACE) - 1)]
+        boundary = np.zeros(len(codes) + 1, dtype=bool)
+        boundary[line_offsets] = True
+        previous_word = np.concatenate(([False], is_word)) & ~boundary
+        next_word = np.concatenate((is_word, [False])) & ~boundary
+        firsts = np.flatnonzero(is_word & ~previous_word[:-1])
+        stops = np.flatnonzero(is_word & ~next_word[1:]) + 1
+        word_lines = np.searchsorted(line_offsets, firsts, side="right") - 1
+        keep = ~word_timed[word_lines]
+        firsts, stops, word_lines = firsts[keep], stops[keep], word_lines[keep]
+        lengths = (stops - firsts).astype(np.float64)
+        totals = np.bincount(word_lines, weights=lengths, minlength=count)
+        before = np.cumsum(lengths) - lengths
+        first_word = np.searchsorted(word_lines, np.arange(count))
+        line_base = before[np.minimum(first_word, max(len(before) - 1, 0))] if len(before) else np.zeros(count)
+        durations = (ends - starts)[word_lines]
+        fraction = (before - line_base[word_lines]) / np.maximum(totals[word_lines], 1)
+        interpolated_starts = starts[word_lines] + durations * fraction
+        interpolated_ends = interpolated_starts + durations * lengths / np.maximum(totals[word_lines], 1)
+
+        all_lines = np.concatenate((np.array(timed_lines, dtype=np.int64), word_lines))
+        all_offsets = np.concatenate((np.array(timed_offsets, dtype=np.int64).reshape(-1, 2),
+                                      np.stack((firsts, stops), axis=1)))
+        order = np.lexsort((all_offsets[:, 0], all_lines))
+        all_lines = all_lines[order]
+        return LyricsTimeline(
+            text, line_offsets.astype(np.int32), starts, ends,
+            np.searchsorted(all_lines, np.arange(count + 1)).astype(np.int32), word_timed,
+            all_offsets[order].astype(np.int32),
+            np.concatenate((np.array(timed_starts, dtype=np.float64), interpolated_starts))[order],
+            np.concatenate((np.array(timed_ends, dtype=np.float64), interpolated_ends))[order])
+
+
+class LyricsTimeline(Sequence):
+    """Paroles synchronisées en tableaux numpy parallèles : début/fin de chaque ligne et de chaque
+    mot, et leurs positions dans un seul buffer de texte. Reste utilisable comme l'ancienne liste
+    de dicts {"timestamp", "line"} (itération, index, len) ; active_line/active_word trouvent la
+    ligne ou le mot affiché à un instant par bisection, line_at_frame/word_at_frame en O(1)."""
+
+    __slots__ = ("text", "line_offsets", "line_starts", "line_ends", "line_words", "word_timed",
+                 "word_offsets", "word_starts", "word_ends", "_line_start_list", "_word_start_list", "_frame_tables")
+
+    def __init__(self, text, line_offsets, line_starts, line_ends, line_words, word_timed,
+                 word_offsets, word_starts, word_ends):
+        self.text = text
+        self.line_offsets = line_offsets
+        self.line_starts = line_starts
+        self.line_ends = line_ends
+        # Mots de la ligne i : word_*[line_words[i]:line_words[i + 1]]
+        self.line_words = line_words
+        # Timing mot à mot donné par la source (richsync) ou estimé
+        self.word_timed = word_timed
+        self.word_offsets = word_offsets
+        self.word_starts = word_starts
+        self.word_ends = word_ends
+        # Listes Python pour bisect : plus rapides que searchsorted sur un seul instant
+        self._line_start_list = line_starts.tolist()
+        self._word_start_list = word_starts.tolist()
+        self._frame_tables = {}
+
+    @classmethod
+    def from_lines(cls, lines, last_duration=LAST_LINE_DURATION):
+        """Depuis une liste de dicts {"timestamp", "line"} (ou une LyricsTimeline, retournée telle quelle)"""
+        if isinstance(lines, cls):
+            return lines
+        builder = TimelineBuilder()
+        for line in lines:
+            builder.add_line(line["timestamp"], line["line"])
+        return builder.build(last_duration)
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def line_text(self, index):
+        return self.text[self.line_offsets[index]:self.line_offsets[index + 1]]
+
+    def word_text(self, index):
+        start, end = self.word_offsets[index]
+        return self.text[start:end]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("LyricsTimeline index out of range")
+        return {"timestamp": self._line_start_list[index], "line": self.line_text(index)}
+
+    def __iter__(self):
+        offsets = self.line_offsets.tolist()
+        for index, start in enumerate(self._line_start_list):
+            yield {"timestamp": start, "line": self.text[offsets[index]:offsets[index + 1]]}
+
+    def __eq__(self, other):
+        if isinstance(other, LyricsTimeline):
+            return self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"LyricsTimeline({len(self)} lignes, {len(self.word_starts)} mots)"
+
+    @property
+    def has_word_timing(self):
+        return bool(self.word_timed.any())
+
+    def words(self, line_index):
+        """[(début, fin, texte)] des mots d'une ligne"""
+        first, last = self.line_words[line_index], self.line_words[line_index + 1]
+        return [(float(self.word_starts[index]), float(self.word_ends[index]), self.word_text(index))
+                for index in range(first, last)]
+
+    def active_line(self, t):
+        """Index de la ligne affichée à l'instant t (début <= t < fin), -1 sinon"""
+        index = bisect.bisect_right(self._line_start_list, t) - 1
+        if index < 0 or t >= self.line_ends[index]:
+            return -1
+        return index
+
+    def active_word(self, t):
+        """Index (dans word_*) du mot chanté à l'instant t, -1 sinon"""
+        index = bisect.bisect_right(self._word_start_list, t) - 1
+        if index < 0 or t >= self.word_ends[index]:
+            return -1
+        return index
+
+    def _frame_table(self, starts, ends, fps):
+        """Index actif pour chaque image jusqu'à la dernière fin (-1 : aucun)"""
+        frame_count = int(math.ceil((ends.max() if len(ends) else 0.0) * fps)) + 1
+        times = np.arange(frame_count, dtype=np.float64) / fps
+        indices = np.searchsorted(starts, times, side="right") - 1
+        active = indices >= 0
+        active[active] = times[active] < ends[indices[active]]
+        return np.where(active, indices, -1).astype(np.int32)
+
+    def frame_lines(self, fps):
+        """Ligne active à chaque image (calculé une fois par fps)"""
+        key = ("lines", fps)
+        if key not in self._frame_tables:
+            self._frame_tables[key] = self._frame_table(self.line_starts, self.line_ends, fps)
+        return self._frame_tables[key]
+
+    def frame_words(self, fps):
+        """Mot actif à chaque image (calculé une fois par fps)"""
+        key = ("words", fps)
+        if key not in self._frame_tables:
+            self._frame_tables[key] = self._frame_table(self.word_starts, self.word_ends, fps)
+        return self._frame_tables[key]
+
+    def line_at_frame(self, frame, fps):
+        table = self.frame_lines(fps)
+        return int(table[frame]) if 0 <= frame < len(table) else -1
+
+    def word_at_frame(self, frame, fps):
+        table = self.frame_words(fps)
+        return int(table[frame]) if 0 <= frame < len(table) else -1
+
+    def to_dict(self):
+        """Forme JSON (cache des paroles)"""
+        return {
+            "text": self.text,
+            "line_offsets": self.line_offsets.tolist(),
+            "line_starts": self.line_starts.tolist(),
+            "line_ends": self.line_ends.tolist(),
+            "line_words": self.line_words.tolist(),
+            "word_timed": self.word_timed.tolist(),
+            "word_offsets": self.word_offsets.tolist(),
+            "word_starts": self.word_starts.tolist(),
+            "word_ends": self.word_ends.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["text"],
+            np.array(data["line_offsets"], dtype=np.int32),
+            np.array(data["line_starts"], dtype=np.float64),
+            np.array(data["line_ends"], dtype=np.float64),
+            np.array(data["line_words"], dtype=np.int32),
+            np.array(data["word_timed"], dtype=bool),
+            np.array(data["word_offsets"], dtype=np.int32).reshape(-1, 2),
+            np.array(data["word_starts"], dtype=np.float64),
+            np.array(data["word_ends"], dtype=np.float64))
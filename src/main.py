@@ -2,10 +2,16 @@ import os
 import json
 import time
 import numpy as np
-from src.video.video import LyricsFetcher, AudioFetcher, ImageMaker, VideoMakerV2
+from src.video.video import LyricsFetcher, AudioFetcher, ImageMaker, VideoMakerV2, VideoConfig
+from src.images.frame_store import FrameStore
+from src.images.card_stream import StreamingFrameStore
+from src.images.scheduler import ImageScheduler
 from src.audio.music_choose import choose_random_track
 from src.images.cover_get import download_cover
+from src.images.cover_background import get_cover_cache
 from src.post import TikTokPoster, get_tiktok_auth_url
+from src.lyrics.providers import get_provider_stats
+from src.tracing import get_tracer, span
 
 # Sélection aléatoire d'une musique
 print("🎲 Sélection aléatoire d'une musique...")
@@ -16,7 +22,8 @@ attempt = 0
 lyrics_found = False
 
 while attempt < max_attempts and not lyrics_found:
-    track_info = choose_random_track()
+    with span("pipeline.choose_track"):
+        track_info = choose_random_track()
 
     if track_info is None:
         print("❌ Impossible de sélectionner une musique. Arrêt du programme.")
@@ -34,13 +41,26 @@ while attempt < max_attempts and not lyrics_found:
 
     animated_cover_path = None
     static_cover_path = None
+    cover_background = None
+    album_id = track_info.get('album_id')
 
     try:
-        static_cover_path = download_cover(track_info['deezer_link'], artwork_type='square', loops=1, audio=False)
-        if static_cover_path:
-            print(f"✅ Cover téléchargée : {static_cover_path}")
-        else:
-            print("⚠️ Pas de cover disponible pour ce morceau sur Deezer")
+        with span("pipeline.cover", album_id=album_id):
+            # Fond déjà généré pour cet album : ni téléchargement ni calcul
+            if album_id is not None:
+                cover_background = get_cover_cache().get(album_id, 1080, 1920)
+            if cover_background is not None:
+                print(f"♻️ Fond de l'album {album_id} déjà en cache")
+            else:
+                static_cover_path = download_cover(track_info['deezer_link'], artwork_type='square', loops=1, audio=False)
+                if static_cover_path:
+                    print(f"✅ Cover téléchargée : {static_cover_path}")
+                    static_cover_path = os.path.abspath(static_cover_path)
+                    if album_id is not None:
+                        cover_background = get_cover_cache().get_or_create(album_id, static_cover_path, 1080, 1920)
+                        print(f"🎨 Fond généré depuis la cover (texte {cover_background.text_fill})")
+                else:
+                    print("⚠️ Pas de cover disponible pour ce morceau sur Deezer")
     except Exception as e:
         print(f"❌ Erreur lors du téléchargement de la cover : {e}")
 
@@ -57,8 +77,11 @@ while attempt < max_attempts and not lyrics_found:
 
     try:
         print("📝 Récupération des paroles...")
-        lyrics_fetcher = LyricsFetcher(artist_name, song_title)
-        lyrics = lyrics_fetcher.fetch_lyrics()
+        with span("pipeline.lyrics", artist=artist_name, title=song_title):
+            # Cache SQLite local (.cache/lyrics.sqlite) ; LYRICS_CACHE=0 pour toujours interroger les fournisseurs
+            lyrics_fetcher = LyricsFetcher(artist_name, song_title, isrc=isrc,
+                                           use_cache=os.environ.get("LYRICS_CACHE") != "0")
+            lyrics = lyrics_fetcher.fetch_lyrics()
         if lyrics is None:
             print("❌ Pas de paroles trouvées pour ce morceau. On change de musique...")
             os.chdir("..")
@@ -85,8 +108,9 @@ if not lyrics_found:
 # Le reste du code ne s'exécute que si des paroles ont été trouvées
 print("🎵 Récupération de l'audio...")
 # Récupération de la clé API YouTube depuis les variables d'environnement
-audio_fetcher = AudioFetcher()
-audio_fetcher.fetch_audio(artist_name, song_title)
+with span("pipeline.audio"):
+    audio_fetcher = AudioFetcher()
+    audio_fetcher.fetch_audio(artist_name, song_title)
 print("✅ Audio récupéré!")
 
 def get_valid_bpm(track_info, audio_fetcher, default_bpm=120.0):
@@ -161,44 +185,111 @@ def get_valid_bpm(track_info, audio_fetcher, default_bpm=120.0):
     print(f"⚠️ BPM non trouvé ou invalide, valeur par défaut utilisée ({default_bpm}).")
     return default_bpm
 
-bpm = get_valid_bpm(track_info, audio_fetcher)
+with span("pipeline.bpm"):
+    bpm = get_valid_bpm(track_info, audio_fetcher)
 
 print("🖼️ Création des images...")
-images_maker = ImageMaker(lyrics_fetcher.get_lyrics())
-if static_cover_path:
-    images_maker.animated_cover_path = static_cover_path  # On utilise la cover statique comme image principale
-images_maker.make_images()
-# Ajout : création de la carte de titre moderne
-images_maker.create_title_card(artist_name, song_title)
+# RENDER_MODE=layered : fond commun + sprites de texte au lieu d'une carte complète par ligne
+# RENDER_MODE=ass : sous-titres ASS incrustés par ffmpeg/libass, pas d'image par ligne (rendu rapide)
+video_config = VideoConfig(render_mode=os.environ.get("RENDER_MODE", "cards"))
+# Les cartes restent en mémoire ; EXPORT_LYRICS_IMAGES=1 les écrit aussi dans lyrics_images/ (debug)
+# IMAGE_STREAMING=1 : cartes générées pendant le rendu vidéo, via une file de IMAGE_STREAM_DEPTH cartes
+streaming = os.environ.get("IMAGE_STREAMING") == "1" and video_config.render_mode != "ass"
+if streaming:
+    frame_store = StreamingFrameStore(depth=int(os.environ.get("IMAGE_STREAM_DEPTH", "4")))
+else:
+    frame_store = FrameStore()
+# IMAGE_BACKEND=process|thread|serial, IMAGE_WORKERS=n (défaut : un worker par CPU)
+image_scheduler = ImageScheduler(
+    backend=os.environ.get("IMAGE_BACKEND") or None,
+    workers=int(os.environ["IMAGE_WORKERS"]) if os.environ.get("IMAGE_WORKERS") else None
+)
+with span("pipeline.images", lines=len(lyrics_fetcher.get_lyrics())):
+    images_maker = ImageMaker(
+        lyrics_fetcher.get_lyrics(),
+        frame_store=frame_store,
+        export_images=os.environ.get("EXPORT_LYRICS_IMAGES") == "1",
+        layered=video_config.render_mode == "layered",
+        scheduler=image_scheduler,
+        # LYRICS_IMAGE_FORMAT=jpg|png|npy : format des cartes exportées
+        image_format=os.environ.get("LYRICS_IMAGE_FORMAT", "jpg"),
+        # Fond et couleurs du texte tirés de la cover (sinon assets/background.jpg)
+        cover_background=cover_background
+    )
+    if static_cover_path:
+        images_maker.animated_cover_path = static_cover_path  # On utilise la cover statique comme image principale
+    if video_config.render_mode == "ass":
+        # Seul le fond est préparé, le texte et la carte de titre sont dessinés par libass
+        images_maker.prepare_background_layer()
+    elif streaming:
+        # Le thread producteur démarre ; la vidéo consommera les cartes au fil de l'eau
+        images_maker.stream_images()
+        images_maker.create_title_card(artist_name, song_title)
+    else:
+        images_maker.make_images()
+        # Ajout : création de la carte de titre moderne
+        images_maker.create_title_card(artist_name, song_title)
 print("✅ Images créées!")
 
 print("🎬 Création de la vidéo...")
-# Passer les informations du morceau au VideoMaker
-video_maker = VideoMakerV2(
-    folder=images_maker.folder, 
-    bpm=bpm,
-    artist_name=artist_name,
-    song_title=song_title,
-    cover_path=static_cover_path  # Utiliser la cover statique pour le header
-)
-
-# Créer la vidéo complète
-try:
-    final_video = video_maker.create_complete_video()
-except Exception as e:
-    print(f"❌ Erreur lors de la création de la vidéo avec BPM {bpm} : {e}")
-    if bpm != 120.0:
-        print("🔁 Nouvelle tentative avec le BPM par défaut (120)...")
-        video_maker = VideoMakerV2(
-            folder=images_maker.folder,
-            bpm=120.0,
-            artist_name=artist_name,
-            song_title=song_title,
-            cover_path=static_cover_path
-        )
+with span("pipeline.video"):
+    # Passer les informations du morceau au VideoMaker
+    video_maker = VideoMakerV2(
+        folder=images_maker.folder, 
+        bpm=bpm,
+        config=video_config,
+        artist_name=artist_name,
+        song_title=song_title,
+        cover_path=static_cover_path,  # Utiliser la cover statique pour le header
+        frame_store=frame_store,
+        lyrics=lyrics_fetcher.get_lyrics(),
+        background_path=cover_background.path if cover_background else None,
+        # Couleurs du texte (thème de la cover) reprises par le mode ass
+        text_colors=(images_maker.text_fill, images_maker.outline_fill, images_maker.shadow_fill)
+    )
+
+    # Créer la vidéo complète
+    try:
         final_video = video_maker.create_complete_video()
-    else:
-        raise
+    except Exception as e:
+        print(f"❌ Erreur lors de la création de la vidéo avec BPM {bpm} : {e}")
+        if bpm != 120.0:
+            print("🔁 Nouvelle tentative avec le BPM par défaut (120)...")
+            if streaming:
+                # Le flux de la première tentative est fermé et ses cartes déjà lues libérées :
+                # les cartes sont régénérées dans un FrameStore simple
+                frame_store.clear()
+                frame_store = FrameStore()
+                images_maker.frame_store = frame_store
+                images_maker.make_images()
+                images_maker.create_title_card(artist_name, song_title)
+            video_maker = VideoMakerV2(
+                folder=images_maker.folder,
+                bpm=120.0,
+                config=video_config,
+                artist_name=artist_name,
+                song_title=song_title,
+                cover_path=static_cover_path,
+                frame_store=frame_store,
+                lyrics=lyrics_fetcher.get_lyrics(),
+                background_path=cover_background.path if cover_background else None,
+                text_colors=(images_maker.text_fill, images_maker.outline_fill, images_maker.shadow_fill)
+            )
+            final_video = video_maker.create_complete_video()
+        else:
+            raise
+    finally:
+        frame_store.clear()
+
+# Trace complète du pipeline dans les métadonnées (le span pipeline.video est maintenant fermé)
+if os.path.exists("video_metadata_v2.json"):
+    with open("video_metadata_v2.json") as f:
+        video_metadata = json.load(f)
+    video_metadata["trace"] = get_tracer().summary()
+    # Latence et taux de succès de chaque source de paroles (richsync/subtitle par identifiant, LRCLib)
+    video_metadata["lyrics_providers"] = get_provider_stats().summary()
+    with open("video_metadata_v2.json", "w") as f:
+        json.dump(video_metadata, f, indent=2)
 
 print(f"🎉 Vidéo terminée pour : {artist_name} - {song_title}")
 print(f"📹 Fichier vidéo : {final_video}")
@@ -303,19 +394,25 @@ else:
 access_token = token_data["access_token"]
 tiktok = TikTokPoster(access_token)
 try:
-    print("🔍 Récupération des infos du créateur TikTok...")
-    creator_info = tiktok.query_creator_info()
-    print(f"👤 Utilisateur TikTok : {creator_info.get('data', {}).get('creator_username', 'inconnu')}")
-    print("🚀 Initialisation de l'upload vidéo (direct post) sur TikTok...")
-    init_resp = tiktok.init_video_upload_inbox(final_video)
-    upload_url = init_resp["data"]["upload_url"]
-    publish_id = init_resp["data"]["publish_id"]
-    print("⬆️ Upload de la vidéo en cours...")
-    tiktok.upload_video_file(upload_url, final_video)
-    print("⏳ Vérification du statut de la publication...")
-    status = tiktok.fetch_post_status(publish_id)
-    print(f"📢 Statut de la publication : {status}")
+    with span("pipeline.tiktok_upload"):
+        print("🔍 Récupération des infos du créateur TikTok...")
+        creator_info = tiktok.query_creator_info()
+        print(f"👤 Utilisateur TikTok : {creator_info.get('data', {}).get('creator_username', 'inconnu')}")
+        print("🚀 Initialisation de l'upload vidéo (direct post) sur TikTok...")
+        init_resp = tiktok.init_video_upload_inbox(final_video)
+        upload_url = init_resp["data"]["upload_url"]
+        publish_id = init_resp["data"]["publish_id"]
+        print("⬆️ Upload de la vidéo en cours...")
+        tiktok.upload_video_file(upload_url, final_video)
+        print("⏳ Vérification du statut de la publication...")
+        status = tiktok.fetch_post_status(publish_id)
+        print(f"📢 Statut de la publication : {status}")
 except Exception as e:
     print(f"❌ Erreur lors de la publication TikTok : {e}")
     if hasattr(e, 'response') and e.response is not None:
-        print("Réponse TikTok :", e.response.text)
\ No newline at end of file
+        print("Réponse TikTok :", e.response.text)
+
+# TRACE_FILE=trace.json : export au format Chrome trace (chrome://tracing ou ui.perfetto.dev)
+if os.environ.get("TRACE_FILE"):
+    get_tracer().export_chrome_trace(os.environ["TRACE_FILE"])
+    print(f"🧭 Trace exportée : {os.environ['TRACE_FILE']}")
@@ -0,0 +1,201 @@
+"""Lightweight span tracing: nested timers with wall/CPU time and counters (bytes, frames...).
+
+    from src.tracing import span
+
+    with span("lyrics.fetch", source="lrclib") as s:
+        response = requests.get(url)
+        s.add(bytes=len(response.content))
+
+Spans nest through a context variable, so threads started with propagate() attach their spans
+to the span that was open when they were created. The finished spans go into the video
+metadata (summary()) and can be exported as a Chrome trace (chrome://tracing, Perfetto).
+"""
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed section; counters added with add() are summed"""
+
+    __slots__ = ("tracer", "name", "span_id", "parent_id", "attrs", "counters", "start", "wall_s",
+                 "cpu_s", "_cpu_start", "_token", "pid", "tid")
+
+    def __init__(self, tracer: "Tracer", name: str, parent_id: Optional[str], attrs: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = tracer.next_id()
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.counters: Dict[str, float] = {}
+        self.start = 0.0
+        self.wall_s = None
+        self.cpu_s = None
+        self._cpu_start = 0.0
+        self._token = None
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def add(self, **counters) -> "Span":
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        return self
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        # CPU du thread courant : les spans des threads d'images ne se comptent pas entre eux
+        self._cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_s = time.perf_counter() - self.start
+        self.cpu_s = time.thread_time() - self._cpu_start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.finish(self)
+        return False
+
+    def to_dict(self) -> Dict:
+        record = {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start_s": round(self.start - self.tracer.origin, 6),
+            "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6),
+            "pid": self.pid,
+            "tid": self.tid
+        }
+        if self.attrs:
+            record["attrs"] = dict(self.attrs)
+        if self.counters:
+            record["counters"] = {key: round(value, 6) if isinstance(value, float) else value
+                                  for key, value in self.counters.items()}
+        return record
+
+
+class Tracer:
+    """Collects finished spans (thread-safe), for this process and merged worker processes"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self._records: List[Dict] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> str:
+        return f"{os.getpid()}-{next(self._ids)}"
+
+    def span(self, name: str, parent: Optional[str] = None, **attrs) -> Span:
+        """New span, child of the current span (or of the given parent span id)"""
+        if parent is None:
+            current = _current_span.get()
+            parent = current.span_id if current is not None else None
+        return Span(self, name, parent, attrs)
+
+    def finish(self, span: Span) -> None:
+        record = span.to_dict()
+        with self._lock:
+            self._records.append(record)
+
+    def records(self) -> List[Dict]:
+        with self._lock:
+            return list(self._records)
+
+    def merge(self, records: List[Dict]) -> None:
+        """Add spans recorded in another process (ids already carry the worker pid)"""
+        with self._lock:
+            self._records.extend(records)
+
+    def reset(self) -> None:
+        # L'origine est conservée : les workers forkés restent sur la même échelle de temps
+        with self._lock:
+            self._records.clear()
+
+    def summary(self) -> Dict:
+        """Span tree (children ordered by start) and per-name totals, for the metadata JSON"""
+        records = sorted(self.records(), key=lambda record: record["start_s"])
+        nodes = {record["id"]: dict(record, children=[]) for record in records}
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node["parent"])
+            (parent["children"] if parent is not None else roots).append(node)
+
+        def clean(node):
+            node = {key: value for key, value in node.items() if key not in ("id", "parent", "pid", "tid")}
+            node["children"] = [clean(child) for child in node["children"]]
+            if not node["children"]:
+                del node["children"]
+            return node
+
+        totals: Dict[str, Dict] = {}
+        for record in records:
+            total = totals.setdefault(record["name"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0})
+            total["count"] += 1
+            total["wall_s"] = round(total["wall_s"] + record["wall_s"], 6)
+            total["cpu_s"] = round(total["cpu_s"] + record["cpu_s"], 6)
+            for key, value in record.get("counters", {}).items():
+                value = total.get(key, 0) + value
+                total[key] = round(value, 6) if isinstance(value, float) else value
+        return {"spans": [clean(root) for root in roots], "totals": totals}
+
+    def export_chrome_trace(self, path: str) -> str:
+        """Write the spans in the Chrome trace event format (complete 'X' events, microseconds)"""
+        events = []
+        for record in self.records():
+            args = dict(record.get("attrs", {}))
+            args.update(record.get("counters", {}))
+            args["cpu_ms"] = round(record["cpu_s"] * 1000, 3)
+            events.append({
+                "name": record["name"],
+                "ph": "X",
+                "ts": round(record["start_s"] * 1e6, 1),
+                "dur": round(record["wall_s"] * 1e6, 1),
+                "pid": record["pid"],
+                "tid": record["tid"],
+                "args": args
+            })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, parent: Optional[str] = None, **attrs) -> Span:
+    """Context manager timing a section on the global tracer"""
+    return _tracer.span(name, parent=parent, **attrs)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def traced(name: str):
+    """Decorator: run the function inside a span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(fn):
+    """Bind fn to the current context so a thread running it nests its spans under the open span"""
+    return functools.partial(contextvars.copy_context().run, fn)
@@ -0,0 +1,89 @@
+import tracemalloc
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class FrameBufferPool:
+    """Small ring of preallocated, C-contiguous BGR frame buffers.
+
+    A buffer handed out by next() stays valid until `count` more buffers have been
+    requested, which covers the writer consuming the frame before it is reused."""
+
+    def __init__(self, width: int, height: int, count: int = 2, channels: int = 3):
+        self.width = width
+        self.height = height
+        self._buffers = [np.empty((height, width, channels), dtype=np.uint8) for _ in range(max(1, count))]
+        self._index = 0
+
+    def next(self) -> np.ndarray:
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        return buffer
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self._buffers)
+
+
+class AllocationTracker:
+    """Debug helper: measures the memory allocated while rendering each frame (tracemalloc
+    sees numpy and OpenCV output arrays), so regressions in the render loop show up"""
+
+    def __init__(self, threshold_bytes: int = 64 * 1024):
+        self.threshold_bytes = threshold_bytes
+        self.frames = 0
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.frames_over_threshold = 0
+        self._baseline = 0
+        self._started_here = False
+
+    def start(self) -> "AllocationTracker":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_here = True
+        return self
+
+    def stop(self) -> None:
+        if self._started_here:
+            tracemalloc.stop()
+            self._started_here = False
+
+    def frame_begin(self) -> None:
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+
+    def frame_end(self) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        allocated = max(0, peak - self._baseline)
+        self.frames += 1
+        self.total_bytes += allocated
+        self.max_bytes = max(self.max_bytes, allocated)
+        if allocated > self.threshold_bytes:
+            self.frames_over_threshold += 1
+
+    def report(self) -> Dict:
+        return {
+            "frames": self.frames,
+            "mean_bytes_per_frame": int(self.total_bytes / self.frames) if self.frames else 0,
+            "max_bytes_per_frame": self.max_bytes,
+            "frames_over_threshold": self.frames_over_threshold,
+            "threshold_bytes": self.threshold_bytes
+        }
+
+
+def merge_allocation_reports(reports) -> Optional[Dict]:
+    """Combine the allocation reports of several workers"""
+    reports = [report for report in reports if report]
+    if not reports:
+        return None
+    frames = sum(report["frames"] for report in reports)
+    total = sum(report["mean_bytes_per_frame"] * report["frames"] for report in reports)
+    return {
+        "frames": frames,
+        "mean_bytes_per_frame": int(total / frames) if frames else 0,
+        "max_bytes_per_frame": max(report["max_bytes_per_frame"] for report in reports),
+        "frames_over_threshold": sum(report["frames_over_threshold"] for report in reports),
+        "threshold_bytes": reports[0]["threshold_bytes"]
+    }
@@ -0,0 +1,102 @@
+import math
+from typing import Hashable, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src.video.frame_cache import FrameCache
+
+
+class SpriteLayer(NamedTuple):
+    """Tight BGRA text sprite and its position in the full-size card"""
+    pixels: np.ndarray
+    x: int
+    y: int
+
+
+class LayeredCompositor:
+    """Render a frame as transformed background + transformed text sprite, blending only
+    the pixels covered by the sprite instead of warping a full card"""
+
+    def __init__(self, background: np.ndarray, width: int, height: int,
+                 background_cache: Optional[FrameCache] = None):
+        self.background = background
+        self.width = width
+        self.height = height
+        # Transformed backgrounds keyed by beat phase: the same for every lyric line
+        self.background_cache = background_cache
+        # Preallocated output and scratch buffers, reused for every frame (views are taken
+        # for the sprite region so nothing is allocated per frame)
+        self._output = np.empty((height, width, 3), dtype=np.uint8)
+        self._sprite_scratch = np.empty((height, width, 4), dtype=np.uint8)
+        self._alpha_scratch = np.empty((height, width), dtype=np.uint8)
+        self._alpha3_scratch = np.empty((height, width, 3), dtype=np.uint8)
+        self._inverse_scratch = np.empty((height, width, 3), dtype=np.uint8)
+        self._sprite_rgb_scratch = np.empty((height, width, 3), dtype=np.uint8)
+        self._local_matrix = np.empty((2, 3), dtype=np.float64)
+
+    def draw_background(self, matrix: np.ndarray, output: np.ndarray, phase_key: Optional[Hashable] = None) -> None:
+        """Write the background warped with this frame's zoom/sway into output"""
+        if self.background_cache is None or phase_key is None:
+            cv2.warpAffine(self.background, matrix, (self.width, self.height), dst=output)
+            return
+        warped = self.background_cache.get(phase_key)
+        if warped is None:
+            warped = cv2.warpAffine(self.background, matrix, (self.width, self.height))
+            self.background_cache.put(phase_key, warped)
+        np.copyto(output, warped)
+
+    def sprite_region(self, sprite: SpriteLayer, matrix: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """Bounding box (x0, y0, x1, y1) of the transformed sprite, clipped to the frame"""
+        h, w = sprite.pixels.shape[:2]
+        corners = np.array([
+            [sprite.x, sprite.y, 1.0],
+            [sprite.x + w, sprite.y, 1.0],
+            [sprite.x, sprite.y + h, 1.0],
+            [sprite.x + w, sprite.y + h, 1.0]
+        ])
+        projected = corners @ matrix.astype(np.float64).T
+        # One pixel of padding for the bilinear footprint
+        x0 = max(0, math.floor(projected[:, 0].min()) - 1)
+        y0 = max(0, math.floor(projected[:, 1].min()) - 1)
+        x1 = min(self.width, math.ceil(projected[:, 0].max()) + 1)
+        y1 = min(self.height, math.ceil(projected[:, 1].max()) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def render(self, sprite: SpriteLayer, matrix: np.ndarray, phase_key: Optional[Hashable] = None,
+               output: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compose one frame into output (by default an internal buffer reused by the next call)"""
+        if output is None:
+            output = self._output
+        self.draw_background(matrix, output, phase_key)
+        region = self.sprite_region(sprite, matrix)
+        if region is None:
+            return output
+        x0, y0, x1, y1 = region
+        region_w, region_h = x1 - x0, y1 - y0
+
+        # Same transform, expressed from sprite coordinates to region coordinates
+        local_matrix = self._local_matrix
+        local_matrix[:] = matrix
+        local_matrix[0, 2] += local_matrix[0, 0] * sprite.x + local_matrix[0, 1] * sprite.y - x0
+        local_matrix[1, 2] += local_matrix[1, 0] * sprite.x + local_matrix[1, 1] * sprite.y - y0
+        warped = self._sprite_scratch[:region_h, :region_w]
+        cv2.warpAffine(sprite.pixels, local_matrix, (region_w, region_h), dst=warped,
+                       borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
+
+        # Alpha blend over the background, only inside the sprite region
+        roi = output[y0:y1, x0:x1]
+        alpha = self._alpha_scratch[:region_h, :region_w]
+        alpha3 = self._alpha3_scratch[:region_h, :region_w]
+        inverse = self._inverse_scratch[:region_h, :region_w]
+        sprite_rgb = self._sprite_rgb_scratch[:region_h, :region_w]
+        cv2.extractChannel(warped, 3, dst=alpha)
+        cv2.cvtColor(alpha, cv2.COLOR_GRAY2BGR, dst=alpha3)
+        cv2.cvtColor(warped, cv2.COLOR_BGRA2BGR, dst=sprite_rgb)
+        cv2.bitwise_not(alpha3, dst=inverse)
+        cv2.multiply(roi, inverse, dst=inverse, scale=1 / 255)
+        cv2.multiply(sprite_rgb, alpha3, dst=sprite_rgb, scale=1 / 255)
+        cv2.add(inverse, sprite_rgb, dst=roi)
+        return output
@@ -0,0 +1,262 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+
+# Quality settings: crf for the ffmpeg encoders (serial, parallel segments, ass), bitrate for the moviepy fallback
+QUALITY_SETTINGS = {
+    'low': {'bitrate': '1500k', 'crf': 28, 'preset': 'ultrafast'},
+    'medium': {'bitrate': '3000k', 'crf': 23, 'preset': 'medium'},
+    'high': {'bitrate': '6000k', 'crf': 20, 'preset': 'slow'},
+    'ultra': {'bitrate': '10000k', 'crf': 18, 'preset': 'veryslow'}
+}
+
+
+def get_quality_settings(quality: str) -> dict:
+    """Return bitrate/crf/preset for a quality name (defaults to 'high' like the moviepy path)"""
+    return QUALITY_SETTINGS.get(quality, QUALITY_SETTINGS['high'])
+
+
+def ffmpeg_available(binary: str = 'ffmpeg') -> bool:
+    """Check that the ffmpeg binary can be found"""
+    return shutil.which(binary) is not None
+
+
+class FFmpegPipeEncoder:
+    """Single-pass encoder: raw BGR frames go to ffmpeg over stdin, which also muxes
+    the audio, trims to the target duration and applies the fade-out"""
+
+    def __init__(self, output_path: str, width: int, height: int, fps: int,
+                 audio_path: Optional[str] = None, duration: Optional[float] = None,
+                 fade_out: float = 2.0, quality: str = 'medium', video_codec: str = 'libx264',
+                 audio_codec: str = 'aac', gop_size: int = 0, ffmpeg_binary: str = 'ffmpeg'):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.audio_path = audio_path
+        self.duration = duration
+        self.fade_out = fade_out
+        self.quality = quality
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.gop_size = gop_size
+        self.ffmpeg_binary = ffmpeg_binary
+        self.frames_written = 0
+        self._process = None
+        self._stderr = None
+
+    def build_command(self) -> List[str]:
+        """Build the ffmpeg command line for this job"""
+        settings = get_quality_settings(self.quality)
+        cmd = [
+            self.ffmpeg_binary, '-y', '-hide_banner', '-loglevel', 'error', '-nostats',
+            # Raw frames from the render loop
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f"{self.width}x{self.height}", '-r', str(self.fps),
+            '-i', '-'
+        ]
+        if self.audio_path:
+            # Loop the audio if it is shorter than the video, the output is trimmed by -t
+            cmd += ['-stream_loop', '-1', '-i', self.audio_path]
+
+        video_filters = []
+        audio_filters = []
+        if self.duration and self.fade_out > 0:
+            fade_start = max(0.0, self.duration - self.fade_out)
+            video_filters.append(f"fade=t=out:st={fade_start:.3f}:d={self.fade_out:.3f}")
+            audio_filters.append(f"afade=t=out:st={fade_start:.3f}:d={self.fade_out:.3f}")
+
+        cmd += ['-map', '0:v:0']
+        if self.audio_path:
+            cmd += ['-map', '1:a:0']
+        if video_filters:
+            cmd += ['-vf', ','.join(video_filters)]
+        cmd += [
+            '-c:v', self.video_codec,
+            '-preset', settings['preset'],
+            # Constant quality rather than an average bitrate spread over the file: a frame is
+            # encoded the same way in a serial render and in whichever parallel segment it falls in
+            '-crf', str(settings['crf']),
+            '-pix_fmt', 'yuv420p'
+        ]
+        if self.gop_size > 0:
+            # Fixed GOP so that independently encoded segments start on a keyframe
+            cmd += ['-g', str(self.gop_size), '-keyint_min', str(self.gop_size), '-sc_threshold', '0']
+        if self.audio_path:
+            if audio_filters:
+                cmd += ['-af', ','.join(audio_filters)]
+            cmd += ['-c:a', self.audio_codec]
+        if self.duration:
+            cmd += ['-t', f"{self.duration:.3f}"]
+        cmd += ['-movflags', '+faststart', self.output_path]
+        return cmd
+
+    def open(self) -> "FFmpegPipeEncoder":
+        """Start the ffmpeg process"""
+        if self._process is not None:
+            return self
+        if not ffmpeg_available(self.ffmpeg_binary):
+            raise RuntimeError(f"ffmpeg binary not found: {self.ffmpeg_binary}")
+        # stderr goes to a temp file so a chatty ffmpeg can never block the stdin pipe
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            self.build_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr
+        )
+        return self
+
+    def isOpened(self) -> bool:
+        """Same contract as cv2.VideoWriter.isOpened"""
+        return self._process is not None and self._process.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        """Send one BGR frame to ffmpeg"""
+        if self._process is None:
+            raise RuntimeError("Encoder is not open")
+        if frame.shape[:2] != (self.height, self.width):
+            raise ValueError(f"Frame size {frame.shape[1]}x{frame.shape[0]} does not match "
+                             f"encoder size {self.width}x{self.height}")
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8))
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited early: {self._read_stderr()}")
+        self.frames_written += 1
+
+    def release(self) -> None:
+        """Flush the pipe and wait for ffmpeg to finish writing the file"""
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return_code = process.wait()
+        error_output = self._read_stderr()
+        self._stderr.close()
+        self._stderr = None
+        if return_code != 0:
+            raise RuntimeError(f"ffmpeg failed with code {return_code}: {error_output}")
+
+    def abort(self) -> None:
+        """Stop ffmpeg without finalizing the output"""
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        process.kill()
+        process.wait()
+        self._stderr.close()
+        self._stderr = None
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def _read_stderr(self) -> str:
+        if self._stderr is None:
+            return ""
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors='replace').strip()[-2000:]
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.release()
+        return False
+
+
+def concat_segments(segment_paths: List[str], output_path: str, audio_path: Optional[str] = None,
+                    duration: Optional[float] = None, fade_out: float = 2.0, audio_codec: str = 'aac',
+                    ffmpeg_binary: str = 'ffmpeg') -> str:
+    """Join encoded segments with the concat demuxer (video stream copied, no re-encode)
+    and mux the audio with its fade-out"""
+    list_path = os.path.join(os.path.dirname(os.path.abspath(segment_paths[0])), 'segments.txt')
+    with open(list_path, 'w') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [ffmpeg_binary, '-y', '-hide_banner', '-loglevel', 'error', '-nostats',
+           '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio_path:
+        cmd += ['-stream_loop', '-1', '-i', audio_path]
+    cmd += ['-map', '0:v:0']
+    if audio_path:
+        cmd += ['-map', '1:a:0']
+    cmd += ['-c:v', 'copy']
+    if audio_path:
+        if duration and fade_out > 0:
+            fade_start = max(0.0, duration - fade_out)
+            cmd += ['-af', f"afade=t=out:st={fade_start:.3f}:d={fade_out:.3f}"]
+        cmd += ['-c:a', audio_codec]
+    if duration:
+        cmd += ['-t', f"{duration:.3f}"]
+    cmd += ['-movflags', '+faststart', output_path]
+
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        error_output = result.stderr.decode(errors='replace').strip()[-2000:]
+        raise RuntimeError(f"ffmpeg concat failed with code {result.returncode}: {error_output}")
+    return output_path
+
+
+def escape_filter_value(value: str) -> str:
+    """Escape a value for a filter option, then for the filtergraph (two levels of ffmpeg escaping)"""
+    for char in "\\':":
+        value = value.replace(char, "\\" + char)
+    for char in "\\'[],;":
+        value = value.replace(char, "\\" + char)
+    return value
+
+
+def render_subtitle_video(background_path: str, subtitle_path: str, output_path: str,
+                          width: int, height: int, fps: int, duration: float,
+                          audio_path: Optional[str] = None, fade_out: float = 2.0,
+                          quality: str = 'medium', video_codec: str = 'libx264', audio_codec: str = 'aac',
+                          fonts_dir: Optional[str] = None, ffmpeg_binary: str = 'ffmpeg') -> str:
+    """Burn an ASS script over a still 9:16 background with libass, muxing the audio in the same pass"""
+    settings = get_quality_settings(quality)
+    subtitle_filter = f"ass={escape_filter_value(subtitle_path)}"
+    if fonts_dir:
+        subtitle_filter += f":fontsdir={escape_filter_value(fonts_dir)}"
+    # Still image decoded once and repeated by the loop filter (-loop 1 would decode it every frame)
+    video_filters = ["loop=loop=-1:size=1:start=0", f"settb=1/{fps}", "setpts=N", f"scale={width}:{height}", subtitle_filter]
+    fade_start = max(0.0, duration - fade_out)
+    if fade_out > 0:
+        video_filters.append(f"fade=t=out:st={fade_start:.3f}:d={fade_out:.3f}")
+
+    cmd = [ffmpeg_binary, '-y', '-hide_banner', '-loglevel', 'error', '-nostats',
+           '-i', background_path]
+    if audio_path:
+        cmd += ['-stream_loop', '-1', '-i', audio_path]
+    cmd += ['-map', '0:v:0']
+    if audio_path:
+        cmd += ['-map', '1:a:0']
+    cmd += [
+        '-vf', ','.join(video_filters),
+        '-c:v', video_codec,
+        '-preset', settings['preset'],
+        '-crf', str(settings['crf']),
+        '-pix_fmt', 'yuv420p',
+        '-r', str(fps)
+    ]
+    if audio_path:
+        if fade_out > 0:
+            cmd += ['-af', f"afade=t=out:st={fade_start:.3f}:d={fade_out:.3f}"]
+        cmd += ['-c:a', audio_codec]
+    cmd += ['-frames:v', str(int(round(duration * fps))), '-t', f"{duration:.3f}",
+            '-movflags', '+faststart', output_path]
+
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        error_output = result.stderr.decode(errors='replace').strip()[-2000:]
+        raise RuntimeError(f"ffmpeg subtitle render failed with code {result.returncode}: {error_output}")
+    return output_path
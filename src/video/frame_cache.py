@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from fractions import Fraction
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+
+class FrameCache:
+    """Bounded LRU cache of rendered frames, keyed by (image id, quantized beat phase)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._frames: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Return the cached frame for key (and mark it as recently used), or None"""
+        frame = self._frames.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+        self._frames.move_to_end(key)
+        self.hits += 1
+        return frame
+
+    def put(self, key: Hashable, frame: np.ndarray) -> None:
+        """Store a frame, evicting the least recently used ones to stay within budget"""
+        if frame.nbytes > self.max_bytes:
+            return
+        if key in self._frames:
+            self.current_bytes -= self._frames.pop(key).nbytes
+        while self._frames and self.current_bytes + frame.nbytes > self.max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+            self.evictions += 1
+        self._frames[key] = frame
+        self.current_bytes += frame.nbytes
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for logs and metadata"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 4),
+            "frames": len(self._frames),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+
+def merge_cache_stats(stats_list) -> Dict:
+    """Combine the stats of several caches (one per parallel worker)"""
+    merged = {"hits": 0, "misses": 0, "evictions": 0, "frames": 0, "bytes": 0, "max_bytes": 0}
+    for stats in stats_list:
+        for key in merged:
+            merged[key] += stats.get(key, 0)
+    lookups = merged["hits"] + merged["misses"]
+    merged["hit_rate"] = round(merged["hits"] / lookups, 4) if lookups else 0.0
+    return merged
+
+
+def effect_cycle_period(bpm: float, sway_speed: float) -> Optional[float]:
+    """Duration after which both the zoom (1 beat) and the sway (sway_speed beats) repeat,
+    None when the effects are static (unknown BPM)"""
+    if not bpm or bpm <= 0:
+        return None
+    beat_duration = 60.0 / bpm
+    # Smallest whole number of beats that is also a multiple of sway_speed
+    beats = Fraction(sway_speed).limit_denominator(16).numerator or 1
+    return beat_duration * beats
+
+
+def phase_keys(times: np.ndarray, period: Optional[float], fps: int, resolution: int = 1) -> np.ndarray:
+    """Quantize frame times to a phase bin within the effect cycle.
+
+    With resolution=1 the bins are one frame interval wide: frame-exact when the cycle
+    holds a whole number of frames, otherwise at most half a frame of phase error."""
+    times = np.asarray(times, dtype=np.float64)
+    if period is None:
+        return np.zeros(times.shape, dtype=np.int64)
+    steps_per_second = fps * max(1, resolution)
+    bins_per_cycle = max(1, int(round(period * steps_per_second)))
+    return np.rint(np.mod(times, period) * steps_per_second).astype(np.int64) % bins_per_cycle
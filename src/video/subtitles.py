@@ -0,0 +1,198 @@
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+from src.video.timeline import BACKGROUND_SOURCE, compile_timeline
+
+TITLE_KEY = "title"
+
+
+class SubtitleEvent(NamedTuple):
+    """One displayed block: a lyric line or the title card"""
+    start: float
+    end: float
+    text: str
+    kind: str = "lyric"  # lyric or title
+
+
+def lyric_line_text(line: Dict) -> str:
+    """Same text as ImageMaker.get_line_text: upper case, '...' for instrumental lines"""
+    if not line["line"].strip():
+        return "..."
+    return line["line"].upper()
+
+
+def build_subtitle_events(lyrics: List[Dict], fps: int, max_duration: float, last_duration: float = 4.0,
+                          title: Optional[str] = None) -> List[SubtitleEvent]:
+    """Timed events on the same frame-exact timeline as the rendered cards (see compile_timeline)"""
+    lines = sorted(lyrics, key=lambda line: line["timestamp"])
+    image_data = []
+    if title:
+        image_data.append({'filename': None, 'path': None, 'key': TITLE_KEY, 'timestamp': 0})
+    for index, line in enumerate(lines):
+        image_data.append({'filename': None, 'path': None, 'key': index, 'timestamp': line["timestamp"]})
+    timeline = compile_timeline(image_data, fps, max_duration, last_duration)
+
+    events = []
+    for entry in timeline.entries:
+        if entry['source'] == BACKGROUND_SOURCE:
+            continue
+        key = timeline.sources[entry['source']]['key']
+        start, end = entry['first_frame'] / fps, entry['last_frame'] / fps
+        if key == TITLE_KEY:
+            events.append(SubtitleEvent(start, end, title, "title"))
+        else:
+            events.append(SubtitleEvent(start, end, lyric_line_text(lines[key])))
+    return events
+
+
+def format_ass_time(seconds: float) -> str:
+    centiseconds = int(round(max(0.0, seconds) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours:d}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+
+def format_srt_time(seconds: float, separator: str = ",") -> str:
+    milliseconds = int(round(max(0.0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+def ass_color(rgb, alpha: int = 255) -> str:
+    """RGB + opacity (0-255, PIL convention) to an ASS &HAABBGGRR colour"""
+    r, g, b = rgb
+    return f"&H{255 - alpha:02X}{b:02X}{g:02X}{r:02X}"
+
+
+def escape_ass_text(text: str) -> str:
+    # Pas d'échappement des accolades en ASS : on les remplace
+    text = text.replace("\\", "/").replace("{", "(").replace("}", ")")
+    return text.replace("\r", "").replace("\n", "\\N")
+
+
+def lyric_font_size(text: str, width: int) -> int:
+    """Same rule as ImageMaker.get_smart_font_size"""
+    words = len(text.split())
+    base_size = int(0.08 * width)
+    if words <= 3:
+        return base_size + 20
+    elif words <= 6:
+        return base_size + 10
+    elif words <= 10:
+        return base_size
+    return base_size - 10
+
+
+def beat_zoom_tags(start: float, end: float, bpm: float, zoom_min: float = 1.0, zoom_max: float = 1.02,
+                   zoom_sharpness: float = 8.0, zoom_decay_rate: float = 3.0) -> str:
+    """\\t transforms approximating EffectsEngine.get_zoom_scale: fast rise on each beat, linear decay"""
+    if not bpm or bpm <= 0 or zoom_max <= zoom_min:
+        return ""
+    beat_duration = 60.0 / bpm
+    attack = min(beat_duration / 4, 1.0 / zoom_sharpness)
+    decay = min(beat_duration - beat_duration / 4, beat_duration / zoom_decay_rate)
+    low, high = round(zoom_min * 100, 2), round(zoom_max * 100, 2)
+    tags = [f"\\fscx{low:g}\\fscy{low:g}"]
+    beat = math.floor(start / beat_duration)
+    while beat * beat_duration < end:
+        beat_start = beat * beat_duration
+        peak = beat_start + attack
+        rest = beat_start + beat_duration / 4 + decay
+        # Temps des \t relatifs au début de l'événement, en millisecondes
+        t0, t1, t2 = (int(round((t - start) * 1000)) for t in (beat_start, peak, rest))
+        if t1 > 0:
+            tags.append(f"\\t({max(0, t0)},{t1},\\fscx{high:g}\\fscy{high:g})")
+        if t2 > 0:
+            tags.append(f"\\t({max(0, t1)},{t2},\\fscx{low:g}\\fscy{low:g})")
+        beat += 1
+    return "".join(tags)
+
+
+def write_ass(events: List[SubtitleEvent], path: str, width: int = 1080, height: int = 1920,
+              font_name: str = "Arial", bpm: float = 0, artist: Optional[str] = None,
+              zoom_min: float = 1.0, zoom_max: float = 1.02, zoom_sharpness: float = 8.0,
+              zoom_decay_rate: float = 3.0, text_fill=(255, 255, 255), outline_fill=(0, 0, 0, 180),
+              shadow_fill=(0, 0, 0, 100)) -> str:
+    """Write an ASS script styled like the lyric cards: centered text in the card colours (white
+    with dark outline and drop shadow, or the album cover theme), beat zoom as \\t transforms, and
+    the title card drawn with vector shapes"""
+    margin = int(0.1 * width)
+    style_format = ("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+                    "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+                    "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding")
+
+    def style(name, size, color, alignment, outline=2, shadow=4, outline_color=(0, 0, 0, 180),
+              shadow_color=(0, 0, 0, 100)):
+        return (f"Style: {name},{font_name},{size},{ass_color(color)},{ass_color(color)},"
+                f"{ass_color(outline_color[:3], outline_color[3])},{ass_color(shadow_color[:3], shadow_color[3])},"
+                f"0,0,0,0,100,100,0,0,1,{outline},{shadow},{alignment},{margin},{margin},0,1")
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 1",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        style_format,
+        style("Lyric", lyric_font_size("", width), text_fill[:3], 5, outline_color=tuple(outline_fill),
+              shadow_color=tuple(shadow_fill)),
+        style("Title", int(0.12 * width), text_fill[:3], 8, outline=0, shadow=0),
+        style("Artist", int(0.08 * width), (200, 200, 200), 8, outline=0, shadow=0),
+        style("Shape", 10, (0, 0, 0), 7, outline=0, shadow=0),
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    ]
+
+    def dialogue(layer, event, style_name, text):
+        return (f"Dialogue: {layer},{format_ass_time(event.start)},{format_ass_time(event.end)},"
+                f"{style_name},,0,0,0,,{text}")
+
+    for event in events:
+        if event.kind == "title":
+            # Même mise en page que ImageMaker.create_title_card
+            title_y = height // 2 - 100
+            artist_y = title_y + 120
+            line_x, line_y = (width - 200) // 2, artist_y + 150
+            lines.append(dialogue(0, event, "Shape", f"{{\\pos(0,0)\\1a&H87&\\p1}}m 0 0 l {width} 0 {width} {height} 0 {height}{{\\p0}}"))
+            lines.append(dialogue(1, event, "Title", f"{{\\pos({width // 2},{title_y})}}{escape_ass_text(event.text.upper())}"))
+            if artist:
+                lines.append(dialogue(1, event, "Artist", f"{{\\pos({width // 2},{artist_y})}}{escape_ass_text(artist.upper())}"))
+            lines.append(dialogue(1, event, "Shape", f"{{\\pos(0,0)\\1c&HFFFFFF&\\p1}}m {line_x} {line_y} l {line_x + 200} {line_y} "
+                                                      f"{line_x + 200} {line_y + 3} {line_x} {line_y + 3}{{\\p0}}"))
+            continue
+        zoom = beat_zoom_tags(event.start, event.end, bpm, zoom_min, zoom_max, zoom_sharpness, zoom_decay_rate)
+        size = lyric_font_size(event.text, width)
+        lines.append(dialogue(1, event, "Lyric", f"{{\\fs{size}{zoom}}}{escape_ass_text(event.text)}"))
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def write_srt(events: List[SubtitleEvent], path: str) -> str:
+    """SRT sidecar with the lyric lines only"""
+    blocks = []
+    for index, event in enumerate([event for event in events if event.kind == "lyric"], start=1):
+        blocks.append(f"{index}\n{format_srt_time(event.start)} --> {format_srt_time(event.end)}\n{event.text}\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(blocks))
+    return path
+
+
+def write_vtt(events: List[SubtitleEvent], path: str) -> str:
+    """WebVTT sidecar with the lyric lines only"""
+    blocks = ["WEBVTT\n"]
+    for event in events:
+        if event.kind != "lyric":
+            continue
+        blocks.append(f"{format_srt_time(event.start, '.')} --> {format_srt_time(event.end, '.')}\n{event.text}\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(blocks))
+    return path
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+TIMELINE_VERSION = 1
+BACKGROUND_SOURCE = -1  # Source index used for frames that show the plain background
+
+
+def round_timestamp(value) -> float:
+    """Lyric timestamps are kept at centisecond precision"""
+    return round(float(value), 2)
+
+
+@dataclass
+class CompiledTimeline:
+    """Frame-indexed render plan: for every output frame, which source image it shows and
+    how far into that image's entry it is"""
+    fps: int
+    total_frames: int
+    sources: List[Dict]
+    entries: List[Dict]
+    source_index: np.ndarray  # int32 per frame, BACKGROUND_SOURCE for the plain background
+    local_time: np.ndarray  # float64 per frame, seconds since the entry started
+    key: str = ""
+    version: int = field(default=TIMELINE_VERSION)
+
+    @property
+    def duration(self) -> float:
+        return self.total_frames / self.fps
+
+    @property
+    def frame_times(self) -> np.ndarray:
+        """Global time of every frame"""
+        return np.arange(self.total_frames, dtype=np.float64) / self.fps
+
+    def entry_bounds(self):
+        """Per-frame start and end time of the entry each frame belongs to"""
+        starts = np.empty(self.total_frames, dtype=np.float64)
+        ends = np.empty(self.total_frames, dtype=np.float64)
+        for entry in self.entries:
+            starts[entry['first_frame']:entry['last_frame']] = entry['first_frame'] / self.fps
+            ends[entry['first_frame']:entry['last_frame']] = entry['last_frame'] / self.fps
+        return starts, ends
+
+    def source_for_entry(self, entry: Dict) -> Optional[Dict]:
+        if entry['source'] == BACKGROUND_SOURCE:
+            return None
+        return self.sources[entry['source']]
+
+    def dedup_stats(self) -> Dict:
+        """How many entries reuse a source already shown earlier (repeated lyric lines)"""
+        shown = [entry['source'] for entry in self.entries if entry['source'] != BACKGROUND_SOURCE]
+        unique = len(set(shown))
+        return {
+            "entries": len(shown),
+            "unique_sources": unique,
+            "dedup_ratio": round((len(shown) - unique) / len(shown), 4) if shown else 0.0
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": self.version,
+            "key": self.key,
+            "fps": self.fps,
+            "total_frames": self.total_frames,
+            "duration": self.duration,
+            "sources": self.sources,
+            "entries": self.entries,
+            "frames": {
+                "source_index": self.source_index.tolist(),
+                "local_time": [round(float(t), 6) for t in self.local_time]
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CompiledTimeline":
+        return cls(
+            fps=data["fps"],
+            total_frames=data["total_frames"],
+            sources=data["sources"],
+            entries=data["entries"],
+            source_index=np.asarray(data["frames"]["source_index"], dtype=np.int32),
+            local_time=np.asarray(data["frames"]["local_time"], dtype=np.float64),
+            key=data.get("key", ""),
+            version=data.get("version", TIMELINE_VERSION)
+        )
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path: str, key: Optional[str] = None) -> Optional["CompiledTimeline"]:
+        """Load a cached timeline, None if missing, unreadable or compiled from other inputs"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != TIMELINE_VERSION or (key is not None and data.get("key") != key):
+            return None
+        return cls.from_dict(data)
+
+
+def timeline_key(image_data: List[Dict], fps: int, max_duration: float, last_duration: float) -> str:
+    """Hash of everything the compiled timeline depends on"""
+    payload = {
+        "version": TIMELINE_VERSION,
+        "fps": fps,
+        "max_duration": max_duration,
+        "last_duration": last_duration,
+        "images": [[img.get('filename'), img.get('path'), str(img.get('key')), img['timestamp'],
+                    bool(img.get('sprite', False))] for img in image_data]
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def compile_timeline(image_data: List[Dict], fps: int, max_duration: float,
+                     last_duration: float = 4.0) -> CompiledTimeline:
+    """Compile sorted image entries into a frame-exact timeline.
+
+    Each entry starts on frame round(timestamp * fps) and lasts until the next entry starts,
+    so frame counts never drift from the audio. The last entry lasts last_duration and
+    the whole timeline is capped at max_duration, giving exactly round(duration * fps) frames."""
+    key = timeline_key(image_data, fps, max_duration, last_duration)
+    sources: List[Dict] = []
+    source_ids: Dict = {}
+    starts: List[int] = []
+    indices: List[int] = []
+
+    max_frames = int(round(max_duration * fps))
+    for img in image_data:
+        identity = (img.get('path'), str(img.get('key')), bool(img.get('sprite', False)))
+        if identity not in source_ids:
+            source_ids[identity] = len(sources)
+            sources.append({
+                'filename': img.get('filename'),
+                'path': img.get('path'),
+                'key': img.get('key'),
+                'sprite': bool(img.get('sprite', False))
+            })
+        starts.append(int(round(round_timestamp(img['timestamp']) * fps)))
+        indices.append(source_ids[identity])
+
+    entries: List[Dict] = []
+    if starts and starts[0] > 0:
+        # Background until the first image
+        entries.append({'source': BACKGROUND_SOURCE, 'start': 0.0, 'first_frame': 0,
+                        'last_frame': min(starts[0], max_frames)})
+    for position, (first_frame, source) in enumerate(zip(starts, indices)):
+        if first_frame >= max_frames:
+            break  # On ne traite pas les images qui commencent après la durée max
+        if position < len(starts) - 1:
+            last_frame = starts[position + 1]
+        else:
+            last_frame = first_frame + int(round(last_duration * fps))
+        last_frame = min(last_frame, max_frames)
+        if last_frame <= first_frame:
+            continue
+        entries.append({'source': source, 'start': first_frame / fps,
+                        'first_frame': first_frame, 'last_frame': last_frame})
+
+    total_frames = entries[-1]['last_frame'] if entries else 0
+    source_index = np.full(total_frames, BACKGROUND_SOURCE, dtype=np.int32)
+    local_time = np.zeros(total_frames, dtype=np.float64)
+    for entry in entries:
+        first, last = entry['first_frame'], entry['last_frame']
+        source_index[first:last] = entry['source']
+        local_time[first:last] = np.arange(last - first, dtype=np.float64) / fps
+
+    return CompiledTimeline(fps=fps, total_frames=total_frames, sources=sources, entries=entries,
+                            source_index=source_index, local_time=local_time, key=key)
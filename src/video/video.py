@@ -2,15 +2,31 @@ from moviepy import VideoFileClip, AudioFileClip, ImageClip, CompositeVideoClip,
 from moviepy import vfx, afx
 import cv2
 import os
+import shutil
+import tempfile
+import time
+import multiprocessing
 import numpy as np
 import json
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Dict, Optional
 from dataclasses import dataclass
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
 
 from src.audio.audio import AudioFetcher
-from src.images.images import LyricsFetcher, ImageMaker
+from src.images.images import LyricsFetcher, ImageMaker, FONT_PATH, CARDS_MANIFEST
+from src.images.frame_store import FrameStore, TITLE_CARD_KEY, BACKGROUND_LAYER_KEY
+from src.images.card_formats import CARD_EXTENSIONS, load_card
+from src.images.card_stream import StreamingFrameStore
+from src.images.background_cache import get_background_cache
+from src.video.compositor import LayeredCompositor, SpriteLayer
+from src.video.buffers import AllocationTracker, FrameBufferPool, merge_allocation_reports
+from src.video.timeline import BACKGROUND_SOURCE, CompiledTimeline, compile_timeline, round_timestamp, timeline_key
+from src.video.encoder import FFmpegPipeEncoder, concat_segments, ffmpeg_available, get_quality_settings, render_subtitle_video
+from src.video.subtitles import build_subtitle_events, write_ass, write_srt, write_vtt
+from src.tracing import current_span, get_tracer, span, traced
+from src.video.frame_cache import FrameCache, effect_cycle_period, merge_cache_stats, phase_keys
 
 @dataclass
 class VideoConfig:
@@ -21,6 +37,17 @@ class VideoConfig:
     video_codec: str = 'libx264'
     audio_codec: str = 'aac'
     quality: str = 'medium'  # low, medium, high, ultra
+    encoder: str = 'ffmpeg'  # ffmpeg (single pass with audio) or moviepy (legacy two-pass fallback)
+    max_duration: float = 60.0  # Limite stricte TikTok
+    fade_out: float = 2.0  # Fondu audio/vidéo de fin (secondes)
+    workers: int = 1  # > 1 renders GOP-aligned segments in parallel (ffmpeg encoder only)
+    gop_size: int = 60  # Frames between keyframes, also the segment alignment in parallel mode
+    frame_cache_mb: int = 0  # Beat-phase frame cache budget (0 = disabled), ~6 MB per 1080x1920 frame
+    frame_cache_phase_resolution: int = 1  # Phase bins per frame interval for the cache key
+    render_mode: str = 'cards'  # cards (one full image per line), layered (shared background + text sprites) or ass (libass subtitles burned by ffmpeg)
+    layer_cache_mb: int = 0  # Layered mode: transformed backgrounds cached per beat phase (0 = disabled, warp every frame); opt-in like frame_cache_mb since phase-binned backgrounds can drift slightly from the exactly warped sprites
+    debug_allocations: bool = False  # Report memory allocated per rendered frame (tracemalloc, slow)
+    last_image_duration: float = 4.0  # Default duration for last image
     
 @dataclass
 class EffectConfig:
@@ -36,6 +63,16 @@ class EffectConfig:
     enable_blur: bool = True
     blur_intensity: float = 0.5
 
+@dataclass
+class EffectCurves:
+    """Per-frame effect values for a whole timeline (one entry per frame time)"""
+    times: np.ndarray
+    sway_x: np.ndarray
+    sway_y: np.ndarray
+    zoom: np.ndarray
+    fade_alpha: np.ndarray
+    matrices: np.ndarray  # (N, 2, 3) float32, zoom and sway fused into one affine transform
+
 class EffectsEngine:
     """Enhanced effects engine with more visual options"""
     
@@ -75,6 +112,62 @@ class EffectsEngine:
             return (end_time - time) / self.config.fade_duration
         return 1.0
     
+    def get_sway_offsets_batch(self, bpm: float, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized get_sway_offsets over an array of frame times"""
+        times = np.asarray(times, dtype=np.float64)
+        frequency = bpm / 60.0 / self.config.sway_speed
+        phase = 2 * np.pi * frequency * times
+        return self.config.sway_amplitude_x * np.sin(phase), self.config.sway_amplitude_y * np.cos(phase)
+    
+    def get_zoom_scale_batch(self, bpm: float, times: np.ndarray) -> np.ndarray:
+        """Vectorized get_zoom_scale over an array of frame times"""
+        times = np.asarray(times, dtype=np.float64)
+        beats_per_second = bpm / 60.0 if bpm else 0
+        if beats_per_second == 0:
+            return np.ones_like(times)  # Pas d'effet de zoom si BPM inconnu
+        beat_duration = 1.0 / beats_per_second
+        time_within_beat = np.mod(times, beat_duration)
+        zoom_range = self.config.zoom_max - self.config.zoom_min
+        
+        attack = self.config.zoom_min + zoom_range * (time_within_beat * self.config.zoom_sharpness)
+        decay_time = time_within_beat - beat_duration / 4
+        decay = self.config.zoom_max - zoom_range * (decay_time * self.config.zoom_decay_rate / beat_duration)
+        zoom_factor = np.where(time_within_beat < beat_duration / 4, attack, decay)
+        
+        return np.clip(zoom_factor, self.config.zoom_min, self.config.zoom_max)
+    
+    def get_fade_alpha_batch(self, times: np.ndarray, start_times, end_times) -> np.ndarray:
+        """Vectorized get_fade_alpha, start/end can be scalars or per-frame arrays"""
+        times = np.asarray(times, dtype=np.float64)
+        start_times = np.broadcast_to(np.asarray(start_times, dtype=np.float64), times.shape)
+        end_times = np.broadcast_to(np.asarray(end_times, dtype=np.float64), times.shape)
+        fade = self.config.fade_duration
+        return np.where(times < start_times + fade, (times - start_times) / fade,
+                        np.where(times > end_times - fade, (end_times - times) / fade, 1.0))
+    
+    def compute_curves(self, bpm: float, times: np.ndarray, width: int, height: int,
+                       start_times=None, end_times=None) -> EffectCurves:
+        """Compute sway, zoom, fade and the fused affine matrices for all frame times at once"""
+        times = np.asarray(times, dtype=np.float64)
+        sway_x, sway_y = self.get_sway_offsets_batch(bpm, times)
+        zoom = self.get_zoom_scale_batch(bpm, times)
+        if start_times is None:
+            start_times = times[0] if times.size else 0.0
+        if end_times is None:
+            end_times = times[-1] if times.size else 0.0
+        fade_alpha = self.get_fade_alpha_batch(times, start_times, end_times)
+        
+        # Zoom around the center then sway: x' = zoom * x + (1 - zoom) * center + sway
+        center_x, center_y = width / 2, height / 2
+        matrices = np.zeros((times.size, 2, 3), dtype=np.float32)
+        matrices[:, 0, 0] = zoom
+        matrices[:, 1, 1] = zoom
+        matrices[:, 0, 2] = (1 - zoom) * center_x + sway_x
+        matrices[:, 1, 2] = (1 - zoom) * center_y + sway_y
+        
+        return EffectCurves(times=times, sway_x=sway_x, sway_y=sway_y, zoom=zoom,
+                            fade_alpha=fade_alpha, matrices=matrices)
+    
     def apply_blur_effect(self, img: np.ndarray, intensity: float) -> np.ndarray:
         """Apply blur effect based on intensity"""
         if not self.config.enable_blur or intensity <= 0:
@@ -90,11 +183,24 @@ class VideoMakerV2:
     """Enhanced video maker with 9:16 aspect ratio and direct MP4 export"""
     
     def __init__(self, folder: str, bpm: float, config: VideoConfig = None, effects_config: EffectConfig = None, 
-                 artist_name: str = None, song_title: str = None, cover_path: str = None):
+                 artist_name: str = None, song_title: str = None, cover_path: str = None,
+                 frame_store: FrameStore = None, lyrics: List[Dict] = None, background_path: str = None,
+                 text_colors: Tuple = None):
         self.folder = folder
+        # Paroles synchronisées (LyricsFetcher) : mode ass et sous-titres .srt/.vtt
+        self.lyrics = lyrics
+        # Cartes en mémoire produites par ImageMaker (sinon lecture du dossier)
+        self.frame_store = frame_store
         self.bpm = bpm
         self.config = config or VideoConfig()
         self.effects = EffectsEngine(effects_config or EffectConfig())
+        self.frame_cache = FrameCache(self.config.frame_cache_mb * 1024 * 1024) if self.config.frame_cache_mb > 0 else None
+        self.frame_cache_stats = None
+        self.compositor = None
+        # Output frames are rendered into a small ring of preallocated buffers
+        self.buffer_pool = FrameBufferPool(self.config.width, self.config.height, count=2)
+        self.allocation_tracker = AllocationTracker() if self.config.debug_allocations else None
+        self.allocation_report = None
         
         # Informations du morceau
         self.artist_name = artist_name or "Unknown Artist"
@@ -105,8 +211,13 @@ class VideoMakerV2:
         self.video_name = "output_v2_temp.mp4"
         self.audio_file = "audio.m4a"
         self.final_video_name = "output_v2_final.mp4"
+        self.timeline_file = "timeline.json"
+        self.subtitle_file = "lyrics.ass"
         PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        self.background_image = os.path.join(PROJECT_ROOT, "assets", "background.jpg")
+        # Background generated from the album cover (src.images.cover_background), else the default asset
+        self.background_image = background_path or os.path.join(PROJECT_ROOT, "assets", "background.jpg")
+        # Text, outline and shadow colours of the cards (ImageMaker), reused by the ass mode
+        self.text_colors = text_colors
         
         # Video metadata
         self.metadata = {
@@ -122,6 +233,14 @@ class VideoMakerV2:
         }
     
     def resize_background_to_916(self, background_path: str) -> np.ndarray:
+        """9:16 background frame (BGR, read-only), computed once per distinct background and size"""
+        if not os.path.exists(background_path):
+            raise ValueError(f"Could not load background image: {background_path}")
+        return get_background_cache().get_or_create(
+            background_path, (self.config.width, self.config.height), {"stage": "video_916"},
+            lambda: self.build_background_916(background_path))
+    
+    def build_background_916(self, background_path: str) -> np.ndarray:
         """Resize and crop background image to 9:16 aspect ratio"""
         background = cv2.imread(background_path)
         if background is None:
@@ -158,7 +277,14 @@ class VideoMakerV2:
     
     def validate_inputs(self) -> bool:
         """Validate all required inputs before processing"""
-        if not os.path.exists(self.folder):
+        if self.config.render_mode == 'ass':
+            if not self.lyrics:
+                raise ValueError("The ass render mode needs the synced lyrics")
+            if not os.path.exists(self.audio_file):
+                raise FileNotFoundError(f"Audio file not found: {self.audio_file}")
+            return True
+        
+        if self.frame_store is None and not os.path.exists(self.folder):
             raise FileNotFoundError(f"Images folder not found: {self.folder}")
         
         if not os.path.exists(self.audio_file):
@@ -167,73 +293,189 @@ class VideoMakerV2:
         if not os.path.exists(self.background_image):
             raise FileNotFoundError(f"Background image not found: {self.background_image}")
         
-        images = [img for img in os.listdir(self.folder) if img.endswith(('.jpg', '.jpeg', '.png'))]
+        if self.frame_store is not None:
+            if not len(self.frame_store):
+                raise ValueError("No images found in the frame store")
+            return True
+        
+        images = [img for img in os.listdir(self.folder) if img.lower().endswith(CARD_EXTENSIONS)]
         if not images:
             raise ValueError("No images found in the specified folder")
         
         return True
     
+    @traced("video.load_images")
     def load_and_prepare_images(self) -> List[Dict]:
-        """Charge et trie les images, en mettant title_card.jpg en premier s'il existe"""
-        images = [img for img in os.listdir(self.folder) if img.endswith(('.jpg', '.jpeg', '.png'))]
+        """Charge et trie les images (jpg, png ou npy), en mettant la carte de titre en premier s'il y en a une"""
+        if self.frame_store is not None:
+            return self.load_from_frame_store()
+        images = sorted(img for img in os.listdir(self.folder) if img.lower().endswith(CARD_EXTENSIONS))
         image_data = []
-        # Gestion spéciale pour title_card.jpg
-        title_card_path = os.path.join(self.folder, 'title_card.jpg')
-        if 'title_card.jpg' in images:
+        # Gestion spéciale pour title_card.<ext>
+        title_cards = [img for img in images if os.path.splitext(img)[0] == 'title_card']
+        if title_cards:
             image_data.append({
-                'filename': 'title_card.jpg',
+                'filename': title_cards[0],
                 'timestamp': 0,
-                'path': title_card_path
+                'path': os.path.join(self.folder, title_cards[0])
             })
-            images.remove('title_card.jpg')
-        # Les autres images (lyrics_xx.xx.jpg)
+            images = [img for img in images if img not in title_cards]
+        cards = self.load_cards_manifest()
+        if cards is not None:
+            # Un fichier par carte unique, référencé par toutes ses lignes (refrains)
+            image_data.extend(sorted(({'filename': card['file'], 'timestamp': round_timestamp(card['timestamp']),
+                                       'path': os.path.join(self.folder, card['file'])} for card in cards),
+                                     key=lambda x: x['timestamp']))
+            return image_data
+        # Les autres images (lyrics_xx.xx.<ext>, ou xx.xx.<ext>), timestamps au centième
         for img in images:
             try:
-                timestamp = int(float(img.split("_")[1].split(".")[0]))
+                timestamp = round_timestamp(os.path.splitext(img)[0].rsplit("_", 1)[-1])
                 image_data.append({
                     'filename': img,
                     'timestamp': timestamp,
                     'path': os.path.join(self.folder, img)
                 })
-            except (IndexError, ValueError):
+            except ValueError:
                 print(f"Warning: Skipping image with invalid filename format: {img}")
                 continue
-        # Trie par timestamp (title_card.jpg reste en premier car timestamp=0)
-        image_data[1:] = sorted(image_data[1:], key=lambda x: x['timestamp'])
+        # Trie par timestamp (la carte de titre reste en premier)
+        first = 1 if title_cards else 0
+        image_data[first:] = sorted(image_data[first:], key=lambda x: x['timestamp'])
         return image_data
     
+    def load_cards_manifest(self) -> Optional[List[Dict]]:
+        """Timestamp -> card file entries written by ImageMaker (cards.json), None without one"""
+        path = os.path.join(self.folder, CARDS_MANIFEST)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)["cards"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not read {path}, listing the folder instead: {str(e)}")
+            return None
+    
+    def load_from_frame_store(self) -> List[Dict]:
+        """Same entries as load_and_prepare_images, read from the in-memory frame store"""
+        image_data = []
+        keys = [key for key in self.frame_store.keys() if key != BACKGROUND_LAYER_KEY]
+        if TITLE_CARD_KEY in keys:
+            image_data.append({'filename': 'title_card.jpg', 'timestamp': 0, 'path': None, 'key': TITLE_CARD_KEY})
+            keys.remove(TITLE_CARD_KEY)
+        sprite = self.use_layered_rendering()
+        references = self.frame_store.references()
+        if references:
+            # Cartes adressées par contenu : les lignes répétées partagent la même clé
+            lyrics_data = [{'filename': f"lyrics_{timestamp}", 'timestamp': round_timestamp(timestamp),
+                            'path': None, 'key': key, 'sprite': sprite} for timestamp, key in references]
+            image_data.extend(sorted(lyrics_data, key=lambda x: x['timestamp']))
+            return image_data
+        if sprite:
+            keys = self.frame_store.sprite_keys()
+        lyrics_data = []
+        for key in keys:
+            try:
+                timestamp = round_timestamp(key)
+            except (TypeError, ValueError):
+                print(f"Warning: Skipping frame with invalid key: {key}")
+                continue
+            lyrics_data.append({'filename': f"lyrics_{key}", 'timestamp': timestamp, 'path': None,
+                                'key': key, 'sprite': sprite})
+        image_data.extend(sorted(lyrics_data, key=lambda x: x['timestamp']))
+        return image_data
+    
+    def use_layered_rendering(self) -> bool:
+        """Layered mode needs the background layer and the text sprites from ImageMaker(layered=True)"""
+        if self.config.render_mode != 'layered':
+            return False
+        if self.frame_store is None or BACKGROUND_LAYER_KEY not in self.frame_store or not self.frame_store.sprite_keys():
+            print("Warning: No text sprites in the frame store, falling back to full cards")
+            self.config.render_mode = 'cards'
+            return False
+        return True
+    
     def apply_frame_effects(self, img: np.ndarray, time: float, width: int, height: int) -> np.ndarray:
         """Apply all visual effects to a single frame"""
-        # Get effect parameters
-        sway_x, sway_y = self.effects.get_sway_offsets(self.bpm, time)
-        zoom_scale = self.effects.get_zoom_scale(self.bpm, time)
-        
-        # Center coordinates
-        center_x, center_y = width / 2, height / 2
-        
-        # Apply zoom transformation
-        transformation_matrix = np.float32([
-            [zoom_scale, 0, (1 - zoom_scale) * center_x],
-            [0, zoom_scale, (1 - zoom_scale) * center_y]
-        ])
-        processed_img = cv2.warpAffine(img, transformation_matrix, (width, height))
-        
-        # Apply sway transformation
-        sway_matrix = np.float32([[1, 0, sway_x], [0, 1, sway_y]])
-        processed_img = cv2.warpAffine(processed_img, sway_matrix, (width, height))
-        
-        return processed_img
+        curves = self.effects.compute_curves(self.bpm, np.array([time]), width, height)
+        return self.warp_frame(img, curves.matrices[0], width, height)
+    
+    def warp_frame(self, img: np.ndarray, matrix: np.ndarray, width: int, height: int,
+                   dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Apply a precomputed zoom + sway matrix in a single warpAffine (into dst if given)"""
+        if dst is None:
+            return cv2.warpAffine(img, matrix, (width, height))
+        cv2.warpAffine(img, matrix, (width, height), dst=dst)
+        return dst
+    
+    def render_frame(self, img, matrix: np.ndarray, width: int, height: int, phase_key=None,
+                     dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Render one frame from a full card (single warp) or a text sprite (layered compositing)"""
+        if isinstance(img, SpriteLayer):
+            if dst is None:
+                dst = np.empty((height, width, 3), dtype=np.uint8)
+            return self.compositor.render(img, matrix, phase_key, output=dst)
+        return self.warp_frame(img, matrix, width, height, dst)
     
     def add_image_sequence(self, video_writer, img: np.ndarray, start_time: float, 
                           duration: float, width: int, height: int) -> None:
         """Add a sequence of frames for a single image with effects (sans header overlay)"""
-        total_frames = int(duration * self.config.fps)
-        for frame_idx in range(total_frames):
-            current_time = start_time + frame_idx / self.config.fps
-            # Apply effects
-            processed_frame = self.apply_frame_effects(img, current_time, width, height)
-            # Write frame (plus d'overlay)
+        times = start_time + np.arange(self.sequence_frame_count(duration)) / self.config.fps
+        matrices = self.effects.compute_curves(self.bpm, times, width, height).matrices
+        self.write_frames(video_writer, img, matrices)
+    
+    def write_frames(self, video_writer, img, matrices: np.ndarray, image_key: Optional[str] = None,
+                     phases: Optional[np.ndarray] = None) -> None:
+        """Render and write one frame per precomputed matrix for a single image"""
+        height, width = self.config.height, self.config.width
+        use_cache = self.frame_cache is not None and image_key is not None and phases is not None
+        tracker = self.allocation_tracker
+        warp_time = write_time = 0.0
+        for frame_idx in range(len(matrices)):
+            if tracker is not None:
+                tracker.frame_begin()
+            phase_key = int(phases[frame_idx]) if phases is not None else None
+            if use_cache:
+                # Les effets sont périodiques : même phase de beat => même frame
+                cache_key = (image_key, phase_key)
+                processed_frame = self.frame_cache.get(cache_key)
+                if processed_frame is None:
+                    # Nouvelle entrée de cache : seul cas où une frame est allouée
+                    warp_start = time.perf_counter()
+                    processed_frame = self.render_frame(img, matrices[frame_idx], width, height, phase_key)
+                    warp_time += time.perf_counter() - warp_start
+                    self.frame_cache.put(cache_key, processed_frame)
+            else:
+                # Apply effects (matrice précalculée, rendu dans un buffer préalloué)
+                warp_start = time.perf_counter()
+                processed_frame = self.render_frame(img, matrices[frame_idx], width, height, phase_key,
+                                                    dst=self.buffer_pool.next())
+                warp_time += time.perf_counter() - warp_start
+            # Write frame (plus d'overlay) ; bloque tant que l'encodeur x264 ne suit pas
+            write_start = time.perf_counter()
             video_writer.write(processed_frame)
+            write_time += time.perf_counter() - write_start
+            if tracker is not None:
+                tracker.frame_end()
+        trace = current_span()
+        if trace is not None:
+            trace.add(frames=len(matrices), warp_s=warp_time, write_s=write_time,
+                      bytes=len(matrices) * width * height * 3)
+    
+    def frame_phase_keys(self, times: np.ndarray) -> np.ndarray:
+        """Quantized beat phase of each frame time, used as frame cache key"""
+        period = effect_cycle_period(self.bpm, self.effects.config.sway_speed)
+        return phase_keys(times, period, self.config.fps, self.config.frame_cache_phase_resolution)
+    
+    def sequence_frame_count(self, duration: float) -> int:
+        """Number of frames rendered by add_image_sequence for the given duration"""
+        return int(round(duration * self.config.fps))
+    
+    def compute_frame_curves(self, timeline: CompiledTimeline) -> EffectCurves:
+        """Precompute the effect table for every frame of the timeline"""
+        starts, ends = timeline.entry_bounds()
+        return self.effects.compute_curves(self.bpm, timeline.frame_times, self.config.width,
+                                           self.config.height, starts, ends)
     
     def create_video_metadata(self, duration: float) -> None:
         import datetime
@@ -250,78 +492,395 @@ class VideoMakerV2:
             "bpm": self.bpm,
             "effects_applied": ["sway", "zoom", "beat_sync"]
         })
+        if self.frame_cache_stats:
+            self.metadata["frame_cache"] = self.frame_cache_stats
+        if self.allocation_report:
+            self.metadata["allocations"] = self.allocation_report
+        # Spans terminés jusqu'ici (main.py réécrit la trace complète en fin de pipeline)
+        self.metadata["trace"] = get_tracer().summary()
         # Correction ici : conversion pour JSON
         with open("video_metadata_v2.json", "w") as f:
             import json
             json.dump(self.metadata, f, indent=2, default=make_serializable)
     
+    @traced("video.compile_timeline")
+    def compile_render_timeline(self, image_data: List[Dict]) -> CompiledTimeline:
+        """Compile (or reload from timeline.json) the frame-exact timeline for these images"""
+        key = timeline_key(image_data, self.config.fps, self.config.max_duration, self.config.last_image_duration)
+        timeline = CompiledTimeline.load(self.timeline_file, key)
+        if timeline is not None:
+            print(f"Reusing compiled timeline: {self.timeline_file}")
+            return timeline
+        timeline = compile_timeline(image_data, self.config.fps, self.config.max_duration,
+                                    self.config.last_image_duration)
+        try:
+            timeline.save(self.timeline_file)
+        except OSError as e:
+            print(f"Warning: Could not save timeline: {str(e)}")
+        return timeline
+    
+    def use_ffmpeg_encoder(self) -> bool:
+        """Whether this job uses the single-pass ffmpeg encoder"""
+        if self.config.encoder != 'ffmpeg':
+            return False
+        if not ffmpeg_available():
+            print("Warning: ffmpeg not found, falling back to the moviepy encoder")
+            self.config.encoder = 'moviepy'
+            return False
+        return True
+    
+    def open_writer(self, duration: float):
+        """Open the frame writer for the configured encoder backend"""
+        width, height = self.config.width, self.config.height
+        if self.use_ffmpeg_encoder():
+            # Frames, audio, trim and fade-out in a single ffmpeg pass
+            return FFmpegPipeEncoder(
+                self.final_video_name, width, height, self.config.fps,
+                audio_path=self.audio_file,
+                duration=duration,
+                fade_out=self.config.fade_out,
+                quality=self.config.quality,
+                video_codec=self.config.video_codec,
+                audio_codec=self.config.audio_codec,
+                gop_size=self.config.gop_size
+            ).open()
+        # Legacy path: mp4v temp file, audio added later by add_audio()
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        return cv2.VideoWriter(self.video_name, fourcc, self.config.fps, (width, height))
+    
+    def load_source_image(self, source: Optional[Dict], background_frame: np.ndarray):
+        """Load a timeline source image (background for the intro or unreadable files)"""
+        if source is None:
+            print("Adding background")
+            return background_frame
+        if source.get('sprite'):
+            print(f"Processing sprite: {source['filename']}")
+            sprite = self.frame_store.get_sprite(source['key'])
+            if sprite is None:
+                print(f"Warning: Sprite {source['key']} missing from the frame store, using background")
+                return background_frame
+            return SpriteLayer(*sprite)
+        if source.get('key') is not None and self.frame_store is not None:
+            print(f"Processing image: {source['filename']}")
+            img = self.frame_store.get(source['key'])
+            if img is None:
+                print(f"Warning: Frame {source['key']} missing from the frame store, using background")
+                return background_frame
+        else:
+            print(f"Processing image: {source['filename']}")
+            img = load_card(source['path'])
+            if img is None:
+                print(f"Warning: Could not load image {source['path']}, using background")
+                return background_frame
+        # Images are already in 9:16 format from ImageMaker, resize only if needed
+        if img.shape[:2] != (self.config.height, self.config.width):
+            img = cv2.resize(img, (self.config.width, self.config.height))
+        return img
+    
+    def source_image_key(self, source: Optional[Dict]):
+        """Stable identity of a timeline source (frame cache key)"""
+        if source is None:
+            return 'background'
+        if source.get('key') is not None:
+            return f"store:{source['key']}"
+        return source['path']
+    
+    @traced("video.render_frames")
+    def render_frames(self, video_writer, timeline: CompiledTimeline, background_frame: np.ndarray,
+                      first_frame: int = 0, last_frame: Optional[int] = None,
+                      curves: Optional[EffectCurves] = None) -> None:
+        """Render the frame range [first_frame, last_frame) of the compiled timeline"""
+        height, width = self.config.height, self.config.width
+        if curves is None:
+            curves = self.compute_frame_curves(timeline)
+        if last_frame is None:
+            last_frame = timeline.total_frames
+        if self.allocation_tracker is not None:
+            self.allocation_tracker.start()
+        layered = self.config.render_mode == 'layered'
+        phases = self.frame_phase_keys(curves.times) if self.frame_cache is not None or layered else None
+        if layered and self.compositor is None:
+            background_layer = np.array(self.frame_store.get(BACKGROUND_LAYER_KEY))
+            background_cache = FrameCache(self.config.layer_cache_mb * 1024 * 1024) if self.config.layer_cache_mb > 0 else None
+            self.compositor = LayeredCompositor(background_layer, width, height, background_cache)
+        # Sources affichées par plusieurs entrées (refrains) : chargées une fois, gardées jusqu'à
+        # leur dernière entrée dans cette plage
+        last_use = {}
+        for entry in timeline.entries:
+            if entry['last_frame'] > first_frame and entry['first_frame'] < last_frame:
+                last_use[entry['source']] = entry['first_frame']
+        loaded = {}
+        try:
+            # Parcourt le tableau frame -> source par plages contiguës de la même image
+            frame_idx = first_frame
+            while frame_idx < last_frame:
+                source_idx = int(timeline.source_index[frame_idx])
+                run_end = frame_idx + 1
+                while run_end < last_frame and timeline.source_index[run_end] == source_idx:
+                    run_end += 1
+                source = None if source_idx == BACKGROUND_SOURCE else timeline.sources[source_idx]
+                img = loaded.pop(source_idx, None)
+                if img is None:
+                    img = self.load_source_image(source, background_frame)
+                if last_use.get(source_idx, -1) >= run_end:
+                    loaded[source_idx] = img
+                self.write_frames(video_writer, img, curves.matrices[frame_idx:run_end],
+                                  image_key=self.source_image_key(source),
+                                  phases=None if phases is None else phases[frame_idx:run_end])
+                frame_idx = run_end
+        finally:
+            if self.allocation_tracker is not None:
+                self.allocation_tracker.stop()
+                self.allocation_report = self.allocation_tracker.report()
+    
+    def plan_segments(self, total_frames: int, total_duration: float) -> List[Tuple[int, int]]:
+        """Split the frame range into contiguous GOP-aligned segments, one per worker"""
+        workers = max(1, self.config.workers)
+        gop = max(1, self.config.gop_size)
+        chunk = -(-total_frames // workers)
+        chunk = max(gop, -(-chunk // gop) * gop)
+        # Le fondu de fin doit tenir entièrement dans le dernier segment
+        if self.config.fade_out > 0:
+            fade_start_frame = int((total_duration - self.config.fade_out) * self.config.fps)
+        else:
+            fade_start_frame = total_frames
+        starts = [start for start in range(0, total_frames, chunk) if start == 0 or start <= fade_start_frame]
+        ends = starts[1:] + [total_frames]
+        return list(zip(starts, ends))
+    
+    @traced("video.render_segment")
+    def render_segment(self, timeline: CompiledTimeline, first_frame: int, last_frame: int,
+                       output_path: str, duration: Optional[float]) -> str:
+        """Render and encode one segment to its own video-only file"""
+        background_frame = self.resize_background_to_916(self.background_image)
+        encoder = FFmpegPipeEncoder(
+            output_path, self.config.width, self.config.height, self.config.fps,
+            duration=duration,
+            fade_out=self.config.fade_out if duration else 0,
+            quality=self.config.quality,
+            video_codec=self.config.video_codec,
+            gop_size=self.config.gop_size
+        )
+        with encoder:
+            self.render_frames(encoder, timeline, background_frame, first_frame, last_frame)
+        if self.frame_cache is not None:
+            self.frame_cache_stats = self.frame_cache.stats()
+        return output_path
+    
+    @traced("video.render_parallel")
+    def render_parallel(self, timeline: CompiledTimeline) -> str:
+        """Render segments in a process pool, then concat them losslessly and mux the audio.
+
+        The frames fed to the encoder and the encoder settings (CRF, fixed GOP) are the same as the
+        serial path; the output is not bit-identical only because the x264 lookahead restarts at
+        each segment boundary (checked by benchmarks.parallel_parity)."""
+        total_frames, total_duration = timeline.total_frames, timeline.duration
+        segments = self.plan_segments(total_frames, total_duration)
+        print(f"Rendering {total_frames} frames in {len(segments)} segments on {self.config.workers} workers...")
+        segment_dir = tempfile.mkdtemp(prefix="segments_", dir=".")
+        if self.frame_store is not None:
+            # Les workers relisent les cartes en mmap depuis le disque
+            self.frame_store.spill_all()
+        jobs = []
+        trace = current_span()
+        for idx, (first_frame, last_frame) in enumerate(segments):
+            is_last = idx == len(segments) - 1
+            jobs.append({
+                'folder': self.folder,
+                'bpm': self.bpm,
+                'config': self.config,
+                'effects_config': self.effects.config,
+                'background_image': self.background_image,
+                'frame_store': self.frame_store,
+                'timeline': timeline,
+                'first_frame': first_frame,
+                'last_frame': last_frame,
+                'output_path': os.path.join(segment_dir, f"segment_{idx:03d}.mp4"),
+                # Only the last segment carries the video fade-out
+                'duration': total_duration - first_frame / self.config.fps if is_last else None,
+                'trace_parent': trace.span_id if trace is not None else None
+            })
+        # main.py n'a pas de garde __main__ : fork évite de ré-exécuter le script dans les workers
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        else:
+            mp_context = None
+        try:
+            with ProcessPoolExecutor(max_workers=self.config.workers, mp_context=mp_context) as executor:
+                results = list(executor.map(_render_segment, jobs))
+            # Spans des workers rattachés au span render_parallel
+            for result in results:
+                get_tracer().merge(result['trace'])
+            segment_paths = [result['path'] for result in results]
+            if self.frame_cache is not None:
+                self.frame_cache_stats = merge_cache_stats(result['frame_cache'] for result in results)
+            if self.allocation_tracker is not None:
+                self.allocation_report = merge_allocation_reports(result['allocations'] for result in results)
+            with span("video.concat", segments=len(segment_paths)):
+                concat_segments(
+                    segment_paths, self.final_video_name,
+                    audio_path=self.audio_file,
+                    duration=total_duration,
+                    fade_out=self.config.fade_out,
+                    audio_codec=self.config.audio_codec
+                )
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+        return self.final_video_name
+    
+    def subtitle_events(self):
+        """Lyric events on the frame-exact timeline (title card first, like the rendered cards)"""
+        return build_subtitle_events(self.lyrics, self.config.fps, self.config.max_duration,
+                                     self.config.last_image_duration, title=self.song_title)
+    
+    def export_subtitles(self, events) -> List[str]:
+        """Write .srt and .vtt sidecars next to the final video"""
+        base = os.path.splitext(self.final_video_name)[0]
+        paths = [write_srt(events, f"{base}.srt"), write_vtt(events, f"{base}.vtt")]
+        print(f"Subtitles exported: {', '.join(paths)}")
+        return paths
+    
+    def ass_colors(self) -> Dict:
+        """write_ass colour arguments matching the cards (defaults when no theme was given)"""
+        if not self.text_colors:
+            return {}
+        text_fill, outline_fill, shadow_fill = self.text_colors
+        return {'text_fill': text_fill, 'outline_fill': outline_fill, 'shadow_fill': shadow_fill}
+    
+    @traced("video.render_subtitles")
+    def render_subtitles(self) -> str:
+        """ass mode: burn an ASS script over the still 9:16 background with ffmpeg/libass in one pass"""
+        if not ffmpeg_available():
+            raise RuntimeError("The ass render mode needs ffmpeg (with libass)")
+        events = self.subtitle_events()
+        if not events:
+            raise ValueError("No lyrics to render")
+        total_duration = events[-1].end
+        effects = self.effects.config
+        try:
+            font_name = ImageFont.truetype(FONT_PATH, 10).getname()[0]
+        except OSError:
+            font_name = "Arial"
+        write_ass(events, self.subtitle_file, self.config.width, self.config.height,
+                  font_name=font_name, bpm=self.bpm, artist=self.artist_name,
+                  zoom_min=effects.zoom_min, zoom_max=effects.zoom_max,
+                  zoom_sharpness=effects.zoom_sharpness, zoom_decay_rate=effects.zoom_decay_rate,
+                  **self.ass_colors())
+        self.export_subtitles(events)
+        
+        # Fond préparé par ImageMaker (effets + dégradé) si disponible, sinon le fond brut recadré
+        background = None
+        if self.frame_store is not None:
+            background = self.frame_store.get(BACKGROUND_LAYER_KEY)
+        if background is None:
+            background = self.resize_background_to_916(self.background_image)
+        work_dir = tempfile.mkdtemp(prefix="subtitles_", dir=".")
+        try:
+            background_path = os.path.join(work_dir, "background.png")
+            cv2.imwrite(background_path, np.asarray(background))
+            print(f"Rendering {len(events)} subtitle events with libass...")
+            render_subtitle_video(
+                background_path, self.subtitle_file, self.final_video_name,
+                self.config.width, self.config.height, self.config.fps, total_duration,
+                audio_path=self.audio_file,
+                fade_out=self.config.fade_out,
+                quality=self.config.quality,
+                video_codec=self.config.video_codec,
+                audio_codec=self.config.audio_codec,
+                fonts_dir=os.path.dirname(FONT_PATH)
+            )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        self.metadata["render_mode"] = "ass"
+        self.metadata["subtitles"] = self.subtitle_file
+        self.create_video_metadata(total_duration)
+        print(f"9:16 Video with audio created successfully: {self.final_video_name}")
+        return self.final_video_name
+    
+    @traced("video.make_video")
     def make_video(self) -> str:
         """Create the video with enhanced error handling and progress tracking (sans overlay)"""
         try:
             # Validate inputs
             self.validate_inputs()
+            if self.config.render_mode == 'ass':
+                return self.render_subtitles()
             # Load and prepare images
             image_data = self.load_and_prepare_images()
             if not image_data:
                 raise ValueError("No valid images found")
-            # Load and resize background image to 9:16
-            background_frame = self.resize_background_to_916(self.background_image)
-            height, width = self.config.height, self.config.width
-            # header_overlay supprimé
-            # Initialize video writer with MP4 codec
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            video_writer = cv2.VideoWriter(self.video_name, fourcc, self.config.fps, (width, height))
-            if not video_writer.isOpened():
-                raise RuntimeError("Could not open video writer")
-            print(f"Creating 9:16 video with {len(image_data)} images...")
-            # Add initial background if first image doesn't start at 0
-            max_duration = 60  # Limite stricte TikTok
-            if image_data[0]['timestamp'] > 0:
-                bg_duration = min(image_data[0]['timestamp'], max_duration)
-                print(f"Adding background for {bg_duration} seconds")
-                self.add_image_sequence(video_writer, background_frame, 0, bg_duration, width, height)
-            # Process each image
-            total_duration = 0
-            for idx, img_info in enumerate(image_data):
-                if img_info['timestamp'] >= max_duration:
-                    break  # On ne traite pas les images qui commencent après 60s
-                print(f"Processing image {idx + 1}/{len(image_data)}: {img_info['filename']}")
-                # Load image
-                img = cv2.imread(img_info['path'])
-                if img is None:
-                    print(f"Warning: Could not load image {img_info['path']}, using background")
-                    img = background_frame
-                else:
-                    # Images are already in 9:16 format from ImageMaker
-                    img = cv2.resize(img, (width, height))
-                # Calculate duration
-                if idx < len(image_data) - 1:
-                    next_timestamp = image_data[idx + 1]['timestamp']
-                    duration = next_timestamp - img_info['timestamp']
+            # Timeline image par frame, exacte au centième
+            timeline = self.compile_render_timeline(image_data)
+            if not timeline.total_frames:
+                raise ValueError("Timeline is empty")
+            total_duration = timeline.duration
+            self.metadata["dedup"] = timeline.dedup_stats()
+            print(f"Creating 9:16 video with {len(image_data)} images ({timeline.total_frames} frames, "
+                  f"{self.metadata['dedup']['unique_sources']} unique)...")
+            if self.config.workers > 1 and self.use_ffmpeg_encoder():
+                self.render_parallel(timeline)
+                print(f"9:16 Video with audio created successfully: {self.final_video_name}")
+                output = self.final_video_name
+            else:
+                # Load and resize background image to 9:16
+                background_frame = self.resize_background_to_916(self.background_image)
+                # Initialize video writer (ffmpeg pipe or mp4v temp file)
+                video_writer = self.open_writer(total_duration)
+                if not video_writer.isOpened():
+                    raise RuntimeError("Could not open video writer")
+                try:
+                    self.render_frames(video_writer, timeline, background_frame)
+                    if self.frame_cache is not None:
+                        self.frame_cache_stats = self.frame_cache.stats()
+                        self.frame_cache.clear()
+                except Exception:
+                    if isinstance(video_writer, FFmpegPipeEncoder):
+                        video_writer.abort()
+                    raise
+                # Clean up
+                with span("video.encode_flush"):
+                    video_writer.release()
+                if isinstance(video_writer, FFmpegPipeEncoder):
+                    print(f"9:16 Video with audio created successfully: {self.final_video_name}")
+                    output = self.final_video_name
                 else:
-                    duration = 4  # Default duration for last image
-                # Ajuster la durée pour ne pas dépasser 60s
-                end_time = img_info['timestamp'] + duration
-                if end_time > max_duration:
-                    duration = max_duration - img_info['timestamp']
-                if duration <= 0:
-                    break
-                self.add_image_sequence(video_writer, img, img_info['timestamp'], duration, width, height)
-                total_duration = img_info['timestamp'] + duration
-                if total_duration >= max_duration:
-                    break
-            # Clean up
-            video_writer.release()
-            print(f"9:16 Video created successfully: {self.video_name}")
+                    print(f"9:16 Video created successfully: {self.video_name}")
+                    output = self.video_name
+            if self.frame_cache_stats:
+                print(f"Frame cache: {self.frame_cache_stats['hits']} hits, "
+                      f"{self.frame_cache_stats['misses']} misses ({self.frame_cache_stats['hit_rate']:.0%})")
+            if self.allocation_report:
+                print(f"Allocations: {self.allocation_report['mean_bytes_per_frame'] / 1024:.1f} KB/frame on average, "
+                      f"max {self.allocation_report['max_bytes_per_frame'] / 1024:.1f} KB, "
+                      f"{self.allocation_report['frames_over_threshold']} frames over "
+                      f"{self.allocation_report['threshold_bytes'] // 1024} KB")
+            if isinstance(self.frame_store, StreamingFrameStore):
+                stream = self.frame_store.stream_stats()
+                self.metadata["card_stream"] = stream
+                print(f"Card stream: {stream['produced']} cards (queue depth {stream['depth']}), "
+                      f"first card after {stream['first_card_s']}s, stalls: producer {stream['producer_stall_s']:.2f}s, "
+                      f"renderer {stream['consumer_stall_s']:.2f}s")
+            if self.lyrics:
+                self.export_subtitles(self.subtitle_events())
             # Create metadata
-            self.create_video_metadata(min(total_duration, max_duration))
-            return self.video_name
+            self.metadata["total_frames"] = timeline.total_frames
+            self.metadata["timeline"] = self.timeline_file
+            self.create_video_metadata(total_duration)
+            return output
         except Exception as e:
             print(f"Error creating video: {str(e)}")
             raise
+        finally:
+            if isinstance(self.frame_store, StreamingFrameStore):
+                # Cartes au-delà de la durée max ou rendu interrompu : le producteur s'arrête
+                self.frame_store.close()
     
+    @traced("video.add_audio")
     def add_audio(self) -> str:
-        """Add audio to video with enhanced options and direct MP4 export"""
+        """Add audio to video with enhanced options and direct MP4 export (moviepy fallback)"""
+        if self.config.encoder == 'ffmpeg' or self.config.render_mode == 'ass':
+            # The ffmpeg pipe encoder already muxed the audio in make_video()
+            return self.final_video_name
         try:
             print("Adding audio to video...")
             # Load video and audio clips
@@ -329,7 +888,7 @@ class VideoMakerV2:
             audio_clip = AudioFileClip(self.audio_file)
             
             # Limiter la durée à 60 secondes max
-            max_duration = 60
+            max_duration = self.config.max_duration
             video_duration = min(video_clip.duration, max_duration)
             
             if audio_clip.duration > video_duration:
@@ -346,8 +905,8 @@ class VideoMakerV2:
             
             # CORRECTION : Appliquer les effets avec with_effects()
             final_video = video_clip.with_effects([
-                vfx.FadeOut(2),      # Fondu vidéo de 5 secondes
-                afx.AudioFadeOut(2)  # Fondu audio de 5 secondes
+                vfx.FadeOut(self.config.fade_out),      # Fondu vidéo de fin
+                afx.AudioFadeOut(self.config.fade_out)  # Fondu audio de fin
             ]).with_audio(audio_clip)
             
             # Alternative si vous voulez séparer les effets :
@@ -356,13 +915,7 @@ class VideoMakerV2:
             # final_video = video_with_fade.with_audio(audio_with_fade)
             
             # Quality settings based on config
-            quality_settings = {
-                'low': {'bitrate': '1500k', 'preset': 'ultrafast'},
-                'medium': {'bitrate': '3000k', 'preset': 'medium'},
-                'high': {'bitrate': '6000k', 'preset': 'slow'},
-                'ultra': {'bitrate': '10000k', 'preset': 'veryslow'}
-            }
-            settings = quality_settings.get(self.config.quality, quality_settings['high'])
+            settings = get_quality_settings(self.config.quality)
             
             # Write final video directly to MP4
             final_video.write_videofile(
@@ -418,4 +971,20 @@ class VideoMakerV2:
             
         except Exception as e:
             print(f"Error in complete video creation: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+
+def _render_segment(job: Dict) -> Dict:
+    """Process pool entry point: render and encode one contiguous frame range"""
+    maker = VideoMakerV2(job['folder'], job['bpm'], config=job['config'], effects_config=job['effects_config'],
+                         frame_store=job['frame_store'])
+    maker.background_image = job['background_image']
+    # Le worker forké hérite des spans du parent : il ne renvoie que les siens
+    tracer = get_tracer()
+    tracer.reset()
+    with span("video.segment", parent=job['trace_parent'], first_frame=job['first_frame'],
+              last_frame=job['last_frame']):
+        path = maker.render_segment(job['timeline'], job['first_frame'], job['last_frame'],
+                                    job['output_path'], job['duration'])
+    return {'path': path, 'frame_cache': maker.frame_cache_stats or {}, 'allocations': maker.allocation_report,
+            'trace': tracer.records()}